@@ -3,12 +3,78 @@ from pydantic_settings import BaseSettings
 class Settings(BaseSettings):
     # Database
     DATABASE_URL: str = "sqlite:///./ecotrack.db"
+    # Pile async (aiosqlite, asyncpg...) pour les routes zones, indicateurs et stats
+    DATABASE_ASYNC: bool = False
+    ASYNC_DATABASE_URL: str | None = None  # déduite de DATABASE_URL si absente
+    # Pool de lecture séparé (réplique possible hors SQLite), par défaut la même base
+    READ_DATABASE_URL: str | None = None
+    
+    # Profil SQLite appliqué à chaque connexion
+    SQLITE_PROFILE_ENABLED: bool = True
+    SQLITE_JOURNAL_MODE: str = "WAL"
+    SQLITE_SYNCHRONOUS: str = "NORMAL"
+    SQLITE_MMAP_SIZE: int = 268435456  # 256 Mo
+    SQLITE_CACHE_SIZE: int = -65536  # en Kio si négatif : 64 Mo
+    SQLITE_BUSY_TIMEOUT_MS: int = 5000
+    SQLITE_AUTO_VACUUM: str = "INCREMENTAL"  # effectif à la création de la base (ou après un VACUUM)
     
     # JWT
     SECRET_KEY: str = "votre-cle-secrete-super-longue-et-complexe-changez-moi-en-production"
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
     
+    # Hashing des mots de passe (bcrypt dans un pool de processus dédié)
+    BCRYPT_ROUNDS: int = 12
+    PASSWORD_HASH_WORKERS: int = 2
+    PASSWORD_HASH_MAX_PENDING: int = 64
+    PASSWORD_HASH_NICE: int = 10
+    
+    # Cache HTTP (ETag) des routes zones et stats, en nombre de réponses
+    RESPONSE_CACHE_SIZE: int = 1024
+    
+    # Store colonnaire NumPy optionnel pour /stats (séries (zone, type) en mémoire)
+    TIMESERIES_STORE_ENABLED: bool = False
+    TIMESERIES_MAX_SERIES: int = 256  # au-delà, les séries les moins utilisées sont évincées
+    TIMESERIES_MAX_POINTS_PER_SERIES: int = 1_000_000  # séries plus longues : calcul en SQL
+    
+    # Compression des réponses (Accept-Encoding), encodages par ordre de préférence :
+    # zstd et br ignorés si zstandard / brotli ne sont pas installés
+    COMPRESSION_ENABLED: bool = True
+    COMPRESSION_ENCODINGS: list[str] = ["zstd", "br", "gzip"]
+    COMPRESSION_MIN_SIZE: int = 1024  # octets ; les réponses complètes plus petites partent telles quelles
+    COMPRESSION_GZIP_LEVEL: int = 6  # 1-9
+    COMPRESSION_BROTLI_QUALITY: int = 4  # 0-11
+    COMPRESSION_ZSTD_LEVEL: int = 3  # 1-22
+    
+    # Routes servies par lignes Core + encodeur JSON rapide (sans ORM ni Pydantic)
+    FAST_SERIALIZATION_ROUTES: list[str] = ["/indicators/", "/indicators/export"]
+    
+    # Rétention par type ("*" : défaut), ex. {"*": {"raw_days": 30, "hourly_days": 365}} :
+    # mesures brutes gardées 30 jours, agrégats horaires 1 an, journaliers et mensuels toujours
+    RETENTION_POLICIES: dict[str, dict[str, int]] = {}
+    RETENTION_INTERVAL_SECONDS: float = 3600.0  # compaction en tâche de fond dans l'API (0 : désactivée)
+    RETENTION_BATCH_SIZE: int = 5000  # lignes supprimées par transaction
+    RETENTION_VACUUM_PAGES: int = 1000  # pages libérées par étape de VACUUM incrémental
+    
+    # Clés de meta_info indexées (index d'expression json_extract) pour les filtres meta.<clé>=valeur
+    META_INDEXED_KEYS: list[str] = ["pollutant", "station", "sensor"]
+    META_MIGRATION_BATCH_SIZE: int = 5000  # lignes converties en JSON par transaction
+    
+    # Flux /indicators/stream (SSE, WebSocket)
+    STREAM_QUEUE_SIZE: int = 1000  # messages en attente par abonné, les plus anciens abandonnés au-delà
+    STREAM_POLL_INTERVAL_SECONDS: float = 1.0  # relève des écritures des autres processus
+    STREAM_HEARTBEAT_SECONDS: float = 15.0  # commentaire SSE / ping WebSocket sans activité
+    
+    # Métriques (/metrics) et instrumentation SQL
+    METRICS_ENABLED: bool = True
+    METRICS_SERVER_TIMING: bool = False  # en-tête Server-Timing (app, db) sur chaque réponse
+    SQL_QUERY_WARN_THRESHOLD: int = 20  # requêtes SQL par requête HTTP avant alerte N+1
+    
+    # Cache des utilisateurs authentifiés
+    PRINCIPAL_CACHE_SIZE: int = 10000
+    PRINCIPAL_CACHE_TTL_SECONDS: int = 60
+    PRINCIPAL_WATCH_INTERVAL_SECONDS: float = 2.0  # relève des changements d'utilisateurs (0 : TTL seul)
+    
     class Config:
         env_file = ".env"
 
@@ -1,16 +1,66 @@
-from sqlalchemy import create_engine
+from contextlib import asynccontextmanager
+from sqlalchemy import create_engine, event
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from starlette.concurrency import run_in_threadpool
 from app.config import settings
 
-# On crée le moteur de base de données
+def _is_sqlite(url: str) -> bool:
+    return url.startswith("sqlite")
+
+def _sqlite_pragmas(read_only: bool) -> list[str]:
+    """Profil SQLite appliqué à chaque nouvelle connexion"""
+    pragmas = [
+        f"PRAGMA busy_timeout = {settings.SQLITE_BUSY_TIMEOUT_MS}",
+        f"PRAGMA synchronous = {settings.SQLITE_SYNCHRONOUS}",
+        f"PRAGMA cache_size = {settings.SQLITE_CACHE_SIZE}",
+        f"PRAGMA mmap_size = {settings.SQLITE_MMAP_SIZE}",
+    ]
+    if read_only:
+        # Les lectures ne peuvent pas écrire, donc jamais prendre le verrou d'écriture
+        pragmas.append("PRAGMA query_only = ON")
+    else:
+        # Le mode WAL est persistant : la connexion d'écriture l'active.
+        # auto_vacuum n'a d'effet que sur une base encore vide (sinon après un VACUUM)
+        pragmas.insert(0, f"PRAGMA journal_mode = {settings.SQLITE_JOURNAL_MODE}")
+        pragmas.insert(0, f"PRAGMA auto_vacuum = {settings.SQLITE_AUTO_VACUUM}")
+    return pragmas
+
+def _apply_profile(sync_engine, read_only: bool = False):
+    """Branche le profil SQLite sur l'événement connect du moteur"""
+    if not _is_sqlite(str(sync_engine.url)) or not settings.SQLITE_PROFILE_ENABLED:
+        return
+    pragmas = _sqlite_pragmas(read_only)
+
+    @event.listens_for(sync_engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for pragma in pragmas:
+            cursor.execute(pragma)
+        cursor.close()
+
+def _connect_args(url: str) -> dict:
+    return {"check_same_thread": False} if _is_sqlite(url) else {}  # Nécessaire pour SQLite
+
+READ_DATABASE_URL = settings.READ_DATABASE_URL or settings.DATABASE_URL
+
+# On crée le moteur de base de données (lecture-écriture)
 engine = create_engine(
     settings.DATABASE_URL,
-    connect_args={"check_same_thread": False}  # Nécessaire pour SQLite
+    connect_args=_connect_args(settings.DATABASE_URL)
 )
+_apply_profile(engine)
 
-# La session locale
+# Moteur de lecture : pool séparé, connexions en lecture seule
+read_engine = create_engine(
+    READ_DATABASE_URL,
+    connect_args=_connect_args(READ_DATABASE_URL)
+)
+_apply_profile(read_engine, read_only=True)
+
+# Les sessions locales
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
 
 # La base pour les modèles
 Base = declarative_base()
@@ -21,4 +71,83 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+# Pilotes asynchrones équivalents aux URL synchrones
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+    "mysql": "mysql+aiomysql",
+}
+
+def async_database_url(url: str) -> str:
+    """Convertit une URL synchrone en URL utilisant le pilote async correspondant"""
+    scheme, rest = url.split("://", 1)
+    backend = scheme.split("+", 1)[0]
+    return f"{ASYNC_DRIVERS.get(backend, scheme)}://{rest}"
+
+# Moteurs asynchrones optionnels (DATABASE_ASYNC=true)
+async_engine = None
+async_read_engine = None
+AsyncSessionLocal = None
+AsyncReadSessionLocal = None
+
+if settings.DATABASE_ASYNC:
+    from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+    async_url = settings.ASYNC_DATABASE_URL or async_database_url(settings.DATABASE_URL)
+    async_read_url = (
+        async_database_url(settings.READ_DATABASE_URL) if settings.READ_DATABASE_URL else async_url
+    )
+
+    async_engine = create_async_engine(async_url)
+    _apply_profile(async_engine.sync_engine)
+    async_read_engine = create_async_engine(async_read_url)
+    _apply_profile(async_read_engine.sync_engine, read_only=True)
+
+    AsyncSessionLocal = async_sessionmaker(
+        async_engine, autoflush=False, expire_on_commit=False
+    )
+    AsyncReadSessionLocal = async_sessionmaker(
+        async_read_engine, autoflush=False, expire_on_commit=False
+    )
+
+class ThreadedSession:
+    """Session synchrone exposant run_sync() comme AsyncSession, via le threadpool"""
+
+    def __init__(self, session):
+        self.sync_session = session
+
+    async def run_sync(self, fn, *args, **kwargs):
+        return await run_in_threadpool(fn, self.sync_session, *args, **kwargs)
+
+    async def close(self):
+        await run_in_threadpool(self.sync_session.close)
+
+@asynccontextmanager
+async def _open_session(async_factory, sync_factory):
+    if async_factory is not None:
+        async with async_factory() as session:
+            yield session
+    else:
+        session = ThreadedSession(sync_factory())
+        try:
+            yield session
+        finally:
+            await session.close()
+
+# Dépendances des routes async : AsyncSession ou session synchrone selon la configuration.
+# Les routes appellent `await db.run_sync(fonction, ...)` dans les deux modes.
+async def get_session():
+    """Session lecture-écriture"""
+    async with _open_session(AsyncSessionLocal, SessionLocal) as session:
+        yield session
+
+async def get_read_session():
+    """Session en lecture seule, sur le pool de lecture (routes GET)"""
+    async with read_session() as session:
+        yield session
+
+def read_session():
+    """Session de lecture hors dépendance : flux longs et tâches de fond la ferment au plus tôt"""
+    return _open_session(AsyncReadSessionLocal, ReadSessionLocal)
@@ -1,11 +1,30 @@
+import asyncio
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from app.database import engine, Base
+from fastapi.responses import PlainTextResponse
+from app.config import settings
+from app.database import engine, read_engine, async_engine, async_read_engine, Base, SessionLocal
 from app.models import User, Zone, Indicator
 from app.routers import auth, zones, indicators, stats
+from app.utils.rollups import ensure_rollups
+from app.utils.sql import add_missing_columns, create_missing_indexes
+from app.utils.security import shutdown_hash_pool
+from app.utils import auth as auth_utils, meta, metrics, retention
+from app.utils.compression import CompressionMiddleware
 
-# Créer toutes les tables
+# Créer toutes les tables, puis les colonnes ajoutées depuis la création des tables existantes
 Base.metadata.create_all(bind=engine)
+add_missing_columns(engine, Base.metadata)
+
+# Créer les index ajoutés depuis la création des tables existantes (dont la clé naturelle)
+create_missing_indexes(engine, Base.metadata)
+
+# Construire les rollups si la base contient déjà des mesures, convertir les anciens
+# meta_info en JSON (json_extract échoue sur du texte libre), puis indexer les clés meta
+with SessionLocal() as db:
+    ensure_rollups(db)
+    meta.ensure_meta_info(db)
+meta.ensure_meta_indexes(engine)
 
 app = FastAPI(
     title="EcoTrack API",
@@ -20,14 +39,68 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
+# Compression négociée (zstd, br, gzip) des réponses au-delà de COMPRESSION_MIN_SIZE
+if settings.COMPRESSION_ENABLED:
+    app.add_middleware(CompressionMiddleware)
+
+# Métriques Prometheus : middleware le plus externe, requêtes SQL comptées par moteur
+if settings.METRICS_ENABLED:
+    metrics.instrument_engine(engine, "write")
+    metrics.instrument_engine(read_engine, "read")
+    if async_engine is not None:
+        metrics.instrument_engine(async_engine.sync_engine, "async_write")
+        metrics.instrument_engine(async_read_engine.sync_engine, "async_read")
+    app.add_middleware(metrics.MetricsMiddleware)
+
 # Inclure les routers
 app.include_router(auth.router)
 app.include_router(zones.router)
 app.include_router(indicators.router)
 app.include_router(stats.router)
 
+_compaction_task = None
+_principal_watch_task = None
+
+@app.on_event("startup")
+async def start_compaction():
+    # Rétention : compaction périodique si des politiques sont configurées
+    global _compaction_task
+    if settings.RETENTION_POLICIES and settings.RETENTION_INTERVAL_SECONDS > 0:
+        _compaction_task = asyncio.create_task(
+            retention.compaction_loop(settings.RETENTION_INTERVAL_SECONDS)
+        )
+
+@app.on_event("startup")
+async def start_principal_watch():
+    # Rôles et statuts modifiés hors de ce processus (update_admin.py, autres workers)
+    global _principal_watch_task
+    if settings.PRINCIPAL_WATCH_INTERVAL_SECONDS > 0:
+        _principal_watch_task = asyncio.create_task(
+            auth_utils.principal_watch_loop(settings.PRINCIPAL_WATCH_INTERVAL_SECONDS)
+        )
+
+@app.on_event("shutdown")
+def stop_hash_pool():
+    shutdown_hash_pool()
+
+@app.on_event("shutdown")
+async def stop_compaction():
+    if _compaction_task is not None:
+        _compaction_task.cancel()
+
+@app.on_event("shutdown")
+async def stop_principal_watch():
+    if _principal_watch_task is not None:
+        _principal_watch_task.cancel()
+
+@app.get("/metrics", include_in_schema=False)
+def get_metrics():
+    """Métriques au format texte Prometheus"""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
 @app.get("/")
 def read_root():
     return {"message": "Bienvenue sur EcoTrack API"}
\ No newline at end of file
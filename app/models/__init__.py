@@ -1,5 +1,24 @@
 from app.models.user import User
 from app.models.zone import Zone
 from app.models.indicator import Indicator
+from app.models.data_version import DataVersion
+from app.models.retention import RetentionHorizon
+from app.models.schema_migration import SchemaMigration
+from app.models.rollup import (
+    IndicatorRollupHourly, IndicatorRollupDaily, IndicatorRollupMonthly,
+    IndicatorSketchDaily, IndicatorSketchMonthly,
+)
 
-__all__ = ["User", "Zone", "Indicator"]
\ No newline at end of file
+__all__ = [
+    "User",
+    "Zone",
+    "Indicator",
+    "IndicatorRollupHourly",
+    "IndicatorRollupDaily",
+    "IndicatorRollupMonthly",
+    "IndicatorSketchDaily",
+    "IndicatorSketchMonthly",
+    "DataVersion",
+    "RetentionHorizon",
+    "SchemaMigration",
+]
\ No newline at end of file
@@ -0,0 +1,9 @@
+from sqlalchemy import Column, Integer, String
+from app.database import Base
+
+class DataVersion(Base):
+    __tablename__ = "data_versions"
+    
+    # Ex: "counter", "zones", "any", "type:co2", "zone:3", "series:3:co2"
+    scope = Column(String, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
@@ -1,10 +1,46 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey
+import json
+from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Index
 from sqlalchemy.orm import relationship
+from sqlalchemy.types import TypeDecorator
 from app.database import Base
 from datetime import datetime
 
+# Une mesure est identifiée par sa source, son type, sa zone et sa date
+NATURAL_KEY = ("source", "type", "zone_id", "timestamp")
+NATURAL_KEY_INDEX = "uq_indicators_source_type_zone_timestamp"
+
+def as_meta(value) -> dict:
+    """Objet meta_info : un texte JSON est décodé, un ancien texte libre devient {"description": texte}"""
+    if isinstance(value, dict):
+        return value
+    try:
+        parsed = json.loads(value)
+    except ValueError:
+        parsed = None
+    return parsed if isinstance(parsed, dict) else {"description": value}
+
+class MetaInfo(TypeDecorator):
+    """Objet JSON stocké en texte, interrogeable avec json_extract (voir app.utils.meta)"""
+    impl = String
+    cache_ok = True
+    
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        return json.dumps(as_meta(value), ensure_ascii=False, separators=(",", ":"))
+    
+    def process_result_value(self, value, dialect):
+        return None if value is None else as_meta(value)
+
 class Indicator(Base):
     __tablename__ = "indicators"
+    __table_args__ = (
+        # Index alignés sur le tri (timestamp, id) de la pagination par curseur
+        Index("ix_indicators_timestamp_id", "timestamp", "id"),
+        Index("ix_indicators_zone_timestamp_id", "zone_id", "timestamp", "id"),
+        Index("ix_indicators_type_timestamp_id", "type", "timestamp", "id"),
+        Index(NATURAL_KEY_INDEX, *NATURAL_KEY, unique=True),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     source = Column(String, nullable=False)  # Ex: "OpenAQ", "ADEME"
@@ -13,6 +49,6 @@ class Indicator(Base):
     unit = Column(String, nullable=False)  # Ex: "µg/m³", "kg", "kWh"
     timestamp = Column(DateTime, default=datetime.utcnow, nullable=False)
     zone_id = Column(Integer, ForeignKey("zones.id"), nullable=False)
-    meta_info = Column(String)  # JSON string pour infos supplémentaires    
+    meta_info = Column(MetaInfo)  # Ex: {"pollutant": "PM2.5", "station": "..."}
     # Relation avec la zone
     zone = relationship("Zone", back_populates="indicators")
\ No newline at end of file
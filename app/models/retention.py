@@ -0,0 +1,11 @@
+from sqlalchemy import Column, String, DateTime
+from app.database import Base
+
+class RetentionHorizon(Base):
+    __tablename__ = "retention_horizons"
+    
+    # Avant `horizon`, les données de cette granularité ("raw", "hourly") ont été
+    # compactées pour ce type : seuls restent les agrégats plus grossiers
+    type = Column(String, primary_key=True)
+    granularity = Column(String, primary_key=True)
+    horizon = Column(DateTime, nullable=False)
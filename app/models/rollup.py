@@ -0,0 +1,40 @@
+from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey
+from app.database import Base
+
+class RollupMixin:
+    # Clé : (zone, type, début du bucket)
+    zone_id = Column(Integer, ForeignKey("zones.id"), primary_key=True)
+    type = Column(String, primary_key=True)
+    bucket = Column(DateTime, primary_key=True)
+    
+    # Agrégats mergeables
+    value_count = Column(Integer, nullable=False, default=0)
+    value_sum = Column(Float, nullable=False, default=0.0)
+    value_min = Column(Float)
+    value_max = Column(Float)
+    value_sum_sq = Column(Float, nullable=False, default=0.0)
+
+class IndicatorRollupHourly(RollupMixin, Base):
+    __tablename__ = "indicator_rollups_hourly"
+
+class IndicatorRollupDaily(RollupMixin, Base):
+    __tablename__ = "indicator_rollups_daily"
+
+class IndicatorRollupMonthly(RollupMixin, Base):
+    __tablename__ = "indicator_rollups_monthly"
+
+class SketchMixin:
+    # Histogramme logarithmique creux (voir app.utils.sketches) : une ligne par bin non vide
+    zone_id = Column(Integer, ForeignKey("zones.id"), primary_key=True)
+    type = Column(String, primary_key=True)
+    bucket = Column(DateTime, primary_key=True)
+    bin = Column(Integer, primary_key=True)
+    
+    # Mergeable par simple somme
+    value_count = Column(Integer, nullable=False, default=0)
+
+class IndicatorSketchDaily(SketchMixin, Base):
+    __tablename__ = "indicator_sketches_daily"
+
+class IndicatorSketchMonthly(SketchMixin, Base):
+    __tablename__ = "indicator_sketches_monthly"
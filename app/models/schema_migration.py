@@ -0,0 +1,10 @@
+from sqlalchemy import Column, String, DateTime
+from app.database import Base
+from datetime import datetime
+
+class SchemaMigration(Base):
+    __tablename__ = "schema_migrations"
+    
+    # Migrations de données déjà appliquées, ex: "meta_info_json"
+    name = Column(String, primary_key=True)
+    applied_at = Column(DateTime, default=datetime.utcnow, nullable=False)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String
+from sqlalchemy import Column, Float, Integer, String
 from sqlalchemy.orm import relationship
 from app.database import Base
 
@@ -8,6 +8,9 @@ class Zone(Base):
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, nullable=False)
     postal_code = Column(String, index=True)
+    # Coordonnées WGS84 (optionnelles) : index spatial en mémoire, voir app.utils.geo
+    latitude = Column(Float)
+    longitude = Column(Float)
     
     # Relation avec les indicateurs
     indicators = relationship("Indicator", back_populates="zone")
\ No newline at end of file
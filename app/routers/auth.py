@@ -1,22 +1,48 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
+from starlette.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from datetime import timedelta
 from app.database import get_db
 from app.models.user import User
 from app.schemas.user import UserCreate, UserResponse
 from app.schemas.auth import Token
-from app.utils.security import verify_password, get_password_hash
-from app.utils.auth import create_access_token
+from app.utils.security import (
+    HashingPoolBusy,
+    hash_password_async,
+    verify_and_update_password_async,
+)
+from app.utils.auth import create_access_token, get_current_admin, principal_cache
 from app.config import settings
 
 router = APIRouter(prefix="/auth", tags=["Authentication"])
 
+# Les calculs bcrypt tournent dans un pool de processus : les routes sont async
+# et les accès base (courts) passent par le threadpool
+
+busy_exception = HTTPException(
+    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+    detail="Authentication service busy, retry later",
+    headers={"Retry-After": "1"},
+)
+
+def _find_user(db: Session, **filters):
+    user = db.query(User).filter_by(**filters).first()
+    # Rendre la connexion au pool avant d'attendre bcrypt (l'objet reste lisible)
+    db.close()
+    return user
+
+def _save_user(db: Session, user: User):
+    db.add(user)
+    db.commit()
+    db.refresh(user)
+    return user
+
 @router.post("/register", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
-def register(user: UserCreate, db: Session = Depends(get_db)):
+async def register(user: UserCreate, db: Session = Depends(get_db)):
     """Inscription d'un nouvel utilisateur"""
     # Vérifier si l'email existe déjà
-    db_user = db.query(User).filter(User.email == user.email).first()
+    db_user = await run_in_threadpool(_find_user, db, email=user.email)
     if db_user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -24,7 +50,7 @@ def register(user: UserCreate, db: Session = Depends(get_db)):
         )
     
     # Vérifier si le username existe déjà
-    db_user = db.query(User).filter(User.username == user.username).first()
+    db_user = await run_in_threadpool(_find_user, db, username=user.username)
     if db_user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -32,7 +58,10 @@ def register(user: UserCreate, db: Session = Depends(get_db)):
         )
     
     # Créer le nouvel utilisateur
-    hashed_password = get_password_hash(user.password)
+    try:
+        hashed_password = await hash_password_async(user.password)
+    except HashingPoolBusy:
+        raise busy_exception
     db_user = User(
         email=user.email,
         username=user.username,
@@ -40,25 +69,35 @@ def register(user: UserCreate, db: Session = Depends(get_db)):
         role="user"  # Par défaut, les nouveaux utilisateurs sont "user"
     )
     
-    db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
-    
-    return db_user
+    return await run_in_threadpool(_save_user, db, db_user)
 
 @router.post("/login", response_model=Token)
-def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
+async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
     """Connexion et génération du token JWT"""
     # Chercher l'utilisateur par email (on utilise username du form comme email)
-    user = db.query(User).filter(User.email == form_data.username).first()
+    user = await run_in_threadpool(_find_user, db, email=form_data.username)
+    
+    verified, new_hash = False, None
+    if user:
+        try:
+            verified, new_hash = await verify_and_update_password_async(
+                form_data.password, user.hashed_password
+            )
+        except HashingPoolBusy:
+            raise busy_exception
     
-    if not user or not verify_password(form_data.password, user.hashed_password):
+    if not verified:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
     
+    if new_hash:
+        # Paramètres de coût modifiés : on ré-hashe de façon transparente
+        user.hashed_password = new_hash
+        await run_in_threadpool(_save_user, db, user)
+    
     if not user.is_active:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -72,4 +111,9 @@ def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depend
         expires_delta=access_token_expires
     )
     
-    return {"access_token": access_token, "token_type": "bearer"}
\ No newline at end of file
+    return {"access_token": access_token, "token_type": "bearer"}
+
+@router.get("/cache-stats")
+def get_cache_stats(current_user = Depends(get_current_admin)):
+    """Compteurs du cache des utilisateurs authentifiés (admin only)"""
+    return principal_cache.stats()
\ No newline at end of file
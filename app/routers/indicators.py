@@ -1,101 +1,358 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+import asyncio
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Response, Request, WebSocket
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
+from sqlalchemy import select, tuple_
+from sqlalchemy.exc import IntegrityError
 from typing import List
 from datetime import datetime
-from app.database import get_db
+import json
+from app.database import get_session, get_read_session
 from app.models.indicator import Indicator
-from app.schemas.indicator import IndicatorCreate, IndicatorUpdate, IndicatorResponse
-from app.utils.auth import get_current_user, get_current_admin
+from app.schemas.indicator import IndicatorCreate, IndicatorUpdate, IndicatorResponse, BulkIndicatorResult
+from app.utils.auth import get_current_user, get_current_admin, get_stream_user, authenticate_stream
+from app.utils.rollups import add_to_rollups, refresh_rollups
+from app.utils.pagination import encode_cursor, decode_cursor
+from app.utils.bulk import ingest_chunk, BULK_CHUNK_SIZE, ON_CONFLICT_MODES
+from app.utils import export, geo, live, meta, retention, versions
+from app.utils.serialization import dumps_rows, fast_serialization, RawJSONResponse
 
 router = APIRouter(prefix="/indicators", tags=["Indicators"])
 
-@router.post("/", response_model=IndicatorResponse, status_code=status.HTTP_201_CREATED)
-def create_indicator(
-    indicator: IndicatorCreate, 
-    db: Session = Depends(get_db), 
-    current_user = Depends(get_current_admin)
-):
-    """Créer un nouvel indicateur (admin only)"""
-    indicator_data = indicator.dict()
+# Colonnes et ordre des champs de IndicatorResponse, pour le chemin rapide
+RESPONSE_COLUMNS = list(IndicatorResponse.model_fields)
+
+# Nombre maximal d'erreurs détaillées renvoyées par /bulk
+MAX_REPORTED_ERRORS = 1000
+
+def _check_not_compacted(db: Session, type: str, timestamp: datetime):
+    # Période déjà résumée dans les agrégats : la mesure brute n'est plus modifiable
+    if retention.is_compacted(db, type, timestamp):
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Indicators before the retention horizon of this type are compacted"
+        )
+
+def _create_indicator(db: Session, indicator: IndicatorCreate):
+    indicator_data = indicator.model_dump()
     if indicator_data.get("timestamp") is None:
         indicator_data["timestamp"] = datetime.utcnow()
+    _check_not_compacted(db, indicator_data["type"], indicator_data["timestamp"])
     
     db_indicator = Indicator(**indicator_data)
     db.add(db_indicator)
-    db.commit()
+    add_to_rollups(db, [db_indicator])
+    try:
+        db.commit()
+    except IntegrityError:
+        # Clé naturelle (source, type, zone_id, timestamp) déjà présente
+        db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Indicator already exists for this source, type, zone and timestamp"
+        )
     db.refresh(db_indicator)
     return db_indicator
 
-@router.get("/", response_model=List[IndicatorResponse])
-def get_indicators(
-    skip: int = 0,
-    limit: int = 100,
-    type: str | None = None,
-    zone_id: int | None = None,
-    date_from: datetime | None = None,
-    date_to: datetime | None = None,
-    db: Session = Depends(get_db),
-    current_user = Depends(get_current_user)
+@router.post("/", response_model=IndicatorResponse, status_code=status.HTTP_201_CREATED)
+async def create_indicator(
+    indicator: IndicatorCreate, 
+    db = Depends(get_session), 
+    current_user = Depends(get_current_admin)
 ):
-    # Récupérer les indicateurs avec filtres (authentification requise)
-    query = db.query(Indicator)
-    
-    # Filtres
+    """Créer un nouvel indicateur (admin only)"""
+    return await db.run_sync(_create_indicator, indicator)
+
+def _filter_indicators(query, type, zone_id, date_from, date_to, zone_ids=None, meta_filters=None):
+    """Filtres communs à la liste et à l'export (Query ORM ou select Core)"""
     if type:
         query = query.filter(Indicator.type == type)
     if zone_id:
         query = query.filter(Indicator.zone_id == zone_id)
+    if zone_ids is not None:
+        query = query.filter(geo.zone_in(Indicator.zone_id, zone_ids))
     if date_from:
         query = query.filter(Indicator.timestamp >= date_from)
     if date_to:
         query = query.filter(Indicator.timestamp <= date_to)
+    if meta_filters:
+        query = query.filter(meta.meta_condition(meta_filters))
+    return query
+
+async def _ndjson_lines(request: Request):
+    """Découpe le corps NDJSON en lignes au fil de la réception"""
+    buffer = b""
+    async for data in request.stream():
+        buffer += data
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            yield line
+    yield buffer
+
+@router.post("/bulk", response_model=BulkIndicatorResult)
+async def create_indicators_bulk(
+    request: Request,
+    on_conflict: str = Query("update", regex=f"^({'|'.join(ON_CONFLICT_MODES)})$"),
+    db = Depends(get_session),
+    current_user = Depends(get_current_admin)
+):
+    """Créer des indicateurs en masse (admin only) : tableau JSON ou flux NDJSON.
+    Une mesure déjà présente est mise à jour (on_conflict=update) ou ignorée (skip)"""
+    result = {"inserted": 0, "updated": 0, "skipped": 0, "failed": 0, "errors": []}
+    
+    def report(errors):
+        result["failed"] += len(errors)
+        room = MAX_REPORTED_ERRORS - len(result["errors"])
+        result["errors"].extend(
+            {"index": index, "detail": detail} for index, detail in errors[:room]
+        )
+    
+    async def flush(chunk):
+        # Validation + insertion d'un lot hors de la boucle d'événements
+        counts, errors = await db.run_sync(ingest_chunk, chunk, on_conflict)
+        for name, count in counts.items():
+            result[name] += count
+        report(errors)
     
-    indicators = query.offset(skip).limit(limit).all()
+    if "ndjson" in request.headers.get("content-type", ""):
+        chunk = []
+        index = 0
+        async for line in _ndjson_lines(request):
+            if not line.strip():
+                continue
+            try:
+                chunk.append((index, json.loads(line)))
+            except ValueError:
+                report([(index, "Invalid JSON")])
+            index += 1
+            if len(chunk) >= BULK_CHUNK_SIZE:
+                await flush(chunk)
+                chunk = []
+        if chunk:
+            await flush(chunk)
+    else:
+        try:
+            items = json.loads(await request.body())
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid JSON")
+        if not isinstance(items, list):
+            raise HTTPException(status_code=400, detail="Expected a JSON array")
+        
+        for start in range(0, len(items), BULK_CHUNK_SIZE):
+            await flush(list(enumerate(items[start:start + BULK_CHUNK_SIZE], start)))
+    
+    return result
+
+def _list_indicators(db: Session, skip, limit, cursor, type, zone_id, date_from, date_to, rows=False,
+                     area=None, meta_filters=None):
+    if rows:
+        # Lignes Core : ni identity map ni instances ORM
+        query = select(*(Indicator.__table__.c[name] for name in RESPONSE_COLUMNS))
+    else:
+        query = db.query(Indicator)
+    # Filtre géographique : zones résolues par l'index spatial en mémoire
+    zone_ids = area.zone_ids(db) if area is not None else None
+    query = _filter_indicators(query, type, zone_id, date_from, date_to, zone_ids, meta_filters)
+    query = query.order_by(Indicator.timestamp, Indicator.id)
+    
+    if cursor:
+        # Pagination par clé : on reprend après le dernier élément, sans OFFSET
+        try:
+            last_timestamp, last_id = decode_cursor(cursor)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        query = query.filter(
+            tuple_(Indicator.timestamp, Indicator.id) > tuple_(last_timestamp, last_id)
+        )
+    else:
+        query = query.offset(skip)
+    
+    # Un élément de plus pour savoir s'il existe une page suivante
+    query = query.limit(limit + 1)
+    indicators = db.execute(query).all() if rows else query.all()
+    has_more = len(indicators) > limit
+    indicators = indicators[:max(limit, 0)]
+    next_cursor = None
+    if has_more and indicators:
+        last = indicators[-1]
+        next_cursor = encode_cursor(last.timestamp, last.id)
+    return indicators, next_cursor
+
+@router.get("/", response_model=List[IndicatorResponse])
+async def get_indicators(
+    request: Request,
+    response: Response,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: str | None = None,
+    type: str | None = None,
+    zone_id: int | None = None,
+    date_from: datetime | None = None,
+    date_to: datetime | None = None,
+    area: geo.Area | None = Depends(geo.area_filter),
+    meta_filters: tuple | None = Depends(meta.meta_filter),
+    db = Depends(get_read_session),
+    current_user = Depends(get_current_user)
+):
+    # Récupérer les indicateurs avec filtres (authentification requise), dont
+    # meta.<clé>=valeur sur meta_info. Tri stable (timestamp, id) : le curseur de la
+    # page suivante est renvoyé dans l'en-tête X-Next-Cursor
+    fast = fast_serialization(request)
+    indicators, next_cursor = await db.run_sync(
+        _list_indicators, skip, limit, cursor, type, zone_id, date_from, date_to, fast, area, meta_filters
+    )
+    if fast:
+        headers = {"X-Next-Cursor": next_cursor} if next_cursor else None
+        return RawJSONResponse(dumps_rows(RESPONSE_COLUMNS, indicators), headers=headers)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
     return indicators
 
-@router.get("/{indicator_id}", response_model=IndicatorResponse)
-def get_indicator(
-    indicator_id: int, 
-    db: Session = Depends(get_db),
+@router.get("/export")
+async def export_indicators(
+    request: Request,
+    format: str = Query("ndjson", regex="^(ndjson|csv|arrow)$"),
+    type: str | None = None,
+    zone_id: int | None = None,
+    date_from: datetime | None = None,
+    date_to: datetime | None = None,
+    meta_filters: tuple | None = Depends(meta.meta_filter),
     current_user = Depends(get_current_user)
 ):
-    """Récupérer un indicateur par ID (authentification requise)"""
+    """Exporter les indicateurs en flux (authentification requise)"""
+    if format == "arrow" and export.pa is None:
+        raise HTTPException(
+            status_code=status.HTTP_501_NOT_IMPLEMENTED,
+            detail="Arrow export requires pyarrow"
+        )
+    
+    statement = _filter_indicators(
+        export.export_statement(), type, zone_id, date_from, date_to, meta_filters=meta_filters
+    )
+    statement = statement.order_by(Indicator.timestamp, Indicator.id)
+    
+    return StreamingResponse(
+        export.stream_export(statement, format, fast_json=fast_serialization(request)),
+        media_type=export.MEDIA_TYPES[format],
+        headers={"Content-Disposition": f"attachment; filename=indicators.{format}"}
+    )
+
+async def _sse_events(type, zone_id):
+    async for event, data, event_id in live.events(zone_id, type):
+        if event == "ping":
+            # Commentaire : garde la connexion ouverte à travers les proxies
+            yield ": ping\n\n"
+        elif event_id is None:
+            yield f"event: {event}\ndata: {data}\n\n"
+        else:
+            yield f"id: {event_id}\nevent: {event}\ndata: {data}\n\n"
+
+@router.get("/stream")
+async def stream_indicators(
+    type: str | None = None,
+    zone_id: int | None = None,
+    current_user = Depends(get_stream_user)
+):
+    """Nouveaux indicateurs en Server-Sent Events (authentification requise)"""
+    return StreamingResponse(
+        _sse_events(type, zone_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+async def _websocket_events(websocket: WebSocket, type, zone_id):
+    async for event, data, _ in live.events(zone_id, type):
+        await websocket.send_text(f'{{"event":"{event}","data":{data}}}')
+
+async def _until_disconnect(websocket: WebSocket):
+    while (await websocket.receive())["type"] != "websocket.disconnect":
+        pass
+
+@router.websocket("/stream")
+async def stream_indicators_websocket(
+    websocket: WebSocket,
+    type: str | None = None,
+    zone_id: int | None = None,
+    token: str | None = None
+):
+    """Nouveaux indicateurs en WebSocket ; token en en-tête Authorization ou en paramètre"""
+    scheme, _, header_token = websocket.headers.get("authorization", "").partition(" ")
+    try:
+        await authenticate_stream(header_token if scheme.lower() == "bearer" else token)
+    except HTTPException:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    
+    await websocket.accept()
+    # L'envoi s'arrête dès que le client se déconnecte, même sans message en attente
+    tasks = [
+        asyncio.create_task(_websocket_events(websocket, type, zone_id)),
+        asyncio.create_task(_until_disconnect(websocket)),
+    ]
+    try:
+        await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+def _get_indicator_or_404(db: Session, indicator_id: int):
     indicator = db.query(Indicator).filter(Indicator.id == indicator_id).first()
     if not indicator:
         raise HTTPException(status_code=404, detail="Indicator not found")
     return indicator
 
-@router.put("/{indicator_id}", response_model=IndicatorResponse)
-def update_indicator(
-    indicator_id: int,
-    indicator: IndicatorUpdate,
-    db: Session = Depends(get_db),
-    current_user = Depends(get_current_admin)
+@router.get("/{indicator_id}", response_model=IndicatorResponse)
+async def get_indicator(
+    indicator_id: int, 
+    db = Depends(get_read_session),
+    current_user = Depends(get_current_user)
 ):
-    # Mettre à jour un indicateur (admin)
-    db_indicator = db.query(Indicator).filter(Indicator.id == indicator_id).first()
-    if not db_indicator:
-        raise HTTPException(status_code=404, detail="Indicator not found")
+    """Récupérer un indicateur par ID (authentification requise)"""
+    return await db.run_sync(_get_indicator_or_404, indicator_id)
+
+def _update_indicator(db: Session, indicator_id: int, indicator: IndicatorUpdate):
+    db_indicator = _get_indicator_or_404(db, indicator_id)
     
-    update_data = indicator.dict(exclude_unset=True)
+    update_data = indicator.model_dump(exclude_unset=True)
+    _check_not_compacted(db, db_indicator.type, db_indicator.timestamp)
     for key, value in update_data.items():
         setattr(db_indicator, key, value)
     
+    if "value" in update_data:
+        # Recalcule les buckets et incrémente la version de la série
+        refresh_rollups(db, db_indicator.zone_id, db_indicator.type, db_indicator.timestamp)
+    else:
+        # meta_info seul : agrégats inchangés, mais statistiques filtrées par meta.<clé> périmées
+        versions.bump_series(db, {(db_indicator.zone_id, db_indicator.type)})
+    
     db.commit()
     db.refresh(db_indicator)
     return db_indicator
 
-@router.delete("/{indicator_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_indicator(
+@router.put("/{indicator_id}", response_model=IndicatorResponse)
+async def update_indicator(
     indicator_id: int,
-    db: Session = Depends(get_db),
+    indicator: IndicatorUpdate,
+    db = Depends(get_session),
     current_user = Depends(get_current_admin)
 ):
-    # Supprimer un indicateur (admin)
-    db_indicator = db.query(Indicator).filter(Indicator.id == indicator_id).first()
-    if not db_indicator:
-        raise HTTPException(status_code=404, detail="Indicator not found")
-    
+    # Mettre à jour un indicateur (admin)
+    return await db.run_sync(_update_indicator, indicator_id, indicator)
+
+def _delete_indicator(db: Session, indicator_id: int):
+    db_indicator = _get_indicator_or_404(db, indicator_id)
+    _check_not_compacted(db, db_indicator.type, db_indicator.timestamp)
     db.delete(db_indicator)
+    refresh_rollups(db, db_indicator.zone_id, db_indicator.type, db_indicator.timestamp)
     db.commit()
-    return None
\ No newline at end of file
+
+@router.delete("/{indicator_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def delete_indicator(
+    indicator_id: int,
+    db = Depends(get_session),
+    current_user = Depends(get_current_admin)
+):
+    # Supprimer un indicateur (admin)
+    await db.run_sync(_delete_indicator, indicator_id)
+    return None
@@ -1,98 +1,636 @@
-from fastapi import APIRouter, Depends, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
 from sqlalchemy.orm import Session
 from sqlalchemy import func
+import itertools
+import math
 from datetime import datetime
-from typing import List, Dict
-from app.database import get_db
+from app.database import get_read_session
+from app.schemas.stats import StatsQuery
 from app.models.indicator import Indicator
 from app.utils.auth import get_current_user
+from app.utils.rollups import (
+    ROLLUP_MODELS, GRANULARITIES, SKETCH_MODELS, SKETCH_GRANULARITIES, is_aligned
+)
+from app.utils.http_cache import cached_json
+from app.utils import geo, meta, retention, timeseries, sketches, versions
+from app.utils.downsampling import METHODS as DOWNSAMPLING_METHODS
+from app.utils.versions import series_scope
 
 router = APIRouter(prefix="/stats", tags=["Statistics"])
 
+# Expressions SQL qui calculent la clé de période directement dans la base
+def _period_bucket(column, period: str):
+    """Retourne l'expression SQL de regroupement pour une période"""
+    if period == "hourly":
+        return func.strftime("%Y-%m-%d %H:00", column)
+    if period == "daily":
+        return func.strftime("%Y-%m-%d", column)
+    if period == "weekly":
+        # Lundi de la semaine (ISO) contenant la mesure
+        return func.date(column, "weekday 0", "-6 days")
+    return func.strftime("%Y-%m", column)
+
+def _rollup_granularity(date_from, date_to, candidates=GRANULARITIES):
+    """Rollup le plus grossier dont les frontières coïncident avec la plage demandée"""
+    for granularity in candidates:
+        if is_aligned(granularity, date_from) and is_aligned(granularity, date_to):
+            return granularity
+    return None
+
+class _Types:
+    """Groupe de types de même profil de rétention (requêtes sans type) : les types listés,
+    ou avec `exclude` tous les autres (types jamais compactés)"""
+    def __init__(self, types, exclude=False):
+        self.types = list(types)
+        self.exclude = exclude
+    
+    def condition(self, column):
+        return column.notin_(self.types) if self.exclude else column.in_(self.types)
+
+def _type_condition(column, type):
+    return type.condition(column) if isinstance(type, _Types) else column == type
+
+def _type_groups(db: Session, type):
+    """Sans type, chaque type doit être découpé à ses propres horizons : un groupe par profil
+    d'horizons, plus un groupe pour les types non compactés"""
+    if type is not None:
+        return [type]
+    by_type = retention.horizons_by_type(db)
+    if not by_type:
+        return [None]
+    profiles = {}
+    for type_, horizons in sorted(by_type.items()):
+        profiles.setdefault(tuple(sorted(horizons.items())), []).append(type_)
+    return [_Types(types) for types in profiles.values()] + [_Types(by_type, exclude=True)]
+
+def _filter_raw(query, type, zone_id, date_from, date_to, zone_ids=None, meta_filters=None):
+    if type:
+        query = query.filter(_type_condition(Indicator.type, type))
+    if zone_id:
+        query = query.filter(Indicator.zone_id == zone_id)
+    if zone_ids is not None:
+        query = query.filter(geo.zone_in(Indicator.zone_id, zone_ids))
+    if date_from:
+        query = query.filter(Indicator.timestamp >= date_from)
+    if date_to:
+        query = query.filter(Indicator.timestamp <= date_to)
+    if meta_filters:
+        query = query.filter(meta.meta_condition(meta_filters))
+    return query
+
+def _split(db: Session, type, date_from, date_to, candidates=GRANULARITIES, meta_filters=None):
+    # Les agrégats ne conservent pas meta_info : avec un filtre meta, mesures brutes seulement.
+    # Une plage qui commence avant l'horizon brut est refusée plutôt que tronquée en silence.
+    if isinstance(type, _Types):
+        if type.exclude:
+            # Types non compactés : tout est encore brut
+            return [], (date_from, date_to)
+        type = type.types[0]  # même profil d'horizons pour tout le groupe
+    if meta_filters:
+        raw = retention.horizons(db, type).get(retention.RAW)
+        if raw is not None and (date_from is None or date_from.replace(tzinfo=None) < raw):
+            raise HTTPException(
+                status_code=409,
+                detail=f"meta filters need raw indicators: date_from must be at or after {raw.isoformat()} (compacted before)"
+            )
+        return [], (date_from, date_to)
+    return retention.split(db, type, date_from, date_to, candidates)
+
+def _raw_granularity(date_from, date_to, candidates, meta_filters):
+    return None if meta_filters else _rollup_granularity(date_from, date_to, candidates)
+
+def _filter_rollup(query, model, type, zone_id, date_from, date_to, zone_ids=None):
+    # Les buckets couvrent [date_from, date_to[ ; la borne date_to est traitée à part
+    if type:
+        query = query.filter(_type_condition(model.type, type))
+    if zone_id:
+        query = query.filter(model.zone_id == zone_id)
+    if zone_ids is not None:
+        query = query.filter(geo.zone_in(model.zone_id, zone_ids))
+    if date_from:
+        query = query.filter(model.bucket >= date_from)
+    if date_to:
+        query = query.filter(model.bucket < date_to)
+    return query
+
+def _merge(totals, key, total, count):
+    previous = totals.get(key, (0.0, 0))
+    totals[key] = (previous[0] + total, previous[1] + count)
+
+def _rollup_average_totals(db: Session, totals, granularity, type, zone_id, date_from, date_to,
+                           zone_ids=None):
+    # Lecture depuis les agrégats pré-calculés
+    model = ROLLUP_MODELS[granularity]
+    query = db.query(
+        model.zone_id,
+        model.type,
+        func.sum(model.value_sum).label("total"),
+        func.sum(model.value_count).label("count")
+    )
+    query = _filter_rollup(query, model, type, zone_id, date_from, date_to, zone_ids)
+    for r in query.group_by(model.zone_id, model.type):
+        _merge(totals, (r.zone_id, r.type), r.total, r.count)
+
+def _sql_average_totals(db: Session, type, zone_id, segments, raw_range, zone_ids=None, meta_filters=None):
+    totals = {}
+    # Portions compactées : seuls les agrégats y subsistent
+    for granularity, start, stop in segments:
+        _rollup_average_totals(db, totals, granularity, type, zone_id, start, stop, zone_ids)
+    if raw_range is None:
+        return totals
+    
+    date_from, date_to = raw_range
+    granularity = _raw_granularity(date_from, date_to, GRANULARITIES, meta_filters)
+    if granularity:
+        _rollup_average_totals(db, totals, granularity, type, zone_id, date_from, date_to, zone_ids)
+    
+    if not granularity or date_to:
+        # Données brutes : plage complète, ou seulement les mesures pile sur date_to
+        raw_from = date_to if granularity else date_from
+        query = db.query(
+            Indicator.zone_id,
+            Indicator.type,
+            func.sum(Indicator.value).label("total"),
+            func.count(Indicator.id).label("count")
+        )
+        query = _filter_raw(query, type, zone_id, raw_from, date_to, zone_ids, meta_filters)
+        for r in query.group_by(Indicator.zone_id, Indicator.type):
+            _merge(totals, (r.zone_id, r.type), r.total, r.count)
+    return totals
+
+def _average_totals(db: Session, type, zone_id, date_from, date_to, area=None, meta_filters=None):
+    segments, raw_range = _split(db, type, date_from, date_to, meta_filters=meta_filters)
+    if area is not None:
+        # Zones du filtre géographique, passées en SQL (le store couvre des séries entières)
+        zone_ids = area.zone_ids(db)
+        totals = _sql_average_totals(
+            db, type, zone_id, segments, raw_range, zone_ids, meta_filters
+        ) if zone_ids else {}
+    else:
+        totals = None
+        if not segments and not meta_filters and not isinstance(type, _Types):
+            totals = timeseries.average_totals(db, type, zone_id, date_from, date_to)
+        if totals is None:
+            totals = _sql_average_totals(db, type, zone_id, segments, raw_range, meta_filters=meta_filters)
+    return totals
+
+def _compute_averages(db: Session, type, zone_id, date_from, date_to, area=None, meta_filters=None):
+    # Calculer les moyennes des indicateurs par zone et type (groupes de types disjoints)
+    totals = {}
+    for group in _type_groups(db, type):
+        totals.update(_average_totals(db, group, zone_id, date_from, date_to, area, meta_filters))
+    
+    return {
+        "data": [
+            {
+                "zone_id": key[0],
+                "type": key[1],
+                "average": round(total / count, 2),
+                "count": count
+            }
+            for key, (total, count) in sorted(totals.items())
+        ]
+    }
+
 @router.get("/averages")
-def get_averages(
+async def get_averages(
+    request: Request,
     type: str | None = None,
     zone_id: int | None = None,
     date_from: datetime | None = None,
     date_to: datetime | None = None,
-    db: Session = Depends(get_db),
+    area: geo.Area | None = Depends(geo.area_filter),
+    meta_filters: tuple | None = Depends(meta.meta_filter),
+    db = Depends(get_read_session),
     current_user = Depends(get_current_user)
 ):
-    # Calculer les moyennes des indicateurs par zone et type
+    # Avec un filtre géographique, la réponse dépend aussi des coordonnées des zones
+    scope = series_scope(zone_id, type)
+    return await cached_json(
+        request, db, scope if area is None else (scope, versions.ZONES),
+        _compute_averages, type, zone_id, date_from, date_to, area, meta_filters
+    )
+
+# Agrégats dont les buckets tiennent dans une période, du plus grossier au plus fin
+TREND_GRANULARITIES = {
+    "hourly": ["hourly"],
+    "daily": ["daily", "hourly"],
+    "weekly": ["daily", "hourly"],
+    "monthly": ["monthly", "daily", "hourly"],
+}
+
+def _rollup_trend_totals(db: Session, totals, granularity, type, zone_id, period, date_from, date_to):
+    # Les semaines sont reconstituées à partir des rollups journaliers
+    model = ROLLUP_MODELS[granularity]
+    bucket = _period_bucket(model.bucket, period).label("period")
     query = db.query(
-        Indicator.zone_id,
-        Indicator.type,
-        func.avg(Indicator.value).label('average'),
-        func.count(Indicator.id).label('count')
+        bucket,
+        func.sum(model.value_sum).label("total"),
+        func.sum(model.value_count).label("count")
     )
+    query = _filter_rollup(query, model, type, zone_id, date_from, date_to)
+    for r in query.group_by(bucket):
+        _merge(totals, r.period, r.total, r.count)
+
+def _sql_trend_totals(db: Session, type, zone_id, period, segments, raw_range, meta_filters=None):
+    # Agrégation faite en SQL (rollups + données brutes)
+    totals = {}
+    for granularity, start, stop in segments:
+        _rollup_trend_totals(db, totals, granularity, type, zone_id, period, start, stop)
+    if raw_range is None:
+        return totals
     
-    # Filtres
-    if type:
-        query = query.filter(Indicator.type == type)
-    if zone_id:
-        query = query.filter(Indicator.zone_id == zone_id)
-    if date_from:
-        query = query.filter(Indicator.timestamp >= date_from)
-    if date_to:
-        query = query.filter(Indicator.timestamp <= date_to)
+    date_from, date_to = raw_range
+    granularity = _raw_granularity(
+        date_from, date_to, ["daily" if period == "weekly" else period], meta_filters
+    )
+    if granularity:
+        _rollup_trend_totals(db, totals, granularity, type, zone_id, period, date_from, date_to)
     
-    results = query.group_by(Indicator.zone_id, Indicator.type).all()
+    if not granularity or date_to:
+        raw_from = date_to if granularity else date_from
+        bucket = _period_bucket(Indicator.timestamp, period).label("period")
+        query = db.query(
+            bucket,
+            func.sum(Indicator.value).label("total"),
+            func.count(Indicator.id).label("count")
+        )
+        query = _filter_raw(query, type, zone_id, raw_from, date_to, meta_filters=meta_filters)
+        for r in query.group_by(bucket):
+            _merge(totals, r.period, r.total, r.count)
+    return totals
+
+def _compute_trend(db: Session, type, zone_id, period, date_from, date_to, meta_filters=None):
+    # Obtenir la tendance des indicateurs par période (store en mémoire si activé, sinon SQL)
+    segments, raw_range = _split(db, type, date_from, date_to, TREND_GRANULARITIES[period], meta_filters)
+    totals = None
+    if not segments and not meta_filters:
+        totals = timeseries.trend_totals(db, type, zone_id, period, date_from, date_to)
+    if totals is None:
+        totals = _sql_trend_totals(db, type, zone_id, period, segments, raw_range, meta_filters)
     
     return {
+        "type": type,
+        "zone_id": zone_id,
+        "period": period,
         "data": [
             {
-                "zone_id": r.zone_id,
-                "type": r.type,
-                "average": round(r.average, 2),
-                "count": r.count
+                "period": period_key,
+                "average": round(total / count, 2),
+                "count": count
             }
-            for r in results
+            for period_key, (total, count) in sorted(totals.items())
         ]
     }
 
 @router.get("/trend")
-def get_trend(
+async def get_trend(
+    request: Request,
     type: str,
     zone_id: int | None = None,
-    period: str = Query("monthly", regex="^(daily|monthly)$"),
-    db: Session = Depends(get_db),
+    period: str = Query("monthly", regex="^(hourly|daily|weekly|monthly)$"),
+    date_from: datetime | None = None,
+    date_to: datetime | None = None,
+    meta_filters: tuple | None = Depends(meta.meta_filter),
+    db = Depends(get_read_session),
     current_user = Depends(get_current_user)
 ):
-    # Obtenir la tendance des indicateurs par période
-    query = db.query(Indicator).filter(Indicator.type == type)
+    return await cached_json(
+        request, db, series_scope(zone_id, type),
+        _compute_trend, type, zone_id, period, date_from, date_to, meta_filters
+    )
+
+def _parse_percentiles(raw: str) -> tuple:
+    try:
+        values = tuple(float(item) for item in raw.split(",") if item.strip())
+    except ValueError:
+        values = ()
+    if not values or any(not 0 <= value <= 100 for value in values):
+        raise HTTPException(status_code=422, detail="percentiles must be numbers between 0 and 100")
+    return values
+
+def _merge_summary(summaries, key, count, total, minimum, maximum, total_sq):
+    previous = summaries.get(key)
+    if previous is None:
+        summaries[key] = [count, total, minimum, maximum, total_sq]
+    else:
+        previous[0] += count
+        previous[1] += total
+        previous[2] = min(previous[2], minimum)
+        previous[3] = max(previous[3], maximum)
+        previous[4] += total_sq
+
+def _rollup_distribution(db: Session, summaries, sketch_bins, granularity, type, zone_id, date_from, date_to):
+    model = ROLLUP_MODELS[granularity]
+    query = db.query(
+        model.type,
+        func.sum(model.value_count),
+        func.sum(model.value_sum),
+        func.min(model.value_min),
+        func.max(model.value_max),
+        func.sum(model.value_sum_sq)
+    )
+    query = _filter_rollup(query, model, type, zone_id, date_from, date_to)
+    for row in query.group_by(model.type):
+        _merge_summary(summaries, *row)
     
-    if zone_id:
-        query = query.filter(Indicator.zone_id == zone_id)
+    sketch = SKETCH_MODELS[granularity]
+    query = db.query(sketch.type, sketch.bin, func.sum(sketch.value_count))
+    query = _filter_rollup(query, sketch, type, zone_id, date_from, date_to)
+    for type_, bin_, count in query.group_by(sketch.type, sketch.bin):
+        sketches.merge(sketch_bins.setdefault(type_, {}), {bin_: count})
+
+def _distribution_totals(db: Session, type, zone_id, date_from, date_to, meta_filters=None):
+    summaries = {}
+    sketch_bins = {}
+    segments, raw_range = _split(db, type, date_from, date_to, SKETCH_GRANULARITIES, meta_filters)
+    for granularity, start, stop in segments:
+        _rollup_distribution(db, summaries, sketch_bins, granularity, type, zone_id, start, stop)
+    if raw_range is None:
+        return summaries, sketch_bins
     
-    indicators = query.order_by(Indicator.timestamp).all()
+    date_from, date_to = raw_range
+    granularity = _raw_granularity(date_from, date_to, SKETCH_GRANULARITIES, meta_filters)
+    if granularity:
+        _rollup_distribution(db, summaries, sketch_bins, granularity, type, zone_id, date_from, date_to)
     
-    # Regrouper par période
-    trends = {}
-    for indicator in indicators:
-        if period == "monthly":
-            key = indicator.timestamp.strftime("%Y-%m")
-        else:  # daily
-            key = indicator.timestamp.strftime("%Y-%m-%d")
-        
-        if key not in trends:
-            trends[key] = {"values": [], "count": 0}
+    if not granularity or date_to:
+        raw_from = date_to if granularity else date_from
+        query = db.query(
+            Indicator.type,
+            func.count(Indicator.id),
+            func.sum(Indicator.value),
+            func.min(Indicator.value),
+            func.max(Indicator.value),
+            func.sum(Indicator.value * Indicator.value)
+        )
+        query = _filter_raw(query, type, zone_id, raw_from, date_to, meta_filters=meta_filters)
+        for row in query.group_by(Indicator.type):
+            _merge_summary(summaries, *row)
         
-        trends[key]["values"].append(indicator.value)
-        trends[key]["count"] += 1
-    
-    # Calculer les moyennes
-    result = []
-    for period_key, data in sorted(trends.items()):
-        avg_value = sum(data["values"]) / len(data["values"])
-        result.append({
-            "period": period_key,
-            "average": round(avg_value, 2),
-            "count": data["count"]
+        query = _filter_raw(
+            db.query(Indicator.type, Indicator.value), type, zone_id, raw_from, date_to, meta_filters=meta_filters
+        )
+        for type_, value in query.yield_per(5000):
+            sketches.add_value(sketch_bins.setdefault(type_, {}), value)
+    return summaries, sketch_bins
+
+def _compute_distribution(db: Session, type, zone_id, date_from, date_to, percentiles, bins, meta_filters=None):
+    # Distribution par type, fusionnée sur les zones et les buckets via les sketches
+    summaries, sketch_bins = {}, {}
+    for group in _type_groups(db, type):
+        group_summaries, group_bins = _distribution_totals(db, group, zone_id, date_from, date_to, meta_filters)
+        summaries.update(group_summaries)
+        sketch_bins.update(group_bins)
+    
+    data = []
+    for type_, (count, total, minimum, maximum, total_sq) in sorted(summaries.items()):
+        mean = total / count
+        variance = max(total_sq / count - mean * mean, 0.0)
+        values = sketches.quantiles(
+            sketch_bins.get(type_, {}), [p / 100 for p in percentiles], minimum, maximum
+        )
+        data.append({
+            "type": type_,
+            "count": count,
+            "average": round(mean, 2),
+            "stddev": round(math.sqrt(variance), 2),
+            "min": minimum,
+            "max": maximum,
+            "percentiles": {f"p{p:g}": round(value, 2) for p, value in zip(percentiles, values)},
+            "histogram": [
+                {"lower": round(b["lower"], 2), "upper": round(b["upper"], 2), "count": b["count"]}
+                for b in sketches.histogram(sketch_bins.get(type_, {}), minimum, maximum, bins)
+            ]
         })
     
     return {
         "type": type,
         "zone_id": zone_id,
-        "period": period,
-        "data": result
-    }
\ No newline at end of file
+        "relative_accuracy": sketches.RELATIVE_ACCURACY,
+        "data": data
+    }
+
+@router.get("/distribution")
+async def get_distribution(
+    request: Request,
+    type: str | None = None,
+    zone_id: int | None = None,
+    date_from: datetime | None = None,
+    date_to: datetime | None = None,
+    percentiles: str = "50,95,99",
+    bins: int = Query(10, ge=1, le=100),
+    meta_filters: tuple | None = Depends(meta.meta_filter),
+    db = Depends(get_read_session),
+    current_user = Depends(get_current_user)
+):
+    """Percentiles, écart-type, min/max et histogramme par type"""
+    return await cached_json(
+        request, db, series_scope(zone_id, type),
+        _compute_distribution, type, zone_id, date_from, date_to,
+        _parse_percentiles(percentiles), bins, meta_filters
+    )
+
+def _compacted_points(db: Session, segments, type, zone_id):
+    """Moyennes par bucket (toutes zones) des portions compactées, dans l'ordre"""
+    for granularity, start, stop in segments:
+        model = ROLLUP_MODELS[granularity]
+        query = db.query(model.bucket, func.sum(model.value_sum) / func.sum(model.value_count))
+        query = _filter_rollup(query, model, type, zone_id, start, stop)
+        yield from query.group_by(model.bucket).order_by(model.bucket).all()
+
+def _compute_series(db: Session, type, zone_id, date_from, date_to, points, method, meta_filters=None):
+    # Comptage puis lecture en flux, sans instantané commun (pysqlite n'ouvre pas de transaction
+    # pour une lecture) : une écriture entre les deux décale le compte. La réduction reste bornée :
+    # lignes au-delà du compte ignorées, série plus courte renvoyée avec moins de points.
+    segments, raw_range = _split(db, type, date_from, date_to, ["hourly"], meta_filters)
+    compacted = list(_compacted_points(db, segments, type, zone_id))
+    total = len(compacted)
+    rows = iter(compacted)
+    if raw_range is not None:
+        date_from, date_to = raw_range
+        total += _filter_raw(
+            db.query(func.count(Indicator.id)), type, zone_id, date_from, date_to, meta_filters=meta_filters
+        ).scalar()
+        query = _filter_raw(
+            db.query(Indicator.timestamp, Indicator.value), type, zone_id, date_from, date_to,
+            meta_filters=meta_filters
+        ).order_by(Indicator.timestamp, Indicator.id)
+        rows = itertools.chain(rows, query.yield_per(5000))
+    sampled = DOWNSAMPLING_METHODS[method](rows, total, points)
+    
+    return {
+        "type": type,
+        "zone_id": zone_id,
+        "method": method,
+        "total": total,
+        "data": [{"timestamp": timestamp, "value": value} for timestamp, value in sampled]
+    }
+
+@router.get("/series")
+async def get_series(
+    request: Request,
+    type: str,
+    zone_id: int | None = None,
+    date_from: datetime | None = None,
+    date_to: datetime | None = None,
+    points: int = Query(800, ge=3, le=10000),
+    method: str = Query("lttb", regex="^(lttb|minmax)$"),
+    meta_filters: tuple | None = Depends(meta.meta_filter),
+    db = Depends(get_read_session),
+    current_user = Depends(get_current_user)
+):
+    """Série réduite à au plus `points` points pour les graphiques"""
+    return await cached_json(
+        request, db, series_scope(zone_id, type),
+        _compute_series, type, zone_id, date_from, date_to, points, method, meta_filters
+    )
+
+# --- Requête groupée de plusieurs séries (/stats/query) ---
+
+def _group_keys(type_column, zone_column, time_column, by_zone, period):
+    keys = [type_column]
+    if by_zone:
+        keys.append(zone_column)
+    if period:
+        keys.append(_period_bucket(time_column, period))
+    return keys
+
+def _merge_stats(groups, key, count, total, minimum, maximum):
+    previous = groups.get(key)
+    if previous is None:
+        groups[key] = [count, total, minimum, maximum]
+    else:
+        previous[0] += count
+        previous[1] += total
+        previous[2] = min(previous[2], minimum)
+        previous[3] = max(previous[3], maximum)
+
+def _merge_groups(groups, rows, by_zone, period):
+    # Lignes (clés..., nombre, somme, min, max) -> {(type, zone_id, période): [nombre, somme, min, max]}
+    width = 1 + by_zone + bool(period)
+    for row in rows:
+        keys, values = row[:width], row[width:]
+        if values[0]:
+            key = (keys[0], keys[1] if by_zone else None, keys[-1] if period else None)
+            _merge_stats(groups, key, *values)
+
+def _rollup_groups(db: Session, groups, granularity, types, zone_ids, by_zone, period, date_from, date_to):
+    model = ROLLUP_MODELS[granularity]
+    keys = _group_keys(model.type, model.zone_id, model.bucket, by_zone, period)
+    query = db.query(
+        *keys,
+        func.sum(model.value_count),
+        func.sum(model.value_sum),
+        func.min(model.value_min),
+        func.max(model.value_max)
+    ).filter(model.type.in_(types))
+    query = _filter_rollup(query, model, None, None, date_from, date_to, zone_ids)
+    _merge_groups(groups, query.group_by(*keys), by_zone, period)
+
+def _grouped_totals(db: Session, types, zone_ids, by_zone, period, date_from, date_to, meta_filters=None):
+    """Un seul parcours pour toutes les séries d'une même plage et période : regroupement
+    par type (puis zone, période) en SQL, chaque série est ensuite une fusion de groupes.
+    Les types ont les mêmes horizons de rétention : le découpage du premier vaut pour tous"""
+    groups = {}
+    candidates = TREND_GRANULARITIES[period] if period else GRANULARITIES
+    segments, raw_range = _split(db, types[0], date_from, date_to, candidates, meta_filters)
+    for granularity, start, stop in segments:
+        _rollup_groups(db, groups, granularity, types, zone_ids, by_zone, period, start, stop)
+    if raw_range is None:
+        return groups
+    
+    date_from, date_to = raw_range
+    granularity = _raw_granularity(
+        date_from, date_to, ["daily" if period == "weekly" else period] if period else GRANULARITIES,
+        meta_filters
+    )
+    if granularity:
+        _rollup_groups(db, groups, granularity, types, zone_ids, by_zone, period, date_from, date_to)
+    
+    if not granularity or date_to:
+        raw_from = date_to if granularity else date_from
+        keys = _group_keys(Indicator.type, Indicator.zone_id, Indicator.timestamp, by_zone, period)
+        query = db.query(
+            *keys,
+            func.count(Indicator.id),
+            func.sum(Indicator.value),
+            func.min(Indicator.value),
+            func.max(Indicator.value)
+        ).filter(Indicator.type.in_(types))
+        query = _filter_raw(query, None, None, raw_from, date_to, zone_ids, meta_filters)
+        _merge_groups(groups, query.group_by(*keys), by_zone, period)
+    return groups
+
+def _aggregate(aggregate: str, count, total, minimum, maximum):
+    if aggregate == "avg":
+        return round(total / count, 2)
+    if aggregate == "sum":
+        return round(total, 2)
+    if aggregate == "count":
+        return count
+    return minimum if aggregate == "min" else maximum
+
+def _series_result(spec, groups, split_zones):
+    zones = set(spec.zone_ids) if spec.zone_ids is not None else None
+    merged = {}
+    for (type_, zone_id, period_key), values in groups.items():
+        if type_ != spec.type or (split_zones and zones is not None and zone_id not in zones):
+            continue
+        # Clé (période, zone) : tri chronologique, puis par zone
+        _merge_stats(merged, (period_key or "", zone_id if spec.by_zone else 0), *values)
+    
+    data = []
+    for (period_key, zone_id), (count, total, minimum, maximum) in sorted(merged.items()):
+        point = {"period": period_key} if spec.period else {}
+        if spec.by_zone:
+            point["zone_id"] = zone_id
+        point["value"] = _aggregate(spec.aggregate, count, total, minimum, maximum)
+        point["count"] = count
+        data.append(point)
+    return {
+        "id": spec.id,
+        "type": spec.type,
+        "zone_ids": spec.zone_ids,
+        "period": spec.period,
+        "aggregate": spec.aggregate,
+        "meta": spec.meta,
+        "data": data
+    }
+
+def _compute_query(db: Session, query: StatsQuery):
+    # Plan : une passe par (plage, période, filtre meta, horizons de rétention) partagée par
+    # tous les types et zones concernés ; un type compacté ne décale pas le découpage des autres
+    type_horizons = retention.horizons_by_type(db)
+    plans = {}
+    for index, spec in enumerate(query.series):
+        meta_filters = tuple(sorted(spec.meta.items())) if spec.meta else None
+        horizons = tuple(sorted(type_horizons.get(spec.type, {}).items()))
+        plans.setdefault((spec.date_from, spec.date_to, spec.period, meta_filters, horizons), []).append(index)
+    
+    results = [None] * len(query.series)
+    for (date_from, date_to, period, meta_filters, _), indexes in plans.items():
+        specs = [query.series[i] for i in indexes]
+        zone_sets = {frozenset(spec.zone_ids) if spec.zone_ids is not None else None for spec in specs}
+        # Regroupement par zone seulement si des séries le demandent ou portent sur des zones différentes
+        split_zones = any(spec.by_zone for spec in specs) or len(zone_sets) > 1
+        zone_ids = None if None in zone_sets else set().union(*zone_sets)
+        groups = {}
+        if zone_ids is None or zone_ids:
+            types = sorted({spec.type for spec in specs})
+            groups = _grouped_totals(db, types, zone_ids, split_zones, period, date_from, date_to, meta_filters)
+        for i, spec in zip(indexes, specs):
+            results[i] = _series_result(spec, groups, split_zones)
+    return {"series": results}
+
+@router.post("/query")
+async def query_series(
+    request: Request,
+    query: StatsQuery,
+    db = Depends(get_read_session),
+    current_user = Depends(get_current_user)
+):
+    """Plusieurs séries (type, zones, plage, période, agrégat) en une requête : les séries
+    de même plage et période partagent un même parcours SQL"""
+    scopes = tuple(sorted({series_scope(None, spec.type) for spec in query.series}))
+    return await cached_json(request, db, scopes, _compute_query, query)
@@ -1,32 +1,91 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
 from sqlalchemy.orm import Session
 from typing import List
-from app.database import get_db
+from app.database import get_session, get_read_session
 from app.models.zone import Zone
-from app.schemas.zone import ZoneCreate, ZoneResponse
+from app.schemas.zone import ZoneCreate, ZoneResponse, ZoneDistanceResponse
 from app.utils.auth import get_current_admin
+from app.utils.zones import invalidate_zone_ids
+from app.utils.http_cache import cached_json
+from app.utils import geo, versions
 
 router = APIRouter(prefix="/zones", tags=["Zones"])
 
-@router.post("/", response_model=ZoneResponse, status_code=status.HTTP_201_CREATED)
-def create_zone(zone: ZoneCreate, db: Session = Depends(get_db), current_user = Depends(get_current_admin)):
-    """Créer une nouvelle zone (admin only)"""
-    db_zone = Zone(**zone.dict())
+def _create_zone(db: Session, zone: ZoneCreate):
+    db_zone = Zone(**zone.model_dump())
     db.add(db_zone)
+    versions.bump_zones(db)
     db.commit()
     db.refresh(db_zone)
+    invalidate_zone_ids()
     return db_zone
 
+@router.post("/", response_model=ZoneResponse, status_code=status.HTTP_201_CREATED)
+async def create_zone(zone: ZoneCreate, db = Depends(get_session), current_user = Depends(get_current_admin)):
+    """Créer une nouvelle zone (admin only)"""
+    return await db.run_sync(_create_zone, zone)
+
+def _list_zones(db: Session, skip: int, limit: int):
+    zones = db.query(Zone).offset(skip).limit(limit).all()
+    return [ZoneResponse.model_validate(zone) for zone in zones]
+
 @router.get("/", response_model=List[ZoneResponse])
-def get_zones(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+async def get_zones(request: Request, skip: int = 0, limit: int = 100, db = Depends(get_read_session)):
     """Récupérer toutes les zones"""
-    zones = db.query(Zone).offset(skip).limit(limit).all()
-    return zones
+    return await cached_json(request, db, versions.ZONES, _list_zones, skip, limit)
 
-@router.get("/{zone_id}", response_model=ZoneResponse)
-def get_zone(zone_id: int, db: Session = Depends(get_db)):
-    """Récupérer une zone par ID"""
+def _zones_by_id(db: Session, zone_ids) -> dict:
+    zones = db.query(Zone).filter(geo.zone_in(Zone.id, zone_ids)).all() if zone_ids else []
+    return {zone.id: zone for zone in zones}
+
+def _with_distances(db: Session, found):
+    zones = _zones_by_id(db, [zone_id for zone_id, _ in found])
+    return [
+        ZoneDistanceResponse(**ZoneResponse.model_validate(zones[zone_id]).model_dump(), distance_km=round(distance, 3))
+        for zone_id, distance in found
+        if zone_id in zones
+    ]
+
+def _nearest_zones(db: Session, lat, lon, k, max_km):
+    return _with_distances(db, geo.spatial_index(db).nearest(lat, lon, k, max_km))
+
+@router.get("/nearest", response_model=List[ZoneDistanceResponse])
+async def get_nearest_zones(
+    lat: float = Query(..., ge=-90, le=90),
+    lon: float = Query(..., ge=-180, le=180),
+    k: int = Query(5, ge=1, le=1000),
+    max_km: float | None = Query(None, gt=0),
+    db = Depends(get_read_session)
+):
+    """Les k zones géolocalisées les plus proches d'un point, triées par distance"""
+    return await db.run_sync(_nearest_zones, lat, lon, k, max_km)
+
+def _zones_within(db: Session, area: geo.Area, limit: int):
+    index = geo.spatial_index(db)
+    if area.bbox is not None:
+        zones = _zones_by_id(db, index.within_bbox(*area.bbox)[:limit])
+        return [ZoneResponse.model_validate(zone) for _, zone in sorted(zones.items())]
+    return _with_distances(db, index.within_radius(area.lat, area.lon, area.radius_km)[:limit])
+
+@router.get("/within", response_model=List[ZoneDistanceResponse] | List[ZoneResponse])
+async def get_zones_within(
+    area: geo.Area | None = Depends(geo.area_filter),
+    limit: int = Query(100, ge=1, le=10000),
+    db = Depends(get_read_session)
+):
+    """Zones dans un cercle (lat, lon, radius_km ; triées par distance) ou un rectangle
+    (bbox=min_lat,min_lon,max_lat,max_lon ; triées par id)"""
+    if area is None:
+        raise HTTPException(status_code=422, detail="lat, lon and radius_km, or bbox, are required")
+    return await db.run_sync(_zones_within, area, limit)
+
+def _get_zone_or_404(db: Session, zone_id: int):
     zone = db.query(Zone).filter(Zone.id == zone_id).first()
     if not zone:
         raise HTTPException(status_code=404, detail="Zone not found")
-    return zone
\ No newline at end of file
+    return zone
+
+@router.get("/{zone_id}", response_model=ZoneResponse)
+async def get_zone(zone_id: int, db = Depends(get_read_session)):
+    """Récupérer une zone par ID"""
+    return await db.run_sync(_get_zone_or_404, zone_id)
\ No newline at end of file
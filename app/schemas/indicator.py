@@ -1,5 +1,7 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, field_validator
 from datetime import datetime
+from typing import Any, Dict, List
+from app.models.indicator import as_meta
 
 class IndicatorBase(BaseModel):
     source: str
@@ -7,18 +9,40 @@ class IndicatorBase(BaseModel):
     value: float
     unit: str
     zone_id: int
-    meta_info: str | None = None
+    meta_info: Dict[str, Any] | None = None
+    
+    @field_validator("meta_info", mode="before")
+    @classmethod
+    def parse_meta(cls, value):
+        # Un texte (ancien format) est accepté : objet JSON sérialisé ou description libre
+        return as_meta(value) if isinstance(value, str) else value
 
 class IndicatorCreate(IndicatorBase):
     timestamp: datetime | None = None
 
 class IndicatorUpdate(BaseModel):
     value: float | None = None
-    meta_info: str | None = None
+    meta_info: Dict[str, Any] | None = None
+    
+    @field_validator("meta_info", mode="before")
+    @classmethod
+    def parse_meta(cls, value):
+        return as_meta(value) if isinstance(value, str) else value
 
 class IndicatorResponse(IndicatorBase):
     id: int
     timestamp: datetime
     
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+class BulkIndicatorError(BaseModel):
+    index: int
+    detail: str
+
+class BulkIndicatorResult(BaseModel):
+    inserted: int
+    updated: int = 0  # mesures déjà présentes (même source, type, zone et date) mises à jour
+    skipped: int = 0  # mesures déjà présentes, identiques ou ignorées avec on_conflict=skip
+    failed: int
+    errors: List[BulkIndicatorError]
\ No newline at end of file
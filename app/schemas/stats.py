@@ -0,0 +1,26 @@
+from pydantic import BaseModel, Field, field_validator
+from datetime import datetime
+from typing import Dict, List, Literal
+from app.utils.meta import KEY_PATTERN
+
+class SeriesSpec(BaseModel):
+    id: str | None = None  # libellé renvoyé tel quel, pour retrouver la série côté client
+    type: str
+    zone_ids: List[int] | None = None  # None : toutes les zones
+    date_from: datetime | None = None
+    date_to: datetime | None = None
+    period: Literal["hourly", "daily", "weekly", "monthly"] | None = None  # None : une valeur sur la plage
+    aggregate: Literal["avg", "sum", "min", "max", "count"] = "avg"
+    by_zone: bool = False  # une valeur par zone plutôt que fusionnée sur les zones
+    meta: Dict[str, str] | None = None  # filtres meta_info, comme meta.<clé>=valeur sur les routes GET
+    
+    @field_validator("meta")
+    @classmethod
+    def check_meta_keys(cls, value):
+        for key in value or {}:
+            if not KEY_PATTERN.match(key):
+                raise ValueError(f"Invalid meta key: {key}")
+        return value
+
+class StatsQuery(BaseModel):
+    series: List[SeriesSpec] = Field(..., min_length=1, max_length=100)
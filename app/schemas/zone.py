@@ -1,8 +1,10 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 class ZoneBase(BaseModel):
     name: str
     postal_code: str | None = None
+    latitude: float | None = Field(None, ge=-90, le=90)
+    longitude: float | None = Field(None, ge=-180, le=180)
 
 class ZoneCreate(ZoneBase):
     pass
@@ -11,4 +13,7 @@ class ZoneResponse(ZoneBase):
     id: int
     
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+class ZoneDistanceResponse(ZoneResponse):
+    distance_km: float
\ No newline at end of file
@@ -1,3 +1,6 @@
+import asyncio
+import logging
+from dataclasses import dataclass
 from datetime import datetime, timedelta
 from typing import Optional
 from jose import JWTError, jwt
@@ -5,11 +8,64 @@ from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.orm import Session
 from app.config import settings
-from app.database import get_db
+from app.database import ReadSessionLocal, get_read_session, read_session
 from app.models.user import User
+from app.utils import versions
+from app.utils.cache import LRUCache
 
 # Configuration OAuth2
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
+optional_oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login", auto_error=False)
+
+@dataclass(frozen=True)
+class Principal:
+    """Utilisateur authentifié, tel que conservé en cache"""
+    id: int
+    email: str
+    role: str
+    is_active: bool
+
+logger = logging.getLogger("ecotrack.auth")
+
+# Cache des utilisateurs authentifiés, indexé par le sujet du token (email)
+principal_cache = LRUCache(
+    maxsize=settings.PRINCIPAL_CACHE_SIZE,
+    ttl=settings.PRINCIPAL_CACHE_TTL_SECONDS
+)
+
+def invalidate_principal(email: str | None = None):
+    """Vide le cache de ce processus (tout si email absent) ; les autres processus
+    voient le changement via versions.bump_user, à appeler dans la transaction"""
+    if email is None:
+        principal_cache.clear()
+    else:
+        principal_cache.delete(email)
+
+# Dernière version d'utilisateur vue par ce processus
+_seen_user_version = 0
+
+def sync_principal_cache(db: Session) -> int:
+    """Retire du cache les utilisateurs modifiés par un autre processus (versions.bump_user)
+    depuis le dernier passage ; renvoie le nombre de changements vus"""
+    global _seen_user_version
+    changes = versions.user_changes(db, _seen_user_version)
+    for scope, version in changes:
+        invalidate_principal(None if scope == versions.USERS else scope[len(versions.user_scope("")):])
+        _seen_user_version = max(_seen_user_version, version)
+    return len(changes)
+
+def _sync_now() -> int:
+    with ReadSessionLocal() as db:
+        return sync_principal_cache(db)
+
+async def principal_watch_loop(interval: float):
+    """Tâche de fond de l'API : relève des changements d'utilisateurs, hors des requêtes"""
+    while True:
+        try:
+            await asyncio.to_thread(_sync_now)
+        except Exception:
+            logger.exception("Relève des utilisateurs en échec")
+        await asyncio.sleep(interval)
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     """Crée un token JWT"""
@@ -23,14 +79,28 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
     return encoded_jwt
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
-    """Récupère l'utilisateur actuel à partir du token JWT"""
+def _load_principal(db: Session, email: str) -> Principal | None:
+    user = db.query(User).filter(User.email == email).first()
+    if user is None:
+        return None
+    return Principal(
+        id=user.id,
+        email=user.email,
+        role=user.role,
+        is_active=user.is_active
+    )
+
+async def authenticate_token(token: str | None, db) -> Principal:
+    """Utilisateur actif correspondant au token JWT, sinon HTTPException"""
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
     
+    if not token:
+        raise credentials_exception
+    
     try:
         payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
         email: str = payload.get("sub")
@@ -39,16 +109,38 @@ def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(
     except JWTError:
         raise credentials_exception
     
-    user = db.query(User).filter(User.email == email).first()
-    if user is None:
-        raise credentials_exception
+    # Cache d'abord : la base n'est interrogée qu'en cas d'absence. Les changements faits
+    # par un autre processus retirent l'entrée à la relève suivante (principal_watch_loop)
+    principal = principal_cache.get(email)
+    if principal is None:
+        principal = await db.run_sync(_load_principal, email)
+        if principal is None:
+            raise credentials_exception
+        principal_cache.set(email, principal)
     
-    if not user.is_active:
+    if not principal.is_active:
         raise HTTPException(status_code=400, detail="Inactive user")
     
-    return user
+    return principal
+
+async def get_current_user(token: str = Depends(oauth2_scheme), db = Depends(get_read_session)):
+    """Récupère l'utilisateur actuel à partir du token JWT"""
+    return await authenticate_token(token, db)
+
+async def authenticate_stream(token: str | None) -> Principal:
+    """Pour les flux longs (SSE, WebSocket) : la session n'est pas gardée pendant le flux"""
+    async with read_session() as db:
+        return await authenticate_token(token, db)
+
+async def get_stream_user(
+    token: str | None = None,
+    header_token: str | None = Depends(optional_oauth2_scheme)
+):
+    """Comme get_current_user, token aussi accepté en paramètre `token` (EventSource
+    ne peut pas envoyer d'en-tête Authorization)"""
+    return await authenticate_stream(header_token or token)
 
-def get_current_admin(current_user: User = Depends(get_current_user)):
+async def get_current_admin(current_user: Principal = Depends(get_current_user)):
     """Vérifie que l'utilisateur actuel est admin"""
     if current_user.role != "admin":
         raise HTTPException(
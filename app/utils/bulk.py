@@ -0,0 +1,157 @@
+"""
+Insertion en masse d'indicateurs : validation par lots et upsert multi-lignes sur la
+clé naturelle (source, type, zone_id, timestamp), ré-exécutable sans créer de doublons.
+"""
+
+import logging
+from datetime import datetime
+from pydantic import ValidationError
+from sqlalchemy import insert, or_
+from sqlalchemy.orm import Session
+from app.models.indicator import Indicator, NATURAL_KEY, NATURAL_KEY_INDEX
+from app.schemas.indicator import IndicatorCreate
+from app.utils.rollups import add_to_rollups, refresh_buckets
+from app.utils.sql import dialect_insert, index_names
+from app.utils.zones import get_zone_ids
+from app.utils import retention
+
+logger = logging.getLogger("ecotrack.bulk")
+
+# Lignes par lot validé puis inséré dans une transaction
+BULK_CHUNK_SIZE = 1000
+
+# Politiques quand une mesure existe déjà (même clé naturelle)
+ON_CONFLICT_MODES = ("update", "skip")
+
+# Colonnes réécrites par une mise à jour
+UPDATE_COLUMNS = ("value", "unit", "meta_info")
+
+# Moteurs dont l'index unique de la clé naturelle a été vérifié
+_natural_key_binds = set()
+
+def _format_errors(error: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(loc) for loc in err['loc'])}: {err['msg']}"
+        for err in error.errors()
+    )
+
+def validate_rows(db: Session, items) -> tuple[list[dict], list[tuple[int, str]]]:
+    """Valide une liste de (index, objet JSON) ; renvoie les lignes valides et les erreurs"""
+    rows, errors = [], []
+    zone_ids = get_zone_ids(db)
+    refreshed = False
+    now = datetime.utcnow()
+
+    for index, item in items:
+        try:
+            row = IndicatorCreate.model_validate(item).model_dump()
+        except ValidationError as e:
+            errors.append((index, _format_errors(e)))
+            continue
+
+        if row["zone_id"] not in zone_ids and not refreshed:
+            # Zone peut-être créée depuis le chargement du cache
+            zone_ids = get_zone_ids(db, refresh=True)
+            refreshed = True
+        if row["zone_id"] not in zone_ids:
+            errors.append((index, f"zone_id: Zone {row['zone_id']} not found"))
+            continue
+
+        if row["timestamp"] is None:
+            row["timestamp"] = now
+        rows.append(row)
+    return rows, errors
+
+def _key(row) -> tuple:
+    # Dates naïves comme en base (un fuseau éventuel n'est pas stocké)
+    return (row["source"], row["type"], row["zone_id"], row["timestamp"].replace(tzinfo=None))
+
+def _uncompacted(db: Session, rows: list[dict]) -> list[dict]:
+    # Avant l'horizon de compaction, la mesure est déjà comptée dans les agrégats
+    horizons = retention.raw_horizons(db)
+    if not horizons:
+        return rows
+    return [
+        row for row in rows
+        if row["type"] not in horizons or row["timestamp"].replace(tzinfo=None) >= horizons[row["type"]]
+    ]
+
+def has_natural_key(db: Session) -> bool:
+    """Vrai si l'index unique (source, type, zone_id, timestamp) existe : absent tant que
+    la table contient des doublons (voir dedupe_indicators.py)"""
+    bind = db.get_bind()
+    if bind not in _natural_key_binds:
+        if NATURAL_KEY_INDEX not in index_names(db.connection(), "indicators"):
+            return False
+        _natural_key_binds.add(bind)
+    return True
+
+def upsert_rows(db: Session, rows: list[dict], on_conflict: str = "update",
+                update_rollups: bool = True) -> dict:
+    """INSERT ... ON CONFLICT sur la clé naturelle (executemany) + rollups, sans commit.
+    Une mesure déjà présente est mise à jour (`update`, si elle a changé) ou ignorée (`skip`),
+    comme toute mesure antérieure à l'horizon de compaction de son type. Renvoie les nombres de lignes insérées, mises à jour et ignorées."""
+    counts = {"inserted": 0, "updated": 0, "skipped": 0}
+    if not rows:
+        return counts
+    table = Indicator.__table__
+    kept = _uncompacted(db, rows)
+    
+    if not has_natural_key(db):
+        logger.warning("Index %s absent : insertion sans dédoublonnage", NATURAL_KEY_INDEX)
+        if kept:
+            db.execute(insert(table), kept)
+            if update_rollups:
+                add_to_rollups(db, kept)
+        counts["inserted"] = len(kept)
+        counts["skipped"] = len(rows) - len(kept)
+        return counts
+    
+    # Dernière occurrence d'une clé répétée dans le lot
+    latest = {}
+    for row in kept:
+        latest[_key(row)] = row
+    batch = list(latest.values())
+    key_columns = [table.c[name] for name in NATURAL_KEY]
+    
+    stmt = dialect_insert(db, table).on_conflict_do_nothing(index_elements=NATURAL_KEY)
+    inserted_keys = set()
+    if batch:
+        inserted_keys = {tuple(key) for key in db.execute(stmt.returning(*key_columns), batch)}
+    inserted = [row for row in batch if _key(row) in inserted_keys]
+    existing = [row for row in batch if _key(row) not in inserted_keys]
+    
+    updated_keys = set()
+    if existing and on_conflict == "update":
+        stmt = dialect_insert(db, table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=NATURAL_KEY,
+            set_={name: stmt.excluded[name] for name in UPDATE_COLUMNS},
+            # Mesure identique : rien n'est réécrit, les agrégats restent valides
+            where=or_(*(table.c[name].is_distinct_from(stmt.excluded[name]) for name in UPDATE_COLUMNS))
+        )
+        updated_keys = {tuple(key) for key in db.execute(stmt.returning(*key_columns), existing)}
+    
+    if update_rollups:
+        if inserted:
+            add_to_rollups(db, inserted)
+        if updated_keys:
+            refresh_buckets(db, [(zone_id, type_, timestamp) for _, type_, zone_id, timestamp in updated_keys])
+    
+    counts["inserted"] = len(inserted)
+    counts["updated"] = len(updated_keys)
+    counts["skipped"] = len(rows) - len(inserted) - len(updated_keys)
+    return counts
+
+def ingest_chunk(db: Session, items, on_conflict: str = "update") -> tuple[dict, list[tuple[int, str]]]:
+    """Valide et insère un lot dans sa propre transaction"""
+    rows, errors = validate_rows(db, items)
+    counts = {"inserted": 0, "updated": 0, "skipped": 0}
+    if rows:
+        try:
+            counts = upsert_rows(db, rows, on_conflict)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+    return counts, errors
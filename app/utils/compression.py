@@ -0,0 +1,185 @@
+"""
+Compression des réponses négociée sur Accept-Encoding : zstd et brotli s'ils sont
+installés (`pip install zstandard brotli`), gzip sinon.
+
+Une réponse complète plus petite que COMPRESSION_MIN_SIZE part telle quelle. Une réponse
+en flux (StreamingResponse : exports) est compressée morceau par morceau, chaque morceau
+étant vidé du compresseur dès qu'il est écrit : rien n'est mis en mémoire tampon.
+Les flux Server-Sent Events ne sont pas compressés (un événement doit partir aussitôt).
+"""
+
+import zlib
+from app.config import settings
+
+try:
+    import brotli
+except ImportError:  # dépendance optionnelle
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # dépendance optionnelle
+    zstandard = None
+
+# Types de contenu compressibles (préfixes) ; les autres passent tels quels
+COMPRESSIBLE_TYPES = (
+    "application/json", "application/x-ndjson", "application/vnd.apache.arrow",
+    "text/csv", "text/plain", "text/html",
+)
+
+class _GzipEncoder:
+    def __init__(self, level: int):
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # 31 : en-tête gzip
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        return self._compressor.flush()
+
+class _BrotliEncoder:
+    def __init__(self, quality: int):
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.process(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.flush()
+
+    def finish(self) -> bytes:
+        return self._compressor.finish()
+
+class _ZstdEncoder:
+    def __init__(self, level: int):
+        self._compressor = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self) -> bytes:
+        return self._compressor.flush()
+
+def available_encodings() -> list[str]:
+    """Encodages de COMPRESSION_ENCODINGS utilisables, par ordre de préférence"""
+    installed = {"gzip": True, "br": brotli is not None, "zstd": zstandard is not None}
+    return [name for name in settings.COMPRESSION_ENCODINGS if installed.get(name)]
+
+def make_encoder(encoding: str, level: int | None = None):
+    """Compresseur incrémental (compress, flush, finish) au niveau configuré ou donné"""
+    if encoding == "gzip":
+        return _GzipEncoder(settings.COMPRESSION_GZIP_LEVEL if level is None else level)
+    if encoding == "br":
+        return _BrotliEncoder(settings.COMPRESSION_BROTLI_QUALITY if level is None else level)
+    if encoding == "zstd":
+        return _ZstdEncoder(settings.COMPRESSION_ZSTD_LEVEL if level is None else level)
+    raise ValueError(f"Unknown encoding: {encoding}")
+
+def negotiate(accept_encoding: str, encodings: list[str]) -> str | None:
+    """Premier encodage (ordre du serveur) accepté par le client avec q > 0, ou None"""
+    accepted = {}
+    for item in accept_encoding.split(","):
+        name, *params = [part.strip() for part in item.split(";")]
+        quality = 1.0
+        for param in params:
+            key, _, value = param.partition("=")
+            if key.strip() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if name:
+            accepted[name.lower()] = quality
+    for encoding in encodings:
+        quality = accepted.get(encoding, accepted.get("*", 0.0))
+        if quality > 0:
+            return encoding
+    return None
+
+def _is_compressible(headers: dict) -> bool:
+    content_type = headers.get(b"content-type", b"").decode("latin-1")
+    return (
+        b"content-encoding" not in headers
+        and content_type.startswith(COMPRESSIBLE_TYPES)
+    )
+
+class CompressionMiddleware:
+    """Compression gzip / brotli / zstd des réponses, avec seuil de taille et flux"""
+
+    def __init__(self, app):
+        self.app = app
+        self.encodings = available_encodings()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] == "HEAD":
+            return await self.app(scope, receive, send)
+        request_headers = dict(scope["headers"])
+        encoding = negotiate(
+            request_headers.get(b"accept-encoding", b"").decode("latin-1"), self.encodings
+        )
+        if encoding is None:
+            return await self.app(scope, receive, send)
+
+        start = None  # http.response.start retenu jusqu'au premier morceau du corps
+        encoder = None
+
+        def compressed_start(content_length=None):
+            headers = []
+            for name, value in start["headers"]:
+                if name == b"content-length":
+                    continue
+                if name == b"etag" and not value.startswith(b"W/"):
+                    # ETag faible : les octets diffèrent de la représentation non compressée
+                    value = b"W/" + value
+                headers.append((name, value))
+            headers += [(b"vary", b"Accept-Encoding"), (b"content-encoding", encoding.encode())]
+            if content_length is not None:
+                headers.append((b"content-length", str(content_length).encode()))
+            return {**start, "headers": headers}
+
+        async def send_wrapper(message):
+            nonlocal start, encoder
+            if message["type"] == "http.response.start":
+                if message["status"] in (204, 304) or not _is_compressible(dict(message.get("headers", []))):
+                    await send(message)
+                else:
+                    start = message
+                return
+            if message["type"] != "http.response.body" or (start is None and encoder is None):
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if encoder is None:
+                if not more_body and len(body) < settings.COMPRESSION_MIN_SIZE:
+                    # Réponse complète trop petite : le gain ne couvre pas le coût
+                    await send({**start, "headers": list(start["headers"]) + [(b"vary", b"Accept-Encoding")]})
+                    await send(message)
+                    start = None
+                    return
+                encoder = make_encoder(encoding)
+                if not more_body:
+                    data = encoder.compress(body) + encoder.finish()
+                    await send(compressed_start(len(data)))
+                    await send({"type": "http.response.body", "body": data})
+                    start = None
+                    return
+                await send(compressed_start())
+                start = None
+
+            if more_body:
+                # Morceau vidé du compresseur : le client le reçoit sans attendre la suite
+                data = encoder.compress(body) + encoder.flush()
+                if data:
+                    await send({"type": "http.response.body", "body": data, "more_body": True})
+            else:
+                await send({"type": "http.response.body", "body": encoder.compress(body) + encoder.finish()})
+
+        await self.app(scope, receive, send_wrapper)
@@ -0,0 +1,105 @@
+"""
+Réduction de séries pour les graphiques, en un seul passage sur des lignes
+(timestamp, valeur) triées par date : la taille du résultat est bornée par `threshold`
+quelle que soit la période demandée.
+"""
+
+from datetime import datetime
+
+_EPOCH = datetime(1970, 1, 1)
+
+def _x(timestamp: datetime) -> float:
+    return (timestamp.replace(tzinfo=None) - _EPOCH).total_seconds()
+
+def _bucket_starts(total: int, buckets: int, first: int, last: int) -> list[int]:
+    """Indices de début de `buckets` groupes de taille égale couvrant [first, last["""
+    every = (last - first) / buckets
+    return [first + int(i * every) for i in range(buckets)] + [last]
+
+def lttb(rows, total: int, threshold: int) -> list[tuple]:
+    """Largest-Triangle-Three-Buckets ; ne garde que deux buckets en mémoire"""
+    if total <= threshold or threshold < 3:
+        return list(rows)
+
+    starts = _bucket_starts(total, threshold - 2, 1, total - 1)
+    sampled = []
+    current, following = [], []
+    bucket = -1  # bucket de `following` ; -1 = premier point
+
+    def select(points, next_x, next_y):
+        # Point formant le plus grand triangle avec le point retenu précédent et la moyenne suivante
+        ax, ay = _x(sampled[-1][0]), sampled[-1][1]
+        best, best_area = points[0], -1.0
+        for point in points:
+            area = abs((ax - next_x) * (point[1] - ay) - (ax - _x(point[0])) * (next_y - ay))
+            if area > best_area:
+                best, best_area = point, area
+        sampled.append(best)
+
+    def average(points):
+        return (
+            sum(_x(point[0]) for point in points) / len(points),
+            sum(point[1] for point in points) / len(points),
+        )
+
+    for index, row in enumerate(rows):
+        if index == 0:
+            sampled.append(row)
+            bucket = 0
+            continue
+        if index == total - 1:
+            last = row
+            break
+        if index >= starts[bucket + 1]:
+            # Le bucket suivant est complet : on peut choisir le point du bucket courant
+            if current:
+                select(current, *average(following))
+            current, following = following, []
+            bucket += 1
+        following.append(row)
+    else:
+        last = None
+
+    if current:
+        select(current, *average(following))
+    if following and last is not None:
+        select(following, _x(last[0]), last[1])
+    if last is not None:
+        sampled.append(last)
+    return sampled
+
+def min_max(rows, total: int, threshold: int) -> list[tuple]:
+    """Enveloppe min/max : deux points par bucket, dans l'ordre chronologique"""
+    if total <= threshold:
+        return list(rows)
+
+    buckets = max(threshold // 2, 1)
+    starts = _bucket_starts(total, buckets, 0, total)
+    sampled = []
+    bucket, low, high = 0, None, None
+
+    def flush():
+        if low is None:
+            return
+        if low is high:
+            sampled.append(low)
+        else:
+            sampled.extend(sorted((low, high), key=lambda point: point[0]))
+
+    for index, row in enumerate(rows):
+        if index >= total:
+            break
+        while index >= starts[bucket + 1]:
+            flush()
+            bucket, low, high = bucket + 1, None, None
+        if low is None or row[1] < low[1]:
+            low = row
+        if high is None or row[1] > high[1]:
+            high = row
+    flush()
+    return sampled
+
+METHODS = {
+    "lttb": lttb,
+    "minmax": min_max,
+}
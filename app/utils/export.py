@@ -0,0 +1,120 @@
+"""
+Export en flux des indicateurs (NDJSON, CSV, Arrow) sans passer par l'ORM ni Pydantic.
+"""
+
+import csv
+import io
+import json
+from sqlalchemy import select
+from app.database import ReadSessionLocal
+from app.models.indicator import Indicator
+from app.utils.serialization import dumps
+
+try:
+    import pyarrow as pa
+except ImportError:  # dépendance optionnelle
+    pa = None
+
+# Lignes lues et encodées par lot
+EXPORT_BATCH_SIZE = 5000
+
+EXPORT_COLUMNS = ["id", "source", "type", "value", "unit", "timestamp", "zone_id", "meta_info"]
+
+MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+    "arrow": "application/vnd.apache.arrow.stream",
+}
+
+def export_statement():
+    """SELECT Core des colonnes exportées, sans identity map"""
+    table = Indicator.__table__
+    return select(*(table.c[name] for name in EXPORT_COLUMNS))
+
+def _iter_partitions(statement):
+    # Session dédiée (pool de lecture) : elle vit aussi longtemps que le flux de réponse
+    with ReadSessionLocal() as db:
+        result = db.execute(statement.execution_options(yield_per=EXPORT_BATCH_SIZE))
+        for partition in result.partitions():
+            yield partition
+
+def _encode_ndjson(partition) -> bytes:
+    lines = []
+    for row in partition:
+        item = dict(zip(EXPORT_COLUMNS, row))
+        item["timestamp"] = item["timestamp"].isoformat()
+        lines.append(json.dumps(item, ensure_ascii=False))
+    lines.append("")
+    return "\n".join(lines).encode()
+
+def _encode_ndjson_fast(partition) -> bytes:
+    # Encodeur rapide : datetime sérialisés nativement, octets concaténés directement
+    return b"".join(dumps(dict(zip(EXPORT_COLUMNS, row))) + b"\n" for row in partition)
+
+def _meta_text(meta_info) -> str | None:
+    # meta_info est décodé en dict : CSV et Arrow le transportent en texte JSON
+    return None if meta_info is None else json.dumps(meta_info, ensure_ascii=False)
+
+def _encode_csv(partition, header: bool) -> bytes:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header:
+        writer.writerow(EXPORT_COLUMNS)
+    writer.writerows(
+        (row[0], row[1], row[2], row[3], row[4], row[5].isoformat(), row[6], _meta_text(row[7]))
+        for row in partition
+    )
+    return buffer.getvalue().encode()
+
+def _arrow_schema():
+    return pa.schema([
+        ("id", pa.int64()),
+        ("source", pa.string()),
+        ("type", pa.string()),
+        ("value", pa.float64()),
+        ("unit", pa.string()),
+        ("timestamp", pa.timestamp("us")),
+        ("zone_id", pa.int64()),
+        ("meta_info", pa.string()),
+    ])
+
+def stream_export(statement, format: str, fast_json: bool = False):
+    """Générateur d'octets pour StreamingResponse"""
+    if format == "ndjson":
+        encode = _encode_ndjson_fast if fast_json else _encode_ndjson
+        for partition in _iter_partitions(statement):
+            yield encode(partition)
+
+    elif format == "csv":
+        header = True
+        for partition in _iter_partitions(statement):
+            yield _encode_csv(partition, header)
+            header = False
+        if header:
+            # Aucune ligne : on renvoie tout de même l'en-tête
+            yield _encode_csv([], True)
+
+    elif format == "arrow":
+        # Flux IPC Arrow : un RecordBatch par lot, envoyé dès qu'il est écrit
+        schema = _arrow_schema()
+        sink = io.BytesIO()
+        writer = pa.ipc.new_stream(sink, schema)
+
+        def drain():
+            data = sink.getvalue()
+            sink.seek(0)
+            sink.truncate()
+            return data
+
+        yield drain()
+        for partition in _iter_partitions(statement):
+            columns = list(zip(*partition))
+            columns[-1] = [_meta_text(meta_info) for meta_info in columns[-1]]
+            batch = pa.record_batch(
+                [pa.array(column, type=field.type) for column, field in zip(columns, schema)],
+                schema=schema
+            )
+            writer.write_batch(batch)
+            yield drain()
+        writer.close()
+        yield drain()
@@ -0,0 +1,62 @@
+"""
+Cache de réponses JSON avec ETag fort et revalidation If-None-Match.
+Une entrée est valide tant que la version de données de sa portée n'a pas changé.
+"""
+
+import hashlib
+import json
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+from app.config import settings
+from app.utils.cache import LRUCache
+from app.utils.versions import current_version, current_versions
+
+response_cache = LRUCache(maxsize=settings.RESPONSE_CACHE_SIZE)
+
+def _cache_key(fn, args) -> str:
+    # Paramètres déjà validés (dates parsées, entiers...) : deux URL équivalentes partagent l'entrée
+    return json.dumps([fn.__qualname__, [str(arg) for arg in args]])
+
+def _etag(key: str, version: int) -> str:
+    digest = hashlib.sha1(f"{key}|{version}".encode()).hexdigest()
+    return f'"{digest}"'
+
+def _matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    # Comparaison faible : l'ETag d'une réponse compressée revient préfixé par W/
+    candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return etag in candidates or "*" in candidates
+
+def _version(session, scope) -> int:
+    if isinstance(scope, str):
+        return current_version(session, scope)
+    # Plusieurs portées : versions issues d'un même compteur, la plus récente suffit
+    return max(current_versions(session, scope).values())
+
+async def cached_json(request: Request, db, scope: str | tuple, fn, *args):
+    """Sert fn(db, *args) depuis le cache, ou 304 si le client possède déjà la version courante"""
+    key = _cache_key(fn, args)
+    if_none_match = request.headers.get("if-none-match")
+
+    def load(session):
+        version = _version(session, scope)
+        etag = _etag(key, version)
+        if _matches(if_none_match, etag):
+            return etag, None
+        entry = response_cache.get(key)
+        if entry is not None and entry[0] == etag:
+            return etag, entry[1]
+        body = json.dumps(jsonable_encoder(fn(session, *args)), separators=(",", ":")).encode()
+        # Pas d'instantané commun aux lectures (pysqlite en autocommit) : une écriture validée
+        # pendant le calcul change la version, le résultat n'est alors pas mis en cache. L'ETag
+        # de l'ancienne version renvoyé ne sera jamais revalidé en 304.
+        if _version(session, scope) == version:
+            response_cache.set(key, (etag, body))
+        return etag, body
+
+    etag, body = await db.run_sync(load)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if body is None:
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
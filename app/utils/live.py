@@ -0,0 +1,202 @@
+"""
+Flux des nouveaux indicateurs (/indicators/stream) : pub/sub en mémoire du processus.
+
+Une tâche de fond, active tant qu'il y a des abonnés, relit les indicateurs d'id
+supérieur au dernier diffusé. Elle est réveillée aussitôt après chaque commit d'une
+écriture de l'API, et relève toutes les STREAM_POLL_INTERVAL_SECONDS les écritures
+des autres processus (scripts d'ingestion, autres workers). Chaque abonné a une file
+bornée : un client lent perd les messages les plus anciens mais ne bloque jamais
+les écritures ni les autres abonnés.
+"""
+
+import asyncio
+import logging
+from sqlalchemy import event, func, select
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.database import read_session
+from app.models.indicator import Indicator
+from app.schemas.indicator import IndicatorResponse
+from app.utils import metrics
+from app.utils.serialization import dumps
+
+logger = logging.getLogger("ecotrack.live")
+
+COLUMNS = list(IndicatorResponse.model_fields)
+
+# Lignes relues par requête SQL
+POLL_BATCH_SIZE = 1000
+
+# Écriture d'indicateurs en attente de commit, marquée dans session.info
+_PENDING_KEY = "live_pending"
+
+class Message:
+    """Un indicateur diffusé, encodé une seule fois pour tous les abonnés"""
+    __slots__ = ("id", "zone_id", "type", "data")
+
+    def __init__(self, row: dict):
+        self.id = row["id"]
+        self.zone_id = row["zone_id"]
+        self.type = row["type"]
+        self.data = dumps(row).decode()
+
+class Subscription:
+    """File bornée d'un abonné ; au-delà, les messages les plus anciens sont abandonnés"""
+
+    def __init__(self, zone_id: int | None = None, type: str | None = None, maxsize: int = 1000):
+        self.zone_id = zone_id
+        self.type = type
+        self.queue = asyncio.Queue(maxsize)
+        self.dropped = 0
+
+    def matches(self, message: Message) -> bool:
+        return (
+            (self.zone_id is None or message.zone_id == self.zone_id)
+            and (self.type is None or message.type == self.type)
+        )
+
+    def put(self, message: Message):
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+            metrics.STREAM_DROPPED.inc()
+        self.queue.put_nowait(message)
+
+    async def get(self, timeout: float | None = None) -> Message | None:
+        """Prochain message, ou None après `timeout` secondes sans message"""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def take_dropped(self) -> int:
+        """Messages perdus depuis le dernier appel"""
+        dropped, self.dropped = self.dropped, 0
+        return dropped
+
+def _max_id(db: Session) -> int:
+    return db.execute(select(func.max(Indicator.id))).scalar() or 0
+
+def _rows_after(db: Session, after_id: int) -> list[dict]:
+    rows = db.execute(
+        select(*(Indicator.__table__.c[name] for name in COLUMNS))
+        .where(Indicator.id > after_id)
+        .order_by(Indicator.id)
+        .limit(POLL_BATCH_SIZE)
+    ).all()
+    return [row._asdict() for row in rows]
+
+class Broadcaster:
+    """Abonnés du processus et tâche de relève, liés à la boucle d'événements de l'API"""
+
+    def __init__(self, queue_size: int, poll_interval: float):
+        self.queue_size = queue_size
+        self.poll_interval = poll_interval
+        self.subscribers = set()
+        self.last_id = 0
+        self._loop = None
+        self._task = None
+        self._wakeup = None
+
+    async def subscribe(self, zone_id: int | None = None, type: str | None = None) -> Subscription:
+        """Abonné aux indicateurs créés à partir de maintenant"""
+        loop = asyncio.get_running_loop()
+        if not self._running(loop):
+            # Point de départ lu avant de rendre la main : rien n'est manqué ensuite
+            async with read_session() as db:
+                last_id = await db.run_sync(_max_id)
+            if not self._running(loop):
+                self.last_id = last_id
+                self._loop = loop
+                self._wakeup = asyncio.Event()
+                self._task = loop.create_task(self._run())
+        subscription = Subscription(zone_id, type, self.queue_size)
+        self.subscribers.add(subscription)
+        metrics.STREAM_SUBSCRIBERS.inc()
+        return subscription
+
+    def _running(self, loop) -> bool:
+        return self._task is not None and not self._task.done() and self._loop is loop
+
+    def unsubscribe(self, subscription: Subscription):
+        if subscription not in self.subscribers:
+            return
+        self.subscribers.discard(subscription)
+        metrics.STREAM_SUBSCRIBERS.dec()
+        if not self.subscribers and self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def wake(self):
+        """Relève immédiate (appelable depuis n'importe quel thread)"""
+        loop, wakeup = self._loop, self._wakeup
+        if not self.subscribers or loop is None or loop.is_closed():
+            return
+        try:
+            loop.call_soon_threadsafe(wakeup.set)
+        except RuntimeError:  # boucle fermée entre-temps
+            pass
+
+    def publish(self, rows):
+        """Diffuse des lignes aux abonnés concernés (dans la boucle d'événements)"""
+        for row in rows:
+            message = Message(row)
+            self.last_id = max(self.last_id, message.id)
+            for subscription in self.subscribers:
+                if subscription.matches(message):
+                    subscription.put(message)
+
+    async def poll(self):
+        while True:
+            async with read_session() as db:
+                rows = await db.run_sync(_rows_after, self.last_id)
+            self.publish(rows)
+            if len(rows) < POLL_BATCH_SIZE:
+                return
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.poll()
+            except Exception:
+                logger.exception("Relève du flux d'indicateurs en échec")
+
+broadcaster = Broadcaster(settings.STREAM_QUEUE_SIZE, settings.STREAM_POLL_INTERVAL_SECONDS)
+
+async def events(zone_id: int | None = None, type: str | None = None):
+    """Événements d'un abonné (nom, données JSON, id) : `ready` une fois abonné, puis
+    `indicator`, `dropped` (messages perdus) et `ping` après STREAM_HEARTBEAT_SECONDS sans activité"""
+    subscription = await broadcaster.subscribe(zone_id, type)
+    try:
+        yield "ready", "{}", None
+        while True:
+            message = await subscription.get(settings.STREAM_HEARTBEAT_SECONDS)
+            dropped = subscription.take_dropped()
+            if dropped:
+                yield "dropped", f'{{"count":{dropped}}}', None
+            if message is None:
+                yield "ping", "{}", None
+            else:
+                yield "indicator", message.data, message.id
+    finally:
+        broadcaster.unsubscribe(subscription)
+
+# --- Chemin d'écriture ---
+
+def stage_notify(db: Session):
+    """À appeler quand une transaction ajoute des indicateurs ; relève après commit"""
+    db.info[_PENDING_KEY] = True
+
+@event.listens_for(Session, "after_commit")
+def _notify_committed(session):
+    if session.info.pop(_PENDING_KEY, False):
+        broadcaster.wake()
+
+@event.listens_for(Session, "after_rollback")
+def _discard_pending(session):
+    session.info.pop(_PENDING_KEY, None)
@@ -0,0 +1,132 @@
+"""
+meta_info en JSON : filtres meta.<clé>=valeur et index d'expression sur les clés fréquentes.
+
+Le filtre compare json_extract(meta_info, '$.<clé>') à la valeur demandée. Le chemin est
+écrit en littéral (et non en paramètre lié) pour que SQLite reconnaisse l'expression de
+l'index ix_indicators_meta_<clé> créé pour chaque clé de META_INDEXED_KEYS.
+Les anciennes valeurs en texte libre sont converties par migrate_meta_info.
+"""
+
+import logging
+import re
+from datetime import datetime
+from fastapi import HTTPException, Request
+from sqlalchemy import and_, bindparam, func, literal_column, or_, select, text, type_coerce, update, String
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.models.indicator import Indicator
+from app.models.schema_migration import SchemaMigration
+
+logger = logging.getLogger("ecotrack.meta")
+
+KEY_PATTERN = re.compile(r"^[A-Za-z_][A-Za-z0-9_]{0,63}$")
+INDEX_PREFIX = "ix_indicators_meta_"
+MIGRATION_NAME = "meta_info_json"
+
+def meta_value(key: str):
+    """Expression json_extract(meta_info, '$.<clé>'), identique à celle des index"""
+    if not KEY_PATTERN.match(key):
+        raise ValueError(f"Invalid meta key: {key}")
+    return func.json_extract(Indicator.meta_info, literal_column(f"'$.{key}'"))
+
+def _candidates(value: str) -> list:
+    # Les paramètres d'URL sont du texte : "3" doit aussi trouver le nombre 3, "true" le booléen
+    candidates = [value]
+    if value in ("true", "false"):
+        candidates.append(1 if value == "true" else 0)
+    else:
+        try:
+            candidates.append(float(value))
+        except ValueError:
+            pass
+    return candidates
+
+def meta_condition(meta):
+    """Condition SQL d'une suite de filtres ((clé, valeur), ...) combinés par ET"""
+    return and_(*(meta_value(key).in_(_candidates(value)) for key, value in meta))
+
+def meta_filter(request: Request) -> tuple | None:
+    """Dépendance : paramètres meta.<clé>=valeur de l'URL, triés (clé du cache de réponses)"""
+    meta = tuple(sorted(
+        (name[len("meta."):], value)
+        for name, value in request.query_params.multi_items()
+        if name.startswith("meta.")
+    ))
+    for key, _ in meta:
+        if not KEY_PATTERN.match(key):
+            raise HTTPException(status_code=422, detail=f"Invalid meta key: {key}")
+    return meta or None
+
+# --- Index d'expression ---
+
+def ensure_meta_indexes(bind) -> list[str]:
+    """Crée les index des clés de META_INDEXED_KEYS et supprime ceux des clés retirées (SQLite)"""
+    if bind.dialect.name != "sqlite":
+        return []
+    keys = []
+    for key in settings.META_INDEXED_KEYS:
+        if KEY_PATTERN.match(key):
+            keys.append(key)
+        else:
+            logger.warning("Clé meta %r ignorée : nom invalide", key)
+
+    wanted = {INDEX_PREFIX + key: key for key in keys}
+    with bind.begin() as connection:
+        # Index d'expression : absents de la réflexion SQLAlchemy, lus dans sqlite_master
+        existing = set(connection.execute(
+            text("SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'indicators' AND name LIKE :prefix"),
+            {"prefix": INDEX_PREFIX + "%"}
+        ).scalars())
+        for name in existing - wanted.keys():
+            connection.execute(text(f"DROP INDEX IF EXISTS {name}"))
+        for name, key in wanted.items():
+            connection.execute(text(
+                f"CREATE INDEX IF NOT EXISTS {name} ON indicators (json_extract(meta_info, '$.{key}'))"
+            ))
+    return sorted(wanted)
+
+# --- Migration des anciennes valeurs texte ---
+
+def is_migrated(db: Session) -> bool:
+    return db.get(SchemaMigration, MIGRATION_NAME) is not None
+
+def migrate_meta_info(db: Session, batch_size: int | None = None) -> int:
+    """Convertit par lots d'identifiants les meta_info qui ne sont pas des objets JSON
+    ("PM2.5 à Paris" devient {"description": "PM2.5 à Paris"}) ; un commit par lot.
+    Renvoie le nombre de lignes converties."""
+    batch_size = batch_size or settings.META_MIGRATION_BATCH_SIZE
+    table = Indicator.__table__
+    # Texte brut, sans le décodage du type MetaInfo
+    raw = type_coerce(table.c.meta_info, String)
+    not_object = or_(func.json_valid(raw) == 0, func.json_type(raw) != "object")
+    statement = (
+        update(table)
+        .where(table.c.id == bindparam("row_id"))
+        .values(meta_info=bindparam("meta"))
+    )
+
+    converted = 0
+    last_id = 0
+    max_id = db.execute(select(func.max(table.c.id))).scalar() or 0
+    while last_id < max_id:
+        upper = last_id + batch_size
+        rows = db.execute(
+            select(table.c.id, raw)
+            .where(table.c.id > last_id, table.c.id <= upper, table.c.meta_info.isnot(None), not_object)
+        ).all()
+        if rows:
+            # Le type MetaInfo enveloppe le texte libre dans {"description": ...}
+            db.execute(statement, [{"row_id": row_id, "meta": value} for row_id, value in rows])
+            converted += len(rows)
+        db.commit()
+        last_id = upper
+
+    db.merge(SchemaMigration(name=MIGRATION_NAME, applied_at=datetime.utcnow()))
+    db.commit()
+    return converted
+
+def ensure_meta_info(db: Session) -> int:
+    """Migration au démarrage si elle n'a jamais été appliquée à cette base"""
+    if is_migrated(db):
+        return 0
+    return migrate_meta_info(db)
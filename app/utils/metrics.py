@@ -0,0 +1,204 @@
+"""
+Métriques au format texte Prometheus : latence par route, requêtes en cours,
+codes de statut, et requêtes SQL comptées par requête HTTP (détection N+1).
+Registre en mémoire propre à chaque processus.
+"""
+
+import logging
+import threading
+import time
+from contextvars import ContextVar
+from sqlalchemy import event
+from app.config import settings
+
+logger = logging.getLogger("ecotrack.metrics")
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200)
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(names, values, extra=()) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    pairs += [f'{name}="{value}"' for name, value in extra]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+class _Metric:
+    type = ""
+
+    def __init__(self, name: str, documentation: str, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _header(self) -> list[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+
+class Counter(_Metric):
+    type = "counter"
+
+    def inc(self, *labels, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> list[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return self._header() + [
+            f"{self.name}{_labels(self.labelnames, labels)} {value}" for labels, value in items
+        ]
+
+class Gauge(Counter):
+    type = "gauge"
+
+    def dec(self, *labels, amount: float = 1):
+        self.inc(*labels, amount=-amount)
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, *labels, value: float):
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                entry = self._values[labels] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[0][i] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def render(self) -> list[str]:
+        with self._lock:
+            items = sorted((labels, (list(c), s, n)) for labels, (c, s, n) in self._values.items())
+        lines = self._header()
+        for labels, (counts, total, count) in items:
+            for bound, bucket_count in zip(self.buckets, counts):
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, [('le', bound)])} {bucket_count}")
+            lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, [('le', '+Inf')])} {count}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {total}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {count}")
+        return lines
+
+REQUESTS = Counter("http_requests_total", "Requêtes HTTP par route et code de statut", ["method", "route", "status"])
+LATENCY = Histogram("http_request_duration_seconds", "Latence des requêtes HTTP", ["method", "route"])
+IN_FLIGHT = Gauge("http_requests_in_flight", "Requêtes HTTP en cours de traitement")
+REQUEST_QUERIES = Histogram(
+    "http_request_db_queries", "Requêtes SQL par requête HTTP", ["method", "route"], QUERY_COUNT_BUCKETS
+)
+REQUEST_DB_TIME = Histogram("http_request_db_duration_seconds", "Temps SQL par requête HTTP", ["method", "route"])
+QUERY_THRESHOLD_EXCEEDED = Counter(
+    "http_request_db_queries_threshold_exceeded_total",
+    "Requêtes HTTP au-delà de SQL_QUERY_WARN_THRESHOLD requêtes SQL (N+1 probable)",
+    ["method", "route"]
+)
+DB_QUERIES = Counter("db_queries_total", "Requêtes SQL exécutées", ["engine"])
+DB_QUERY_TIME = Histogram("db_query_duration_seconds", "Durée des requêtes SQL", ["engine"])
+STREAM_SUBSCRIBERS = Gauge("indicator_stream_subscribers", "Abonnés au flux /indicators/stream")
+STREAM_DROPPED = Counter(
+    "indicator_stream_dropped_total", "Messages du flux abandonnés (file d'un abonné lent pleine)"
+)
+
+REGISTRY = [
+    REQUESTS, LATENCY, IN_FLIGHT, REQUEST_QUERIES, REQUEST_DB_TIME,
+    QUERY_THRESHOLD_EXCEEDED, DB_QUERIES, DB_QUERY_TIME,
+    STREAM_SUBSCRIBERS, STREAM_DROPPED,
+]
+
+def render() -> str:
+    return "\n".join(line for metric in REGISTRY for line in metric.render()) + "\n"
+
+class RequestStats:
+    """Requêtes SQL de la requête HTTP courante (partagé avec le threadpool via le contexte)"""
+    __slots__ = ("queries", "db_time")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+
+_current = ContextVar("request_stats", default=None)
+
+# --- Instrumentation SQLAlchemy ---
+
+def instrument_engine(sync_engine, name: str):
+    """Compte et chronomètre chaque requête SQL du moteur"""
+
+    # Une seule requête à la fois par connexion : un début unique, effacé aussi en cas d'erreur
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info["query_start_time"] = time.perf_counter()
+
+    @event.listens_for(sync_engine, "handle_error")
+    def handle_error(context):
+        if context.connection is not None:
+            context.connection.info.pop("query_start_time", None)
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info.pop("query_start_time")
+        DB_QUERIES.inc(name)
+        DB_QUERY_TIME.observe(name, value=elapsed)
+        stats = _current.get()
+        if stats is not None:
+            stats.queries += 1
+            stats.db_time += elapsed
+
+# --- Middleware ASGI ---
+
+class MetricsMiddleware:
+    """Latence, statut et requêtes SQL par route ; en-tête Server-Timing optionnel"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        stats = RequestStats()
+        token = _current.set(stats)
+        start = time.perf_counter()
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if settings.METRICS_SERVER_TIMING:
+                    elapsed = (time.perf_counter() - start) * 1000
+                    timing = (
+                        f'app;dur={elapsed:.1f}, '
+                        f'db;dur={stats.db_time * 1000:.1f};desc="{stats.queries} queries"'
+                    )
+                    message["headers"] = list(message.get("headers", [])) + [
+                        (b"server-timing", timing.encode())
+                    ]
+            await send(message)
+
+        IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            IN_FLIGHT.dec()
+            _current.reset(token)
+            elapsed = time.perf_counter() - start
+            # Gabarit de la route (/indicators/{indicator_id}) : cardinalité bornée
+            route = getattr(scope.get("route"), "path", "unmatched")
+            method = scope["method"]
+            REQUESTS.inc(method, route, str(status))
+            LATENCY.observe(method, route, value=elapsed)
+            REQUEST_QUERIES.observe(method, route, value=stats.queries)
+            REQUEST_DB_TIME.observe(method, route, value=stats.db_time)
+            if stats.queries > settings.SQL_QUERY_WARN_THRESHOLD:
+                QUERY_THRESHOLD_EXCEEDED.inc(method, route)
+                logger.warning(
+                    "%s %s : %d requêtes SQL (seuil %d), N+1 probable",
+                    method, route, stats.queries, settings.SQL_QUERY_WARN_THRESHOLD
+                )
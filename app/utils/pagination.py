@@ -0,0 +1,19 @@
+import base64
+from datetime import datetime
+
+# Curseur opaque pour la pagination par clé (timestamp, id)
+
+def encode_cursor(timestamp: datetime, indicator_id: int) -> str:
+    """Encode la position (timestamp, id) du dernier élément renvoyé"""
+    raw = f"{timestamp.isoformat()}|{indicator_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> tuple[datetime, int]:
+    """Décode un curseur ; lève ValueError s'il est invalide"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode()).decode()
+        timestamp, indicator_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(timestamp), int(indicator_id)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError("Invalid cursor") from e
@@ -0,0 +1,220 @@
+"""
+Rétention par type d'indicateur et compaction des données anciennes.
+
+Les agrégats horaires, journaliers et mensuels résument déjà chaque mesure (ils sont
+mis à jour à chaque écriture) : compacter consiste à avancer un horizon, puis à
+supprimer par lots les mesures brutes, et plus tard les agrégats horaires, qui le
+précèdent. Les agrégats journaliers et mensuels sont gardés. Les horizons atteints
+sont enregistrés en base : avant l'horizon brut, les statistiques lisent les
+agrégats, à la précision de la granularité conservée.
+"""
+
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from sqlalchemy import delete, func, select
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.database import SessionLocal
+from app.models.indicator import Indicator
+from app.models.retention import RetentionHorizon
+from app.models.rollup import IndicatorRollupHourly, IndicatorRollupMonthly
+from app.utils.rollups import GRANULARITIES, is_aligned, truncate
+from app.utils.sql import dialect_insert
+from app.utils import versions
+
+logger = logging.getLogger("ecotrack.retention")
+
+RAW = "raw"
+HOURLY = "hourly"
+
+def policy_for(type_: str) -> dict | None:
+    policies = settings.RETENTION_POLICIES
+    return policies.get(type_, policies.get("*"))
+
+# --- Horizons et découpage des requêtes ---
+
+def horizons(db: Session, type: str | None = None) -> dict:
+    """{granularité: horizon} du type, ou les plus récents tous types confondus"""
+    query = select(RetentionHorizon.granularity, func.max(RetentionHorizon.horizon))
+    if type:
+        query = query.where(RetentionHorizon.type == type)
+    return dict(db.execute(query.group_by(RetentionHorizon.granularity)).all())
+
+def horizons_by_type(db: Session) -> dict:
+    """{type: {granularité: horizon}} des types compactés"""
+    result = {}
+    for type_, granularity, horizon in db.execute(
+        select(RetentionHorizon.type, RetentionHorizon.granularity, RetentionHorizon.horizon)
+    ):
+        result.setdefault(type_, {})[granularity] = horizon
+    return result
+
+def raw_horizons(db: Session) -> dict:
+    """{type: horizon} des types dont des mesures brutes ont été compactées"""
+    return dict(db.execute(
+        select(RetentionHorizon.type, RetentionHorizon.horizon)
+        .where(RetentionHorizon.granularity == RAW)
+    ).all())
+
+def is_compacted(db: Session, type: str, timestamp: datetime) -> bool:
+    horizon = horizons(db, type).get(RAW)
+    return horizon is not None and timestamp.replace(tzinfo=None) < horizon
+
+def _segment(finest: str, start, stop, candidates):
+    # Granularités utilisables : pas plus fines que celle conservée sur la portion
+    rank = GRANULARITIES.index
+    usable = [g for g in candidates if rank(g) <= rank(finest)] or [finest]
+    if start is not None:
+        start = truncate(usable[-1], start)
+    for granularity in usable:
+        if is_aligned(granularity, start) and is_aligned(granularity, stop):
+            return granularity, start, stop
+    return usable[-1], start, stop
+
+def split(db: Session, type, date_from, date_to, candidates=GRANULARITIES):
+    """Découpe [date_from, date_to] selon les horizons : portions compactées servies par
+    les agrégats [(granularité, début, fin exclue)] et plage brute restante (ou None).
+    Dans une portion compactée, date_from est arrondi au début de son bucket."""
+    current = horizons(db, type)
+    raw = current.get(RAW)
+    if raw is None or (date_from is not None and date_from >= raw):
+        return [], (date_from, date_to)
+
+    end = raw if date_to is None or date_to >= raw else date_to
+    hourly = current.get(HOURLY)
+    if hourly is not None and (date_from is None or date_from < hourly):
+        # Avant l'horizon horaire, il ne reste que les agrégats journaliers
+        parts = [("daily", date_from, min(hourly, end)), ("hourly", hourly, end)]
+    else:
+        parts = [("hourly", date_from, end)]
+    segments = [
+        _segment(finest, start, stop, candidates)
+        for finest, start, stop in parts
+        if start is None or start < stop
+    ]
+    raw_range = (raw, date_to) if end == raw else None
+    return segments, raw_range
+
+# --- Compaction ---
+
+def _advance(db: Session, type_: str, granularity: str, horizon: datetime) -> datetime:
+    """Enregistre un horizon (jamais reculé) avant toute suppression ; les lectures
+    basculent sur les agrégats dans la même transaction"""
+    current = db.get(RetentionHorizon, (type_, granularity))
+    if current is not None and current.horizon >= horizon:
+        return current.horizon
+    table = RetentionHorizon.__table__
+    stmt = dialect_insert(db, table).values(type=type_, granularity=granularity, horizon=horizon)
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=["type", "granularity"], set_={"horizon": horizon}
+    ))
+    versions.bump_all(db)
+    db.commit()
+    return horizon
+
+def _delete_raw(db: Session, type_: str, horizon: datetime, batch_size: int) -> int:
+    total = 0
+    while True:
+        ids = (
+            select(Indicator.id)
+            .where(Indicator.type == type_, Indicator.timestamp < horizon)
+            .limit(batch_size)
+        )
+        deleted = db.execute(delete(Indicator).where(Indicator.id.in_(ids))).rowcount
+        # Une transaction courte par lot : le verrou d'écriture est rendu entre les lots
+        db.commit()
+        total += deleted
+        if deleted < batch_size:
+            return total
+
+def _delete_hourly(db: Session, type_: str, horizon: datetime, batch_size: int) -> int:
+    model = IndicatorRollupHourly
+    zone_ids = db.execute(
+        select(IndicatorRollupMonthly.zone_id).where(IndicatorRollupMonthly.type == type_).distinct()
+    ).scalars().all()
+    total = 0
+    for zone_id in zone_ids:
+        # Parcours par zone : préfixe de la clé primaire (zone_id, type, bucket)
+        while True:
+            buckets = (
+                select(model.bucket)
+                .where(model.zone_id == zone_id, model.type == type_, model.bucket < horizon)
+                .limit(batch_size)
+            )
+            deleted = db.execute(delete(model).where(
+                model.zone_id == zone_id, model.type == type_, model.bucket.in_(buckets)
+            )).rowcount
+            db.commit()
+            total += deleted
+            if deleted < batch_size:
+                break
+    return total
+
+def incremental_vacuum(db: Session, pages: int | None = None) -> int:
+    """Rend les pages libres au système par petites étapes (SQLite en auto_vacuum=INCREMENTAL)"""
+    bind = db.get_bind()
+    if bind.dialect.name != "sqlite":
+        return 0
+    pages = pages or settings.RETENTION_VACUUM_PAGES
+    connection = bind.raw_connection()
+    try:
+        sqlite = connection.driver_connection
+        if sqlite.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+            return 0
+        freed = 0
+        while True:
+            free = sqlite.execute("PRAGMA freelist_count").fetchone()[0]
+            if not free:
+                return freed
+            # executescript exécute le pragma jusqu'au bout (execute ne libère qu'une page)
+            sqlite.executescript(f"PRAGMA incremental_vacuum({min(free, pages)});")
+            freed += min(free, pages)
+    finally:
+        connection.close()
+
+def enable_incremental_vacuum(db: Session):
+    """Passe une base existante en auto_vacuum=INCREMENTAL (VACUUM complet, une fois)"""
+    connection = db.get_bind().raw_connection()
+    try:
+        connection.driver_connection.executescript("PRAGMA auto_vacuum = INCREMENTAL; VACUUM;")
+    finally:
+        connection.close()
+
+def compact(db: Session, now: datetime | None = None, batch_size: int | None = None) -> dict:
+    """Applique les politiques de rétention ; lignes supprimées par type et pages libérées"""
+    now = now or datetime.utcnow()
+    batch_size = batch_size or settings.RETENTION_BATCH_SIZE
+    types = db.execute(select(IndicatorRollupMonthly.type).distinct()).scalars().all()
+    db.commit()
+
+    report = {"types": {}, "vacuum_pages": 0}
+    for type_ in sorted(types):
+        policy = policy_for(type_)
+        if not policy or not policy.get("raw_days"):
+            continue
+        raw_days = policy["raw_days"]
+        # Horizons alignés sur les jours : frontières exactes des agrégats journaliers
+        horizon = _advance(db, type_, RAW, truncate("daily", now - timedelta(days=raw_days)))
+        counts = {"raw": _delete_raw(db, type_, horizon, batch_size), "hourly": 0}
+        if policy.get("hourly_days"):
+            days = max(policy["hourly_days"], raw_days)
+            horizon = _advance(db, type_, HOURLY, truncate("daily", now - timedelta(days=days)))
+            counts["hourly"] = _delete_hourly(db, type_, horizon, batch_size)
+        report["types"][type_] = counts
+    report["vacuum_pages"] = incremental_vacuum(db)
+    return report
+
+def _compact_now() -> dict:
+    with SessionLocal() as db:
+        return compact(db)
+
+async def compaction_loop(interval: float):
+    """Tâche de fond de l'API : compaction toutes les `interval` secondes, hors de la boucle"""
+    while True:
+        try:
+            report = await asyncio.to_thread(_compact_now)
+            logger.info("Compaction : %s", report)
+        except Exception:
+            logger.exception("Compaction en échec")
+        await asyncio.sleep(interval)
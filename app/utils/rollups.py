@@ -0,0 +1,350 @@
+"""
+Agrégats pré-calculés (rollups) des indicateurs par heure, jour et mois.
+Ils sont mis à jour dans la même transaction que les écritures brutes.
+"""
+
+from datetime import datetime, timedelta
+from sqlalchemy import and_, func, or_, select, insert, delete, true
+from sqlalchemy.orm import Session
+from app.models.indicator import Indicator
+from app.models.rollup import (
+    IndicatorRollupHourly, IndicatorRollupDaily, IndicatorRollupMonthly,
+    IndicatorSketchDaily, IndicatorSketchMonthly,
+)
+from app.models.retention import RetentionHorizon
+from app.utils import sketches
+from app.utils.sql import dialect_insert
+from app.utils import versions, timeseries, live
+
+ROLLUP_MODELS = {
+    "hourly": IndicatorRollupHourly,
+    "daily": IndicatorRollupDaily,
+    "monthly": IndicatorRollupMonthly,
+}
+
+# Du plus grossier au plus fin
+GRANULARITIES = ["monthly", "daily", "hourly"]
+
+ROLLUP_COLUMNS = [
+    "zone_id", "type", "bucket", "value_count", "value_sum", "value_min", "value_max", "value_sum_sq"
+]
+
+# Sketches de distribution, stockés à côté des rollups journaliers et mensuels
+SKETCH_MODELS = {
+    "daily": IndicatorSketchDaily,
+    "monthly": IndicatorSketchMonthly,
+}
+SKETCH_GRANULARITIES = ["monthly", "daily"]
+
+# Lignes de bins écrites par lot lors d'une reconstruction
+_SKETCH_FLUSH_SIZE = 10000
+
+# Format identique au stockage DateTime de SQLAlchemy sous SQLite
+_SQL_BUCKET_FORMATS = {
+    "hourly": "%Y-%m-%d %H:00:00.000000",
+    "daily": "%Y-%m-%d 00:00:00.000000",
+    "monthly": "%Y-%m-01 00:00:00.000000",
+}
+
+def truncate(granularity: str, dt: datetime) -> datetime:
+    """Début du bucket contenant dt"""
+    dt = dt.replace(minute=0, second=0, microsecond=0)
+    if granularity in ("daily", "monthly"):
+        dt = dt.replace(hour=0)
+    if granularity == "monthly":
+        dt = dt.replace(day=1)
+    return dt
+
+def bucket_end(granularity: str, start: datetime) -> datetime:
+    """Début du bucket suivant"""
+    if granularity == "hourly":
+        return start + timedelta(hours=1)
+    if granularity == "daily":
+        return start + timedelta(days=1)
+    if start.month == 12:
+        return start.replace(year=start.year + 1, month=1)
+    return start.replace(month=start.month + 1)
+
+def is_aligned(granularity: str, dt: datetime | None) -> bool:
+    """Vrai si dt est absent ou tombe sur une frontière de bucket"""
+    return dt is None or truncate(granularity, dt) == dt
+
+def _field(row, name):
+    return row[name] if isinstance(row, dict) else getattr(row, name)
+
+def _upsert(db: Session, model, rows: list[dict]):
+    """INSERT ... ON CONFLICT qui additionne les agrégats existants (executemany)"""
+    table = model.__table__
+    stmt = dialect_insert(db, table)
+    if db.get_bind().dialect.name == "postgresql":
+        scalar_min, scalar_max = func.least, func.greatest
+    else:
+        scalar_min, scalar_max = func.min, func.max
+
+    excluded = stmt.excluded
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["zone_id", "type", "bucket"],
+        set_={
+            "value_count": table.c.value_count + excluded.value_count,
+            "value_sum": table.c.value_sum + excluded.value_sum,
+            "value_min": scalar_min(table.c.value_min, excluded.value_min),
+            "value_max": scalar_max(table.c.value_max, excluded.value_max),
+            "value_sum_sq": table.c.value_sum_sq + excluded.value_sum_sq,
+        }
+    )
+    db.execute(stmt, rows)
+
+def _upsert_sketch(db: Session, model, bins: dict):
+    """Ajoute des comptes {(zone_id, type, bucket, bin): count} au sketch (executemany)"""
+    table = model.__table__
+    stmt = dialect_insert(db, table)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["zone_id", "type", "bucket", "bin"],
+        set_={"value_count": table.c.value_count + stmt.excluded.value_count}
+    )
+    db.execute(stmt, [
+        {"zone_id": zone_id, "type": type_, "bucket": bucket, "bin": bin_, "value_count": count}
+        for (zone_id, type_, bucket, bin_), count in bins.items()
+    ])
+
+def add_to_rollups(db: Session, rows):
+    """Ajoute des mesures (objets Indicator ou dicts) aux rollups, sans commit"""
+    aggregates = {granularity: {} for granularity in ROLLUP_MODELS}
+    bins = {granularity: {} for granularity in SKETCH_MODELS}
+    series = set()
+
+    for row in rows:
+        value = _field(row, "value")
+        timestamp = _field(row, "timestamp")
+        zone_id, type_ = _field(row, "zone_id"), _field(row, "type")
+        series.add((zone_id, type_))
+        for granularity, buckets in aggregates.items():
+            key = (zone_id, type_, truncate(granularity, timestamp))
+            agg = buckets.get(key)
+            if agg is None:
+                buckets[key] = [1, value, value, value, value * value]
+            else:
+                agg[0] += 1
+                agg[1] += value
+                agg[2] = min(agg[2], value)
+                agg[3] = max(agg[3], value)
+                agg[4] += value * value
+        index = sketches.bin_index(value)
+        for granularity, counts in bins.items():
+            key = (zone_id, type_, truncate(granularity, timestamp), index)
+            counts[key] = counts.get(key, 0) + 1
+
+    for granularity, buckets in aggregates.items():
+        if not buckets:
+            continue
+        _upsert(db, ROLLUP_MODELS[granularity], [
+            {
+                "zone_id": zone_id,
+                "type": type_,
+                "bucket": bucket,
+                "value_count": agg[0],
+                "value_sum": agg[1],
+                "value_min": agg[2],
+                "value_max": agg[3],
+                "value_sum_sq": agg[4],
+            }
+            for (zone_id, type_, bucket), agg in buckets.items()
+        ])
+    for granularity, counts in bins.items():
+        if counts:
+            _upsert_sketch(db, SKETCH_MODELS[granularity], counts)
+
+    # Toute écriture d'indicateurs passe par ici : on invalide les caches concernés,
+    # les séries en mémoire sont complétées et le flux est relevé après commit
+    previous = timeseries.versions_before_write(db, series)
+    version = versions.bump_series(db, series)
+    timeseries.stage_append(db, rows, previous, version)
+    live.stage_notify(db)
+
+def refresh_rollups(db: Session, zone_id: int, type: str, timestamp: datetime):
+    """Recalcule depuis les données brutes les buckets contenant une mesure modifiée ou supprimée"""
+    refresh_buckets(db, [(zone_id, type, timestamp)])
+
+def refresh_buckets(db: Session, points):
+    """Comme refresh_rollups pour des (zone_id, type, timestamp), chaque bucket recalculé une fois"""
+    points = list(points)
+    db.flush()
+    versions.bump_series(db, {(zone_id, type_) for zone_id, type_, _ in points})
+    for granularity, model in ROLLUP_MODELS.items():
+        buckets = {(zone_id, type_, truncate(granularity, timestamp)) for zone_id, type_, timestamp in points}
+        for zone_id, type_, start in buckets:
+            _refresh_bucket(db, granularity, model, zone_id, type_, start)
+
+def _refresh_bucket(db: Session, granularity: str, model, zone_id: int, type: str, start: datetime):
+    end = bucket_end(granularity, start)
+    if granularity == "monthly":
+        # Depuis les agrégats journaliers (recalculés avant) : ils couvrent aussi les jours compactés
+        daily = ROLLUP_MODELS["daily"]
+        stats = db.query(
+            func.sum(daily.value_count),
+            func.sum(daily.value_sum),
+            func.min(daily.value_min),
+            func.max(daily.value_max),
+            func.sum(daily.value_sum_sq)
+        ).filter(
+            daily.zone_id == zone_id,
+            daily.type == type,
+            daily.bucket >= start,
+            daily.bucket < end
+        ).one()
+    else:
+        stats = db.query(
+            func.count(Indicator.id),
+            func.sum(Indicator.value),
+            func.min(Indicator.value),
+            func.max(Indicator.value),
+            func.sum(Indicator.value * Indicator.value)
+        ).filter(
+            Indicator.zone_id == zone_id,
+            Indicator.type == type,
+            Indicator.timestamp >= start,
+            Indicator.timestamp < end
+        ).one()
+
+    db.execute(delete(model).where(
+        model.zone_id == zone_id,
+        model.type == type,
+        model.bucket == start
+    ))
+    if stats[0]:
+        db.execute(insert(model).values(
+            zone_id=zone_id,
+            type=type,
+            bucket=start,
+            value_count=stats[0],
+            value_sum=stats[1],
+            value_min=stats[2],
+            value_max=stats[3],
+            value_sum_sq=stats[4]
+        ))
+
+    sketch_model = SKETCH_MODELS.get(granularity)
+    if sketch_model is not None:
+        db.execute(delete(sketch_model).where(
+            sketch_model.zone_id == zone_id,
+            sketch_model.type == type,
+            sketch_model.bucket == start
+        ))
+        counts = {}
+        if granularity == "monthly":
+            daily = SKETCH_MODELS["daily"]
+            bins = db.query(daily.bin, func.sum(daily.value_count)).filter(
+                daily.zone_id == zone_id,
+                daily.type == type,
+                daily.bucket >= start,
+                daily.bucket < end
+            ).group_by(daily.bin)
+            for bin_, count in bins:
+                counts[(zone_id, type, start, bin_)] = count
+        else:
+            values = db.query(Indicator.value).filter(
+                Indicator.zone_id == zone_id,
+                Indicator.type == type,
+                Indicator.timestamp >= start,
+                Indicator.timestamp < end
+            )
+            for (value,) in values:
+                key = (zone_id, type, start, sketches.bin_index(value))
+                counts[key] = counts.get(key, 0) + 1
+        if counts:
+            _upsert_sketch(db, sketch_model, counts)
+
+def _raw_horizons(db: Session) -> dict:
+    # Horizons de compaction (app.utils.retention) : avant, plus de mesures brutes
+    return dict(db.execute(
+        select(RetentionHorizon.type, RetentionHorizon.horizon)
+        .where(RetentionHorizon.granularity == "raw")
+    ).all())
+
+def _after_horizons(type_column, time_column, horizons: dict):
+    """Condition excluant ce qui précède l'horizon de compaction de chaque type"""
+    return and_(true(), *(
+        or_(type_column != type_, time_column >= horizon) for type_, horizon in horizons.items()
+    ))
+
+def rebuild_rollups(db: Session) -> dict:
+    """Reconstruit les rollups à partir de la table indicators. Les agrégats antérieurs à
+    un horizon de compaction sont conservés ; les mensuels sont refaits depuis les journaliers."""
+    counts = {}
+    horizons = _raw_horizons(db)
+    for granularity in ("hourly", "daily"):
+        model = ROLLUP_MODELS[granularity]
+        bucket = func.strftime(_SQL_BUCKET_FORMATS[granularity], Indicator.timestamp)
+        source = select(
+            Indicator.zone_id,
+            Indicator.type,
+            bucket,
+            func.count(Indicator.id),
+            func.sum(Indicator.value),
+            func.min(Indicator.value),
+            func.max(Indicator.value),
+            func.sum(Indicator.value * Indicator.value)
+        ).where(
+            _after_horizons(Indicator.type, Indicator.timestamp, horizons)
+        ).group_by(Indicator.zone_id, Indicator.type, bucket)
+
+        db.execute(delete(model).where(_after_horizons(model.type, model.bucket, horizons)))
+        db.execute(insert(model).from_select(ROLLUP_COLUMNS, source))
+        counts[granularity] = db.query(func.count()).select_from(model).scalar()
+
+    daily, monthly = ROLLUP_MODELS["daily"], ROLLUP_MODELS["monthly"]
+    bucket = func.strftime(_SQL_BUCKET_FORMATS["monthly"], daily.bucket)
+    db.execute(delete(monthly))
+    db.execute(insert(monthly).from_select(ROLLUP_COLUMNS, select(
+        daily.zone_id,
+        daily.type,
+        bucket,
+        func.sum(daily.value_count),
+        func.sum(daily.value_sum),
+        func.min(daily.value_min),
+        func.max(daily.value_max),
+        func.sum(daily.value_sum_sq)
+    ).group_by(daily.zone_id, daily.type, bucket)))
+    counts["monthly"] = db.query(func.count()).select_from(monthly).scalar()
+
+    _rebuild_sketches(db, horizons)
+    versions.bump_all(db)
+    db.commit()
+    return counts
+
+def _rebuild_sketches(db: Session, horizons: dict):
+    """Sketches journaliers en un passage sur les mesures (comptes fusionnés par upsert),
+    mensuels par somme des journaliers"""
+    daily, monthly = SKETCH_MODELS["daily"], SKETCH_MODELS["monthly"]
+    db.execute(delete(daily).where(_after_horizons(daily.type, daily.bucket, horizons)))
+    
+    counts = {}
+    rows = db.execute(
+        select(Indicator.zone_id, Indicator.type, Indicator.timestamp, Indicator.value)
+        .where(_after_horizons(Indicator.type, Indicator.timestamp, horizons))
+        .execution_options(yield_per=_SKETCH_FLUSH_SIZE)
+    )
+    for zone_id, type_, timestamp, value in rows:
+        key = (zone_id, type_, truncate("daily", timestamp), sketches.bin_index(value))
+        counts[key] = counts.get(key, 0) + 1
+        if len(counts) >= _SKETCH_FLUSH_SIZE:
+            _upsert_sketch(db, daily, counts)
+            counts.clear()
+    if counts:
+        _upsert_sketch(db, daily, counts)
+    
+    bucket = func.strftime(_SQL_BUCKET_FORMATS["monthly"], daily.bucket)
+    db.execute(delete(monthly))
+    db.execute(insert(monthly).from_select(
+        ["zone_id", "type", "bucket", "bin", "value_count"],
+        select(daily.zone_id, daily.type, bucket, daily.bin, func.sum(daily.value_count))
+        .group_by(daily.zone_id, daily.type, bucket, daily.bin)
+    ))
+
+def ensure_rollups(db: Session):
+    """Construit les rollups au démarrage si la base contient des mesures non agrégées"""
+    has_indicators = db.query(Indicator.id).first() is not None
+    has_rollups = db.query(IndicatorRollupHourly.bucket).first() is not None
+    has_sketches = db.query(IndicatorSketchMonthly.bucket).first() is not None
+    if has_indicators and not (has_rollups and has_sketches):
+        rebuild_rollups(db)
@@ -1,7 +1,16 @@
+import asyncio
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
 from passlib.context import CryptContext
+from app.config import settings
 
 # Configuration pour le hashing des mots de passe
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__rounds=settings.BCRYPT_ROUNDS
+)
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     # Vérifie si un mot de passe correspond au hash
@@ -9,4 +18,65 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
 
 def get_password_hash(password: str) -> str:
     # Hash le mot de passe
-    return pwd_context.hash(password)
\ No newline at end of file
+    return pwd_context.hash(password)
+
+def verify_and_update_password(plain_password: str, hashed_password: str) -> tuple[bool, str | None]:
+    # Vérifie le mot de passe et renvoie un nouveau hash si les paramètres de coût ont changé
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
+class HashingPoolBusy(Exception):
+    """Trop de calculs bcrypt en attente"""
+
+# Pool de processus dédié à bcrypt, hors des threads qui servent les requêtes
+_pool: ProcessPoolExecutor | None = None
+_pending = 0
+_lock = threading.Lock()
+
+def _lower_priority():
+    # Les workers bcrypt cèdent le CPU aux requêtes en cours
+    if hasattr(os, "nice"):
+        os.nice(settings.PASSWORD_HASH_NICE)
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(
+            max_workers=settings.PASSWORD_HASH_WORKERS,
+            initializer=_lower_priority
+        )
+    return _pool
+
+def _release(_future):
+    global _pending
+    with _lock:
+        _pending -= 1
+
+async def _run_in_pool(func, *args):
+    """Exécute func dans le pool ; lève HashingPoolBusy si la file est pleine"""
+    global _pending
+    with _lock:
+        if _pending >= settings.PASSWORD_HASH_MAX_PENDING:
+            raise HashingPoolBusy()
+        _pending += 1
+    try:
+        future = _get_pool().submit(func, *args)
+    except Exception:
+        _release(None)
+        raise
+    future.add_done_callback(_release)
+    return await asyncio.wrap_future(future)
+
+async def hash_password_async(password: str) -> str:
+    return await _run_in_pool(get_password_hash, password)
+
+async def verify_and_update_password_async(plain_password: str, hashed_password: str) -> tuple[bool, str | None]:
+    return await _run_in_pool(verify_and_update_password, plain_password, hashed_password)
+
+def pending_hash_jobs() -> int:
+    return _pending
+
+def shutdown_hash_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
@@ -0,0 +1,38 @@
+"""
+Sérialisation JSON rapide des listes : lignes Core encodées directement en octets,
+sans instances ORM ni validation Pydantic. orjson est utilisé s'il est installé.
+"""
+
+import json
+from datetime import date, datetime
+from fastapi import Request
+from fastapi.responses import Response
+from app.config import settings
+
+try:
+    import orjson
+except ImportError:  # dépendance optionnelle
+    orjson = None
+
+def _default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def dumps(obj) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, default=_default, ensure_ascii=False, separators=(",", ":")).encode()
+
+def dumps_rows(columns, rows) -> bytes:
+    """Tableau JSON d'objets à partir de tuples de colonnes"""
+    return dumps([dict(zip(columns, row)) for row in rows])
+
+def fast_serialization(request: Request) -> bool:
+    """Vrai si la route courante est listée dans FAST_SERIALIZATION_ROUTES"""
+    route = request.scope.get("route")
+    return route is not None and route.path in settings.FAST_SERIALIZATION_ROUTES
+
+class RawJSONResponse(Response):
+    """Réponse dont le corps est déjà encodé en JSON"""
+    media_type = "application/json"
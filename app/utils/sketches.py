@@ -0,0 +1,78 @@
+"""
+Sketches de distribution mergeables (histogramme logarithmique à la DDSketch).
+Une valeur tombe dans un bin entier ; deux sketches se fusionnent en additionnant
+les comptes de chaque bin, quels que soient la zone ou l'intervalle de temps.
+Les quantiles sont garantis à RELATIVE_ACCURACY près (en valeur relative).
+"""
+
+import math
+
+RELATIVE_ACCURACY = 0.01
+GAMMA = (1 + RELATIVE_ACCURACY) / (1 - RELATIVE_ACCURACY)
+_LOG_GAMMA = math.log(GAMMA)
+
+# Valeurs plus petites (en absolu) regroupées dans le bin 0
+MIN_INDEXABLE = 1e-9
+
+# Décalage des indices : bin > 0 pour les valeurs positives, < 0 pour les négatives
+_OFFSET = 1_000_000
+
+def bin_index(value: float) -> int:
+    """Bin contenant une valeur"""
+    magnitude = abs(value)
+    if magnitude < MIN_INDEXABLE:
+        return 0
+    index = _OFFSET + math.ceil(math.log(magnitude) / _LOG_GAMMA)
+    return index if value > 0 else -index
+
+def bin_value(index: int) -> float:
+    """Valeur représentative d'un bin (erreur relative <= RELATIVE_ACCURACY)"""
+    if index == 0:
+        return 0.0
+    exponent = abs(index) - _OFFSET
+    value = 2 * GAMMA ** exponent / (GAMMA + 1)
+    return value if index > 0 else -value
+
+def add_value(bins: dict, value: float, count: int = 1):
+    index = bin_index(value)
+    bins[index] = bins.get(index, 0) + count
+
+def merge(bins: dict, other: dict):
+    for index, count in other.items():
+        bins[index] = bins.get(index, 0) + count
+
+def _sorted_bins(bins: dict):
+    return sorted((bin_value(index), count) for index, count in bins.items() if count)
+
+def quantiles(bins: dict, qs, minimum: float, maximum: float) -> list[float]:
+    """Quantiles (entre 0 et 1) bornés par le min/max exacts"""
+    items = _sorted_bins(bins)
+    total = sum(count for _, count in items)
+    results = []
+    for q in qs:
+        rank = q * (total - 1)
+        cumulative = 0
+        value = items[-1][0] if items else 0.0
+        for bin_val, count in items:
+            cumulative += count
+            if cumulative > rank:
+                value = bin_val
+                break
+        results.append(min(max(value, minimum), maximum))
+    return results
+
+def histogram(bins: dict, minimum: float, maximum: float, size: int) -> list[dict]:
+    """Histogramme à pas constant entre min et max, reconstruit depuis le sketch"""
+    width = (maximum - minimum) / size
+    counts = [0] * size
+    for bin_val, count in _sorted_bins(bins):
+        position = int((bin_val - minimum) / width) if width else 0
+        counts[min(max(position, 0), size - 1)] += count
+    return [
+        {
+            "lower": minimum + i * width,
+            "upper": maximum if i == size - 1 else minimum + (i + 1) * width,
+            "count": count,
+        }
+        for i, count in enumerate(counts)
+    ]
@@ -0,0 +1,60 @@
+import logging
+from sqlalchemy import inspect, text
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.dialects import sqlite, postgresql
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger("ecotrack")
+
+def dialect_insert(db: Session, table):
+    """INSERT supportant ON CONFLICT pour le dialecte de la session (SQLite ou PostgreSQL)"""
+    if db.get_bind().dialect.name == "postgresql":
+        return postgresql.insert(table)
+    return sqlite.insert(table)
+
+def index_names(connection, table_name: str) -> set[str]:
+    """Noms des index d'une table. En SQLite, lus dans sqlite_master : la réflexion de
+    SQLAlchemy (get_indexes, checkfirst) avertit sur les index d'expression meta."""
+    if connection.dialect.name == "sqlite":
+        return set(connection.execute(
+            text("SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = :table"),
+            {"table": table_name}
+        ).scalars())
+    return {index["name"] for index in inspect(connection).get_indexes(table_name)}
+
+def add_missing_columns(bind, metadata) -> list[str]:
+    """ALTER TABLE ... ADD COLUMN pour les colonnes déclarées mais absentes d'une table
+    existante (create_all ne modifie pas les tables). Colonnes nullable uniquement."""
+    inspector = inspect(bind)
+    added = []
+    with bind.begin() as connection:
+        for table in metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                type_ = column.type.compile(dialect=bind.dialect)
+                connection.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {type_}"))
+                added.append(f"{table.name}.{column.name}")
+    return added
+
+def create_missing_indexes(bind, metadata) -> list[str]:
+    """Crée les index déclarés mais absents des tables existantes (create_all ne les ajoute
+    pas). Un index unique impossible tant que la table contient des doublons est signalé."""
+    created = []
+    for table in metadata.sorted_tables:
+        with bind.connect() as connection:
+            existing = index_names(connection, table.name)
+        for index in table.indexes:
+            if index.name in existing:
+                continue
+            try:
+                index.create(bind=bind)
+                created.append(index.name)
+            except IntegrityError:
+                logger.warning(
+                    "Index %s non créé : doublons présents, lancer python dedupe_indicators.py", index.name
+                )
+    return created
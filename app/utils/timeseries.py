@@ -0,0 +1,229 @@
+"""
+Store colonnaire en mémoire (optionnel) pour les statistiques.
+Chaque série (zone_id, type) est gardée en tableaux NumPy contigus triés par date,
+chargée à la demande depuis `indicators` puis complétée par les écritures de l'API.
+Une série est valide tant que sa version de données (app.utils.versions) n'a pas bougé.
+"""
+
+import threading
+from datetime import datetime
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.models.indicator import Indicator
+from app.models.rollup import IndicatorRollupMonthly
+from app.utils.cache import LRUCache
+from app.utils import versions
+
+try:
+    import numpy as np
+except ImportError:  # dépendance optionnelle
+    np = None
+
+# Écritures en attente de commit, stockées dans session.info
+_PENDING_KEY = "timeseries_pending"
+
+class Series:
+    """Tableaux d'une série, valides pour une version de données donnée"""
+    __slots__ = ("timestamps", "values", "version")
+
+    def __init__(self, timestamps, values, version: int):
+        self.timestamps = timestamps  # None si la série dépasse la limite de points
+        self.values = values
+        self.version = version
+
+    @property
+    def oversized(self) -> bool:
+        return self.timestamps is None
+
+def _field(row, name):
+    return row[name] if isinstance(row, dict) else getattr(row, name)
+
+def _to_datetime64(dt: datetime):
+    # Les dates sont stockées naïves (UTC) en base
+    return np.datetime64(dt.replace(tzinfo=None), "us")
+
+class SeriesStore:
+    """Séries en mémoire, bornées en nombre (LRU) et en points par série"""
+
+    def __init__(self, max_series: int, max_points: int):
+        self.max_points = max_points
+        self._series = LRUCache(maxsize=max_series)
+        self._lock = threading.Lock()
+
+    def _load(self, db: Session, key, version: int) -> Series:
+        zone_id, type_ = key
+        rows = db.execute(
+            select(Indicator.timestamp, Indicator.value)
+            .where(Indicator.zone_id == zone_id, Indicator.type == type_)
+            .order_by(Indicator.timestamp)
+            .limit(self.max_points + 1)
+        ).all()
+        if len(rows) > self.max_points:
+            return Series(None, None, version)
+        timestamps, values = zip(*rows) if rows else ((), ())
+        return Series(
+            np.array(timestamps, dtype="datetime64[us]"),
+            np.array(values, dtype=np.float64),
+            version
+        )
+
+    def get_many(self, db: Session, keys) -> dict | None:
+        """Séries à jour pour ces clés, ou None si l'une doit passer par la base"""
+        if len(keys) > self._series.maxsize:
+            return None
+        scopes = {key: versions.series_scope(*key) for key in keys}
+        current = versions.current_versions(db, scopes.values())
+        result = {}
+        for key, scope in scopes.items():
+            version = current[scope]
+            series = self._series.get(key)
+            if series is None or series.version != version:
+                series = self._load(db, key, version)
+                self._series.set(key, series)
+            if series.oversized:
+                return None
+            result[key] = series
+        return result
+
+    def loaded_versions(self, db: Session, keys) -> dict:
+        """Versions courantes (avant écriture) des séries déjà chargées"""
+        loaded = [key for key in keys if self._series.get(key) is not None]
+        current = versions.current_versions(db, (versions.series_scope(*key) for key in loaded))
+        return {key: current[versions.series_scope(*key)] for key in loaded}
+
+    def append(self, key, previous: int, version: int, timestamps, values):
+        """Ajoute des mesures commitées si la série en mémoire correspond à la version précédente"""
+        with self._lock:
+            series = self._series.get(key)
+            if series is None or series.version != previous:
+                # Écriture concurrente d'un autre processus : rechargement à la prochaine lecture
+                return
+            if series.oversized or len(series.values) + len(values) > self.max_points:
+                self._series.set(key, Series(None, None, version))
+                return
+            new_timestamps = np.array(timestamps, dtype="datetime64[us]")
+            new_values = np.array(values, dtype=np.float64)
+            merged_timestamps = np.concatenate([series.timestamps, new_timestamps])
+            merged_values = np.concatenate([series.values, new_values])
+            if len(series.timestamps) and new_timestamps.min() < series.timestamps[-1]:
+                order = np.argsort(merged_timestamps, kind="stable")
+                merged_timestamps, merged_values = merged_timestamps[order], merged_values[order]
+            # Nouveaux tableaux : les lectures en cours gardent une vue cohérente
+            self._series.set(key, Series(merged_timestamps, merged_values, version))
+
+    def clear(self):
+        self._series.clear()
+
+    def stats(self) -> dict:
+        return self._series.stats()
+
+series_store = (
+    SeriesStore(settings.TIMESERIES_MAX_SERIES, settings.TIMESERIES_MAX_POINTS_PER_SERIES)
+    if settings.TIMESERIES_STORE_ENABLED and np is not None else None
+)
+
+# --- Chemin d'écriture ---
+
+def versions_before_write(db: Session, series) -> dict:
+    """À appeler avant versions.bump_series, dans la transaction d'écriture"""
+    if series_store is None:
+        return {}
+    return series_store.loaded_versions(db, series)
+
+def stage_append(db: Session, rows, previous: dict, version: int | None):
+    """Prépare l'ajout des mesures aux séries chargées ; appliqué après commit"""
+    if series_store is None or not previous or version is None:
+        return
+    pending = db.info.setdefault(_PENDING_KEY, [])
+    grouped = {key: ([], []) for key in previous}
+    for row in rows:
+        points = grouped.get((_field(row, "zone_id"), _field(row, "type")))
+        if points is not None:
+            points[0].append(_field(row, "timestamp"))
+            points[1].append(_field(row, "value"))
+    for key, (timestamps, values) in grouped.items():
+        pending.append((key, previous[key], version, timestamps, values))
+
+@event.listens_for(Session, "after_commit")
+def _apply_pending(session):
+    pending = session.info.pop(_PENDING_KEY, None)
+    if pending and series_store is not None:
+        for key, previous, version, timestamps, values in pending:
+            series_store.append(key, previous, version, timestamps, values)
+
+@event.listens_for(Session, "after_rollback")
+def _discard_pending(session):
+    session.info.pop(_PENDING_KEY, None)
+
+# --- Chemin de lecture ---
+
+def _series_keys(db: Session, type, zone_id) -> list:
+    # Les rollups mensuels listent les couples (zone, type) existants à moindre coût
+    query = select(IndicatorRollupMonthly.zone_id, IndicatorRollupMonthly.type).distinct()
+    if type:
+        query = query.where(IndicatorRollupMonthly.type == type)
+    if zone_id:
+        query = query.where(IndicatorRollupMonthly.zone_id == zone_id)
+    return [tuple(row) for row in db.execute(query)]
+
+def _load_window(db: Session, type, zone_id, date_from, date_to):
+    """Tranches [date_from, date_to] de chaque série, ou None si le store ne peut pas répondre"""
+    if series_store is None:
+        return None
+    loaded = series_store.get_many(db, _series_keys(db, type, zone_id))
+    if loaded is None:
+        return None
+    windows = {}
+    for key, series in loaded.items():
+        start, end = 0, len(series.timestamps)
+        if date_from:
+            start = np.searchsorted(series.timestamps, _to_datetime64(date_from), side="left")
+        if date_to:
+            end = np.searchsorted(series.timestamps, _to_datetime64(date_to), side="right")
+        if end > start:
+            windows[key] = (series.timestamps[start:end], series.values[start:end])
+    return windows
+
+def average_totals(db: Session, type, zone_id, date_from, date_to) -> dict | None:
+    """{(zone_id, type): (somme, nombre)} calculés en mémoire"""
+    windows = _load_window(db, type, zone_id, date_from, date_to)
+    if windows is None:
+        return None
+    return {
+        key: (float(values.sum()), int(len(values)))
+        for key, (timestamps, values) in windows.items()
+    }
+
+def _period_labels(timestamps, period: str):
+    """Clés de période identiques à celles calculées en SQL par /stats/trend"""
+    if period == "hourly":
+        buckets = timestamps.astype("datetime64[h]")
+        return buckets, lambda keys: [
+            label.replace("T", " ") + ":00" for label in np.datetime_as_string(keys)
+        ]
+    if period == "monthly":
+        return timestamps.astype("datetime64[M]"), np.datetime_as_string
+    days = timestamps.astype("datetime64[D]")
+    if period == "weekly":
+        # Lundi de la semaine : le 1970-01-01 (jour 0) est un jeudi
+        days = days - ((days.astype(np.int64) + 3) % 7).astype("timedelta64[D]")
+    return days, np.datetime_as_string
+
+def trend_totals(db: Session, type, zone_id, period, date_from, date_to) -> dict | None:
+    """{période: (somme, nombre)} calculés en mémoire"""
+    windows = _load_window(db, type, zone_id, date_from, date_to)
+    if windows is None:
+        return None
+    if not windows:
+        return {}
+    timestamps = np.concatenate([window[0] for window in windows.values()])
+    values = np.concatenate([window[1] for window in windows.values()])
+    buckets, format_keys = _period_labels(timestamps, period)
+    keys, inverse = np.unique(buckets, return_inverse=True)
+    sums = np.bincount(inverse, weights=values)
+    counts = np.bincount(inverse)
+    return {
+        label: (float(total), int(count))
+        for label, total, count in zip(format_keys(keys), sums, counts)
+    }
@@ -0,0 +1,93 @@
+"""
+Versions de données monotones, stockées en base et incrémentées dans la même
+transaction que les écritures (API comme scripts d'ingestion).
+Elles servent à invalider le cache HTTP par portée.
+"""
+
+from sqlalchemy import select, func, or_
+from sqlalchemy.orm import Session
+from app.models.data_version import DataVersion
+from app.utils.sql import dialect_insert
+
+COUNTER = "counter"  # source des numéros de version
+ALL = "all"          # reconstruction des agrégats : tout est invalidé
+ANY = "any"          # n'importe quelle écriture d'indicateur
+ZONES = "zones"      # liste des zones
+USERS = "users"      # tous les utilisateurs (rôle, statut)
+
+def series_scope(zone_id: int | None = None, type: str | None = None) -> str:
+    """Portée la plus fine couvrant un filtre (zone, type)"""
+    if zone_id and type:
+        return f"series:{zone_id}:{type}"
+    if type:
+        return f"type:{type}"
+    if zone_id:
+        return f"zone:{zone_id}"
+    return ANY
+
+def _next_version(db: Session) -> int:
+    table = DataVersion.__table__
+    stmt = dialect_insert(db, table).values(scope=COUNTER, version=1)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["scope"], set_={"version": table.c.version + 1}
+    )
+    db.execute(stmt)
+    return db.execute(select(table.c.version).where(table.c.scope == COUNTER)).scalar_one()
+
+def _set_versions(db: Session, scopes, version: int):
+    table = DataVersion.__table__
+    stmt = dialect_insert(db, table)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["scope"], set_={"version": stmt.excluded.version}
+    )
+    db.execute(stmt, [{"scope": scope, "version": version} for scope in scopes])
+
+def bump_series(db: Session, series) -> int | None:
+    """Invalide les portées touchées par des écritures sur des couples (zone_id, type)"""
+    scopes = {ANY}
+    for zone_id, type_ in series:
+        scopes.update((f"type:{type_}", f"zone:{zone_id}", f"series:{zone_id}:{type_}"))
+    if len(scopes) == 1:
+        return None
+    version = _next_version(db)
+    _set_versions(db, scopes, version)
+    return version
+
+def bump_zones(db: Session):
+    _set_versions(db, [ZONES], _next_version(db))
+
+def bump_all(db: Session):
+    _set_versions(db, [ALL], _next_version(db))
+
+def user_scope(email: str) -> str:
+    return f"user:{email}"
+
+def bump_user(db: Session, email: str | None = None):
+    """Rôle ou statut modifié : le cache des utilisateurs de chaque processus est périmé
+    (tous les utilisateurs si email absent)"""
+    _set_versions(db, [user_scope(email) if email else USERS], _next_version(db))
+
+def user_changes(db: Session, after: int) -> list[tuple[str, int]]:
+    """(portée, version) des utilisateurs modifiés depuis la version `after`"""
+    return db.query(DataVersion.scope, DataVersion.version).filter(
+        DataVersion.version > after,
+        or_(DataVersion.scope == USERS, DataVersion.scope.like(user_scope("%")))
+    ).all()
+
+def current_version(db: Session, scope: str) -> int:
+    """Version courante d'une portée (une reconstruction globale invalide toutes les portées)"""
+    version = db.query(func.max(DataVersion.version)).filter(
+        DataVersion.scope.in_([scope, ALL])
+    ).scalar()
+    return version or 0
+
+def current_versions(db: Session, scopes) -> dict:
+    """Versions courantes de plusieurs portées, en une requête"""
+    scopes = list(scopes)
+    if not scopes:
+        return {}
+    rows = dict(db.query(DataVersion.scope, DataVersion.version).filter(
+        DataVersion.scope.in_(scopes + [ALL])
+    ).all())
+    reset = rows.get(ALL, 0)
+    return {scope: max(rows.get(scope, 0), reset) for scope in scopes}
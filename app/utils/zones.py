@@ -0,0 +1,17 @@
+from sqlalchemy.orm import Session
+from app.models.zone import Zone
+
+# Cache en mémoire des identifiants de zones existantes
+_zone_ids: set[int] | None = None
+
+def get_zone_ids(db: Session, refresh: bool = False) -> set[int]:
+    """Ensemble des id de zones, chargé une seule fois"""
+    global _zone_ids
+    if _zone_ids is None or refresh:
+        _zone_ids = {zone_id for (zone_id,) in db.query(Zone.id)}
+    return _zone_ids
+
+def invalidate_zone_ids():
+    """A appeler après la création ou la suppression d'une zone"""
+    global _zone_ids
+    _zone_ids = None
@@ -0,0 +1,23 @@
+"""
+Outils partagés par les benchmarks.
+"""
+
+import statistics
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))
+    return values[index]
+
+def summarize(latencies, elapsed, errors=0) -> dict:
+    """Débit et percentiles (ms) d'une série de latences"""
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "p50_ms": round(statistics.median(latencies), 3) if latencies else 0.0,
+        "p95_ms": round(percentile(latencies, 95), 3),
+        "p99_ms": round(percentile(latencies, 99), 3),
+    }
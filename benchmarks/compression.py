@@ -0,0 +1,107 @@
+"""
+Benchmark : coût CPU et octets gagnés par la compression des réponses, sur les charges
+réelles de l'API (liste de 1000 indicateurs, tendance, moyennes, exports en flux).
+
+Les corps sont capturés une fois sans compression, morceau par morceau comme l'application
+les envoie, puis compressés avec chaque encodage et niveau comme le ferait le middleware.
+Le temps total estimé ajoute au temps CPU le transfert sur un lien mobile (--mbps).
+
+    python benchmarks/compression.py --size 10k --repeat 20 --mbps 5
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from endpoints import SIZES, build_database
+
+# Encodage -> niveaux comparés (rapide, défaut de l'API, fort)
+LEVELS = {
+    "gzip": [1, 6, 9],
+    "br": [1, 4, 9],
+    "zstd": [1, 3, 9],
+}
+
+PAYLOADS = {
+    "indicators_1000": ("/indicators/", {"limit": 1000}),
+    "trend_daily": ("/stats/trend", {"type": "temperature", "period": "daily"}),
+    "averages": ("/stats/averages", {}),
+    "export_ndjson": ("/indicators/export", {"format": "ndjson"}),
+    "export_csv": ("/indicators/export", {"format": "csv"}),
+    "export_arrow": ("/indicators/export", {"format": "arrow"}),
+}
+
+async def capture(client, headers, path, params):
+    """Morceaux du corps non compressé, dans l'ordre d'envoi"""
+    async with client.stream("GET", path, params=params, headers={**headers, "Accept-Encoding": "identity"}) as response:
+        response.raise_for_status()
+        return [chunk async for chunk in response.aiter_raw() if chunk]
+
+def compress(make_encoder, encoding, level, chunks) -> int:
+    # Même séquence que le middleware : un vidage par morceau en flux, puis la fin
+    encoder = make_encoder(encoding, level)
+    size = 0
+    for chunk in chunks[:-1]:
+        size += len(encoder.compress(chunk)) + len(encoder.flush())
+    return size + len(encoder.compress(chunks[-1])) + len(encoder.finish())
+
+def measure(make_encoder, encoding, level, chunks, repeat) -> tuple[int, float]:
+    size = compress(make_encoder, encoding, level, chunks)  # chauffe
+    start = time.perf_counter()
+    for _ in range(repeat):
+        compress(make_encoder, encoding, level, chunks)
+    return size, (time.perf_counter() - start) / repeat * 1000
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", default="10k", choices=list(SIZES))
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--mbps", type=float, default=5.0, help="débit du lien simulé (Mbit/s)")
+    args = parser.parse_args()
+
+    # La base doit être choisie avant l'import de l'application
+    os.environ["DATABASE_URL"] = f"sqlite:///{build_database(args.size, args.seed)}"
+
+    import httpx
+    from endpoints import prepare_user
+    from app.main import app
+    from app.utils import export
+    from app.utils.compression import available_encodings, make_encoder
+
+    encodings = [encoding for encoding in LEVELS if encoding in available_encodings()]
+    missing = [encoding for encoding in LEVELS if encoding not in encodings]
+    if missing:
+        print(f"Encodages absents (pip install brotli zstandard) : {', '.join(missing)}")
+    payloads = {
+        name: spec for name, spec in PAYLOADS.items()
+        if name != "export_arrow" or export.pa is not None
+    }
+
+    headers = {"Authorization": f"Bearer {prepare_user()}"}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        bodies = {name: await capture(client, headers, path, params) for name, (path, params) in payloads.items()}
+
+    bytes_per_ms = args.mbps * 1e6 / 8 / 1000
+    print(f"{'charge':<16} {'encodage':<9} {'octets':>10} {'ratio':>7} {'cpu ms':>8} {'Mo/s':>7} {f'total ms @{args.mbps:g}Mbit/s':>20}")
+    for name, chunks in bodies.items():
+        raw = sum(len(chunk) for chunk in chunks)
+        print(f"{name:<16} {'identity':<9} {raw:>10} {1.0:>7.2f} {0.0:>8.2f} {'-':>7} {raw / bytes_per_ms:>20.1f}")
+        for encoding in encodings:
+            for level in LEVELS[encoding]:
+                size, cpu_ms = measure(make_encoder, encoding, level, chunks, args.repeat)
+                throughput = raw / 1e6 / (cpu_ms / 1000) if cpu_ms else 0.0
+                label = f"{encoding}-{level}"
+                print(
+                    f"{'':<16} {label:<9} {size:>10} {raw / size:>7.2f} {cpu_ms:>8.2f} "
+                    f"{throughput:>7.0f} {cpu_ms + size / bytes_per_ms:>20.1f}"
+                )
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,287 @@
+"""
+Benchmark des endpoints de lecture sur des bases générées avec une graine.
+
+Pour chaque taille, construit (une fois, en cache dans benchmarks/data/) une base
+avec ingest_data.py, puis lance l'application en mémoire dans un sous-processus
+pointé sur cette base et la sollicite avec des clients concurrents. Rapporte le
+débit et les p50/p95/p99 par endpoint, écrit les résultats en JSON et les compare
+à une référence enregistrée.
+
+    python benchmarks/endpoints.py --sizes 10k --clients 8 --duration 5
+    python benchmarks/endpoints.py --sizes 10k,1m --save-baseline
+    python benchmarks/endpoints.py --sizes 10k --baseline benchmarks/baseline.json --threshold 0.2
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+DATA_DIR = ROOT / "benchmarks" / "data"
+DEFAULT_OUTPUT = ROOT / "benchmarks" / "results" / "latest.json"
+DEFAULT_BASELINE = ROOT / "benchmarks" / "baseline.json"
+
+sys.path.insert(0, str(ROOT))
+
+from common import summarize
+
+# Jeux de données : zones x types x (jours x 24 mesures horaires)
+SIZES = {
+    "10k": {"zones": 10, "types": ["air_quality", "temperature"], "days": 21},
+    "1m": {"zones": 200, "types": ["air_quality", "temperature"], "days": 105},
+    "10m": {"zones": 2000, "types": ["air_quality", "temperature"], "days": 105},
+}
+INTERVAL_MINUTES = 60
+DATA_END = datetime(2024, 1, 1)
+
+BENCH_USER = {"email": "bench@ecotrack.com", "username": "bench", "password": "bench-password"}
+
+def scenarios(spec, rng):
+    """Endpoint -> fabrique de paramètres de requête, ou du corps JSON pour "POST /chemin"
+    (tirés avec la graine)"""
+    start = DATA_END - timedelta(days=spec["days"])
+
+    def zone():
+        return rng.randint(1, spec["zones"])
+
+    def type_():
+        return rng.choice(spec["types"])
+
+    def window():
+        # Fenêtre de 7 jours non alignée : calcul sur les données brutes
+        offset = rng.uniform(0, max(spec["days"] - 7, 0))
+        date_from = start + timedelta(days=offset, minutes=17)
+        return date_from.isoformat(), (date_from + timedelta(days=7)).isoformat()
+
+    def dashboard():
+        # Tableau de bord de 20 séries (tendance journalière par zone et type) en une requête
+        date_from, date_to = window()
+        return {"series": [
+            {"type": type_(), "zone_ids": [zone()], "period": "daily", "date_from": date_from, "date_to": date_to}
+            for _ in range(20)
+        ]}
+
+    return {
+        "indicators": ("/indicators/", lambda: {"type": type_(), "zone_id": zone(), "limit": 100}),
+        "averages": ("/stats/averages", lambda: {"type": type_()}),
+        "averages_window": ("/stats/averages", lambda: dict(
+            zip(("date_from", "date_to"), window()), type=type_()
+        )),
+        "trend": ("/stats/trend", lambda: {"type": type_(), "zone_id": zone(), "period": "daily"}),
+        "query_20_series": ("POST /stats/query", dashboard),
+    }
+
+# --- Sous-processus : application en mémoire sur une base donnée ---
+
+def prepare_user():
+    from app.database import SessionLocal
+    from app.models.user import User
+    from app.utils.auth import create_access_token
+    from app.utils.security import get_password_hash
+
+    db = SessionLocal()
+    if db.query(User).filter(User.email == BENCH_USER["email"]).first() is None:
+        db.add(User(
+            email=BENCH_USER["email"],
+            username=BENCH_USER["username"],
+            hashed_password=get_password_hash(BENCH_USER["password"]),
+            role="admin"
+        ))
+        db.commit()
+    db.close()
+    return create_access_token({"sub": BENCH_USER["email"]})
+
+async def drive(client, path, make_params, headers, clients, deadline):
+    latencies, errors = [], 0
+
+    method, _, url = path.rpartition(" ")
+    
+    async def worker():
+        nonlocal errors
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            if method == "POST":
+                response = await client.post(url, json=make_params(), headers=headers)
+            else:
+                response = await client.get(url, params=make_params(), headers=headers)
+            if response.status_code == 200:
+                latencies.append((time.perf_counter() - start) * 1000)
+            else:
+                errors += 1
+
+    await asyncio.gather(*(worker() for _ in range(clients)))
+    return latencies, errors
+
+async def run_worker(args):
+    import httpx
+    from app.main import app
+    from app.utils import http_cache
+    from app.utils.cache import LRUCache
+
+    if not args.http_cache:
+        # Mesure du calcul, pas du cache de réponses
+        http_cache.response_cache = LRUCache(maxsize=0)
+
+    headers = {"Authorization": f"Bearer {prepare_user()}"}
+    spec = SIZES[args.size]
+    results = {}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        for name, (path, make_params) in scenarios(spec, random.Random(args.seed)).items():
+            if args.warmup:
+                await drive(client, path, make_params, headers, args.clients,
+                            time.perf_counter() + args.warmup)
+            start = time.perf_counter()
+            latencies, errors = await drive(
+                client, path, make_params, headers, args.clients, start + args.duration
+            )
+            results[name] = summarize(latencies, time.perf_counter() - start, errors)
+    print(json.dumps(results))
+
+# --- Processus principal ---
+
+def database_path(size, seed) -> Path:
+    return DATA_DIR / f"ecotrack-{size}-seed{seed}.db"
+
+def build_database(size, seed):
+    """Génère la base d'une taille si elle n'est pas déjà en cache"""
+    path = database_path(size, seed)
+    if path.exists():
+        return path
+    spec = SIZES[size]
+    DATA_DIR.mkdir(parents=True, exist_ok=True)
+    partial = path.with_suffix(".partial")
+    partial.unlink(missing_ok=True)
+    print(f"[{size}] génération de la base {path.name}...", flush=True)
+    subprocess.run(
+        [
+            sys.executable, "ingest_data.py",
+            "--zones", str(spec["zones"]),
+            "--types", ",".join(spec["types"]),
+            "--days", str(spec["days"]),
+            "--interval", str(INTERVAL_MINUTES),
+            "--end", DATA_END.isoformat(),
+            "--seed", str(seed),
+            "--drop-indexes", "--defer-rollups",
+        ],
+        cwd=ROOT, check=True, stdout=subprocess.DEVNULL,
+        env={**os.environ, "DATABASE_URL": f"sqlite:///{partial}"}
+    )
+    partial.rename(path)
+    return path
+
+def run_size(size, path, args) -> dict:
+    command = [
+        sys.executable, __file__, "--worker", "--size", size, "--seed", str(args.seed),
+        "--clients", str(args.clients), "--duration", str(args.duration), "--warmup", str(args.warmup),
+    ]
+    if args.http_cache:
+        command.append("--http-cache")
+    output = subprocess.run(
+        command, cwd=ROOT, check=True, capture_output=True, text=True,
+        env={**os.environ, "DATABASE_URL": f"sqlite:///{path}"}
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def git_revision() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def report(results):
+    print(f"{'taille':<6} {'endpoint':<16} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'err':>5}")
+    for size, endpoints in results.items():
+        for name, r in endpoints.items():
+            print(f"{size:<6} {name:<16} {r['throughput']:>9.1f} {r['p50_ms']:>9.2f} "
+                  f"{r['p95_ms']:>9.2f} {r['p99_ms']:>9.2f} {r['errors']:>5}")
+
+def compare(results, baseline, threshold) -> list[str]:
+    """Affiche les écarts avec la référence ; renvoie les régressions de p95"""
+    regressions = []
+    print(f"\nComparaison avec la référence ({baseline['meta'].get('revision')}, seuil {threshold:.0%})")
+    for size, endpoints in results.items():
+        for name, r in endpoints.items():
+            ref = baseline["results"].get(size, {}).get(name)
+            if not ref or not ref["p95_ms"]:
+                continue
+            delta = r["p95_ms"] / ref["p95_ms"] - 1
+            throughput = r["throughput"] / ref["throughput"] - 1 if ref["throughput"] else 0.0
+            flag = ""
+            if delta > threshold:
+                flag = "  << REGRESSION"
+                regressions.append(f"{size}/{name}")
+            print(f"  {size:<6} {name:<16} p95 {delta:+7.1%}   débit {throughput:+7.1%}{flag}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="10k", help=f"parmi {', '.join(SIZES)}")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=5.0, help="secondes par endpoint")
+    parser.add_argument("--warmup", type=float, default=1.0, help="secondes de chauffe par endpoint")
+    parser.add_argument("--http-cache", action="store_true", help="garder le cache de réponses (ETag)")
+    parser.add_argument("--output", type=Path, default=DEFAULT_OUTPUT)
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE)
+    parser.add_argument("--threshold", type=float, default=0.2, help="régression tolérée sur le p95")
+    parser.add_argument("--save-baseline", action="store_true", help="enregistrer ces résultats comme référence")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--size", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        asyncio.run(run_worker(args))
+        return
+
+    sizes = [size.strip() for size in args.sizes.split(",") if size.strip()]
+    unknown = [size for size in sizes if size not in SIZES]
+    if unknown:
+        parser.error(f"tailles inconnues : {', '.join(unknown)}")
+
+    results = {}
+    for size in sizes:
+        path = build_database(size, args.seed)
+        print(f"[{size}] {args.clients} clients, {args.duration:g}s par endpoint...", flush=True)
+        results[size] = run_size(size, path, args)
+
+    document = {
+        "meta": {
+            "revision": git_revision(),
+            "date": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "cpus": os.cpu_count(),
+            "seed": args.seed,
+            "clients": args.clients,
+            "duration": args.duration,
+            "http_cache": args.http_cache,
+        },
+        "results": results,
+    }
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    args.output.write_text(json.dumps(document, indent=2))
+    report(results)
+    print(f"\nRésultats : {args.output}")
+
+    if args.save_baseline:
+        args.baseline.write_text(json.dumps(document, indent=2))
+        print(f"Référence enregistrée : {args.baseline}")
+    elif args.baseline.exists():
+        regressions = compare(results, json.loads(args.baseline.read_text()), args.threshold)
+        if regressions:
+            print(f"\nRégressions : {', '.join(regressions)}")
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
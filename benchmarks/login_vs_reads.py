@@ -0,0 +1,96 @@
+"""
+Benchmark : débit de /auth/login face à la latence des lectures concurrentes.
+
+Lance des lecteurs sur /indicators/ seuls, puis les mêmes lecteurs pendant une
+rafale de connexions, et compare les latences de lecture.
+
+    python benchmarks/login_vs_reads.py --readers 20 --logins 40 --duration 10
+    python benchmarks/login_vs_reads.py --inline   # bcrypt dans le threadpool (ancien comportement)
+"""
+
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import httpx
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from starlette.concurrency import run_in_threadpool
+from app.main import app
+from app.utils import security
+from common import percentile
+
+CREDENTIALS = {"username": "admin@ecotrack.com", "password": "admin123"}
+
+async def reader(client, headers, deadline, latencies):
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        response = await client.get("/indicators/", params={"limit": 50}, headers=headers)
+        response.raise_for_status()
+        latencies.append((time.perf_counter() - start) * 1000)
+
+async def login_loop(client, deadline, outcomes):
+    while time.perf_counter() < deadline:
+        response = await client.post("/auth/login", data=CREDENTIALS)
+        outcomes.append(response.status_code)
+
+async def run_phase(client, headers, readers, logins, duration):
+    start = time.perf_counter()
+    deadline = start + duration
+    latencies, outcomes = [], []
+    elapsed = {}
+
+    async def timed(name, tasks):
+        await asyncio.gather(*tasks)
+        # Durée réelle : les requêtes en vol à l'échéance sont comptées jusqu'au bout
+        elapsed[name] = time.perf_counter() - start
+
+    await asyncio.gather(
+        timed("reads", [reader(client, headers, deadline, latencies) for _ in range(readers)]),
+        timed("logins", [login_loop(client, deadline, outcomes) for _ in range(logins)]),
+    )
+    return latencies, outcomes, elapsed
+
+def report(name, latencies, outcomes, elapsed):
+    ok = sum(1 for status in outcomes if status == 200)
+    busy = sum(1 for status in outcomes if status == 503)
+    print(name)
+    print(f"  lectures : {len(latencies) / elapsed['reads']:8.1f} req/s   "
+          f"p50 {statistics.median(latencies) if latencies else 0:7.1f} ms   "
+          f"p95 {percentile(latencies, 95):7.1f} ms   p99 {percentile(latencies, 99):7.1f} ms")
+    if outcomes:
+        print(f"  logins   : {ok / elapsed['logins']:8.1f} ok/s     503 : {busy}")
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--readers", type=int, default=20)
+    parser.add_argument("--logins", type=int, default=40)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--inline", action="store_true", help="bcrypt dans le threadpool des requêtes")
+    args = parser.parse_args()
+
+    if args.inline:
+        async def inline(func, *func_args):
+            return await run_in_threadpool(func, *func_args)
+        security._run_in_pool = inline
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        token = (await client.post("/auth/login", data=CREDENTIALS)).json()["access_token"]
+        headers = {"Authorization": f"Bearer {token}"}
+
+        latencies, _, elapsed = await run_phase(client, headers, args.readers, 0, args.duration)
+        report("Lectures seules", latencies, [], elapsed)
+
+        latencies, outcomes, elapsed = await run_phase(client, headers, args.readers, args.logins, args.duration)
+        mode = "bcrypt inline (threadpool)" if args.inline else "bcrypt dans le pool de processus"
+        report(f"Lectures + rafale de logins ({mode})", latencies, outcomes, elapsed)
+
+    security.shutdown_hash_pool()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,83 @@
+"""
+Benchmark : lignes/seconde de /indicators/ et /indicators/export selon le chemin
+de sérialisation (instances ORM + Pydantic, ou lignes Core + encodeur JSON rapide).
+
+    python benchmarks/serialization.py --size 10k --limit 1000 --requests 50
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from endpoints import SIZES, build_database
+
+MODES = {
+    "orm": [],
+    "fast": ["/indicators/", "/indicators/export"],
+}
+
+async def run_list(client, headers, limit, requests):
+    rows = 0
+    cursor = None
+    start = time.perf_counter()
+    for _ in range(requests):
+        params = {"limit": limit}
+        if cursor:
+            params["cursor"] = cursor
+        response = await client.get("/indicators/", params=params, headers=headers)
+        response.raise_for_status()
+        rows += len(response.json())
+        # On parcourt les pages puis on recommence au début
+        cursor = response.headers.get("X-Next-Cursor")
+    return rows / (time.perf_counter() - start)
+
+async def run_export(client, headers):
+    start = time.perf_counter()
+    response = await client.get("/indicators/export", params={"format": "ndjson"}, headers=headers)
+    response.raise_for_status()
+    rows = response.content.count(b"\n")
+    return rows / (time.perf_counter() - start)
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", default="10k", choices=list(SIZES))
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--limit", type=int, default=1000)
+    parser.add_argument("--requests", type=int, default=50)
+    args = parser.parse_args()
+
+    # La base doit être choisie avant l'import de l'application
+    os.environ["DATABASE_URL"] = f"sqlite:///{build_database(args.size, args.seed)}"
+
+    import httpx
+    from endpoints import prepare_user
+    from app.main import app
+    from app.config import settings
+    from app.utils import serialization
+
+    print(f"Encodeur JSON rapide : {'orjson' if serialization.orjson else 'json (orjson absent)'}")
+    headers = {"Authorization": f"Bearer {prepare_user()}"}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        results = {}
+        for mode, routes in MODES.items():
+            settings.FAST_SERIALIZATION_ROUTES = routes
+            await run_list(client, headers, args.limit, 2)  # chauffe
+            results[mode] = (
+                await run_list(client, headers, args.limit, args.requests),
+                await run_export(client, headers),
+            )
+
+    print(f"{'chemin':<8} {f'liste (limit={args.limit})':>22} {'export ndjson':>16}")
+    for mode, (list_rate, export_rate) in results.items():
+        print(f"{mode:<8} {list_rate:>16.0f} l/s {export_rate:>12.0f} l/s")
+    orm, fast = results["orm"], results["fast"]
+    print(f"gain     {fast[0] / orm[0]:>18.2f}x {fast[1] / orm[1]:>14.2f}x")
+
+if __name__ == "__main__":
+    asyncio.run(main())
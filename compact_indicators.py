@@ -0,0 +1,50 @@
+"""
+Applique les politiques de retention (RETENTION_POLICIES) : les mesures brutes, puis
+les agregats horaires, plus anciens que l'horizon de leur type sont supprimes par
+lots ; les statistiques de ces periodes sont ensuite lues dans les agregats.
+L'API le fait aussi en tache de fond toutes les RETENTION_INTERVAL_SECONDS.
+
+    RETENTION_POLICIES='{"*": {"raw_days": 30, "hourly_days": 365}}' python compact_indicators.py
+    python compact_indicators.py --enable-incremental-vacuum
+"""
+
+import argparse
+from app.database import Base, SessionLocal, engine
+from app import models  # enregistre toutes les tables (rollups, horizons)
+from app.config import settings
+from app.utils.retention import compact, enable_incremental_vacuum
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--batch-size", type=int, default=settings.RETENTION_BATCH_SIZE,
+                        help="lignes supprimees par transaction")
+    parser.add_argument("--enable-incremental-vacuum", action="store_true",
+                        help="passer une base existante en auto_vacuum=INCREMENTAL (VACUUM complet, une fois)")
+    args = parser.parse_args(argv)
+
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+
+    try:
+        if args.enable_incremental_vacuum:
+            print("Passage en auto_vacuum=INCREMENTAL (VACUUM)...")
+            enable_incremental_vacuum(db)
+        if not settings.RETENTION_POLICIES:
+            print("Aucune politique de retention (RETENTION_POLICIES) : rien a compacter")
+            return
+        print("Compaction des mesures anciennes...")
+        report = compact(db, batch_size=args.batch_size)
+        for type_, counts in report["types"].items():
+            print(f"  - {type_}: {counts['raw']} mesures, {counts['hourly']} agregats horaires supprimes")
+        print(f"  - {report['vacuum_pages']} pages rendues au systeme")
+        print("Compaction terminee avec succes!")
+    except Exception as e:
+        print(f"Erreur lors de la compaction: {e}")
+        db.rollback()
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Suppression des mesures en double dans la base EcoTrack.
+
+Une mesure est identifiee par (source, type, zone_id, timestamp). Pour chaque cle
+presente plusieurs fois, seule la plus recente (id le plus grand, comme un upsert)
+est gardee. L'index unique de la cle naturelle est ensuite cree, puis les agregats
+reconstruits. L'API detecte l'index sans redemarrage.
+
+    python dedupe_indicators.py --dry-run
+    python dedupe_indicators.py
+"""
+
+import argparse
+import time
+from sqlalchemy import and_, delete, func, select
+from app.database import Base, SessionLocal, engine
+from app import models  # enregistre toutes les tables (rollups, versions)
+from app.models.indicator import Indicator, NATURAL_KEY, NATURAL_KEY_INDEX
+from app.utils.rollups import rebuild_rollups
+from app.utils.sql import index_names
+
+def duplicate_ids():
+    """Ids des mesures masquees par une mesure plus recente de meme cle naturelle"""
+    columns = [getattr(Indicator, name) for name in NATURAL_KEY]
+    latest = (
+        select(*columns, func.max(Indicator.id).label("keep_id"))
+        .group_by(*columns)
+        .having(func.count() > 1)
+        .subquery()
+    )
+    return select(Indicator.id).join(latest, and_(
+        *(column == latest.c[name] for column, name in zip(columns, NATURAL_KEY)),
+        Indicator.id < latest.c.keep_id
+    ))
+
+def count_duplicates(db) -> int:
+    return db.execute(select(func.count()).select_from(duplicate_ids().subquery())).scalar()
+
+def deduplicate(db) -> int:
+    """Supprime les doublons, cree l'index unique et reconstruit les agregats ; renvoie le nombre supprime"""
+    deleted = db.execute(delete(Indicator).where(Indicator.id.in_(duplicate_ids()))).rowcount
+    index = next(index for index in Indicator.__table__.indexes if index.name == NATURAL_KEY_INDEX)
+    if index.name not in index_names(db.connection(), "indicators"):
+        index.create(db.connection())
+    if deleted:
+        rebuild_rollups(db)
+    db.commit()
+    return deleted
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dry-run", action="store_true", help="compter les doublons sans rien supprimer")
+    args = parser.parse_args(argv)
+    Base.metadata.create_all(bind=engine)
+    
+    db = SessionLocal()
+    try:
+        if args.dry_run:
+            print(f"{count_duplicates(db)} mesures en double")
+            return
+        start = time.perf_counter()
+        deleted = deduplicate(db)
+        print(f"OK: {deleted} mesures en double supprimees en {time.perf_counter() - start:.1f}s")
+        print(f"Index {NATURAL_KEY_INDEX} en place")
+    except Exception as e:
+        print(f"Erreur lors du dedoublonnage: {e}")
+        db.rollback()
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    main()
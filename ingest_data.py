@@ -3,130 +3,254 @@ Script d'ingestion de donnees pour EcoTrack
 Simule l'import de donnees depuis 2 sources:
 1. OpenAQ (qualite de l'air)
 2. Fichier CSV ADEME (emissions CO2)
+
+Sans argument, genere le jeu de demonstration (5 villes). Les options en font un
+generateur de charge : nombre de zones, types, periode, pas d'echantillonnage,
+graine pour des donnees reproductibles, insertion en masse (executemany) par
+grosses transactions, index supprimes puis reconstruits autour du chargement.
+Re-executable : une mesure deja presente (meme source, type, zone et date) est
+mise a jour si elle a change, ignoree sinon.
+
+    python ingest_data.py
+    python ingest_data.py --zones 2000 --types air_quality,temperature \\
+        --days 365 --interval 60 --seed 42 --drop-indexes --defer-rollups
 """
 
-from app.database import SessionLocal
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import insert, select
+from app.database import Base, SessionLocal, engine
+from app import models  # enregistre toutes les tables (rollups, versions)
 from app.models.zone import Zone
 from app.models.indicator import Indicator
-from datetime import datetime, timedelta
-import random
+from app.utils.bulk import upsert_rows
+from app.utils.rollups import rebuild_rollups
+from app.utils.sql import add_missing_columns, create_missing_indexes, index_names
+from app.utils.versions import bump_zones
+from app.utils.zones import invalidate_zone_ids
+
+DEFAULT_ZONES = [
+    {"name": "Paris Centre", "postal_code": "75001", "latitude": 48.8566, "longitude": 2.3522},
+    {"name": "Lyon", "postal_code": "69001", "latitude": 45.7640, "longitude": 4.8357},
+    {"name": "Marseille", "postal_code": "13001", "latitude": 43.2965, "longitude": 5.3698},
+    {"name": "Toulouse", "postal_code": "31000", "latitude": 43.6047, "longitude": 1.4442},
+    {"name": "Nice", "postal_code": "06000", "latitude": 43.7102, "longitude": 7.2620},
+]
 
-def create_zones(db):
-    """Creer des zones si elles n'existent pas"""
-    zones_data = [
-        {"name": "Paris Centre", "postal_code": "75001"},
-        {"name": "Lyon", "postal_code": "69001"},
-        {"name": "Marseille", "postal_code": "13001"},
-        {"name": "Toulouse", "postal_code": "31000"},
-        {"name": "Nice", "postal_code": "06000"},
+# Emprise de la France metropolitaine (lat_min, lon_min, lat_max, lon_max)
+FRANCE_BBOX = (41.3, -5.1, 51.1, 9.6)
+
+# Type -> source, unite, fourchette de valeurs, periode et pas par defaut (minutes), meta_info
+TYPE_PROFILES = {
+    "air_quality": {"source": "OpenAQ", "unit": "ug/m3", "low": 15.0, "high": 75.0,
+                    "days": 30, "interval": 1440,
+                    "meta": {"pollutant": "PM2.5", "description": "PM2.5 measurement for {zone}"}},
+    "co2": {"source": "ADEME", "unit": "kg", "low": 800.0, "high": 2500.0,
+            "days": 180, "interval": 30 * 1440, "meta": {"description": "Monthly CO2 emissions for {zone}"}},
+    "energy": {"source": "Open-Meteo", "unit": "kWh", "low": 2000.0, "high": 5000.0,
+               "days": 180, "interval": 30 * 1440, "meta": {"description": "Monthly energy consumption for {zone}"}},
+    "temperature": {"source": "Synthetic", "unit": "°C", "low": -5.0, "high": 35.0,
+                    "days": 30, "interval": 60, "meta": {"description": "Temperature for {zone}"}},
+    "humidity": {"source": "Synthetic", "unit": "%", "low": 20.0, "high": 100.0,
+                 "days": 30, "interval": 60, "meta": {"description": "Relative humidity for {zone}"}},
+}
+DEFAULT_TYPES = ["air_quality", "co2", "energy"]
+
+# Fin de periode par defaut avec --seed : donnees identiques d'une execution a l'autre
+SEEDED_END = datetime(2024, 1, 1)
+
+BATCH_SIZE = 10000        # lignes par executemany
+COMMIT_EVERY = 500000     # lignes par transaction
+
+def synthetic_coordinates(i: int) -> tuple[float, float]:
+    """Position reproductible et bien repartie (suite de Kronecker) dans FRANCE_BBOX"""
+    lat_min, lon_min, lat_max, lon_max = FRANCE_BBOX
+    return (
+        round(lat_min + (lat_max - lat_min) * ((i * 0.7548776662) % 1), 4),
+        round(lon_min + (lon_max - lon_min) * ((i * 0.5698402910) % 1), 4),
+    )
+
+def zone_specs(count: int) -> list[dict]:
+    """Les villes de demonstration, completees par des zones synthetiques"""
+    specs = DEFAULT_ZONES[:count]
+    specs += [
+        dict(zip(("name", "postal_code", "latitude", "longitude"),
+                 (f"Zone {i:05d}", f"Z{i:05d}", *synthetic_coordinates(i))))
+        for i in range(len(specs) + 1, count + 1)
     ]
-    
-    zones = []
-    for zone_data in zones_data:
-        existing = db.query(Zone).filter(Zone.postal_code == zone_data["postal_code"]).first()
-        if not existing:
-            zone = Zone(**zone_data)
-            db.add(zone)
-            zones.append(zone)
-        else:
-            zones.append(existing)
-    
+    return specs
+
+def create_zones(db, specs=DEFAULT_ZONES):
+    """Creer des zones si elles n'existent pas (une requete, insertion en masse)"""
+    existing = {
+        postal_code: (zone_id, name)
+        for zone_id, name, postal_code in db.execute(select(Zone.id, Zone.name, Zone.postal_code))
+    }
+    missing = [spec for spec in specs if spec["postal_code"] not in existing]
+    if missing:
+        db.execute(insert(Zone.__table__), missing)
+        bump_zones(db)
+        db.commit()
+        invalidate_zone_ids()
+        existing = {
+            postal_code: (zone_id, name)
+            for zone_id, name, postal_code in db.execute(select(Zone.id, Zone.name, Zone.postal_code))
+        }
+    return [
+        {"id": existing[spec["postal_code"]][0], "name": existing[spec["postal_code"]][1]}
+        for spec in specs
+    ]
+
+def generate_rows(zones, types, end, rng, days=None, interval=None):
+    """Flux de lignes (dicts) par type, zone puis date ; reproductible pour un rng donne"""
+    for type_ in types:
+        profile = TYPE_PROFILES[type_]
+        span = timedelta(days=days or profile["days"])
+        step = timedelta(minutes=interval or profile["interval"])
+        points = int(span / step)
+        start = end - span
+        for zone in zones:
+            meta_info = {key: value.format(zone=zone["name"]) for key, value in profile["meta"].items()}
+            for k in range(points):
+                yield {
+                    "source": profile["source"],
+                    "type": type_,
+                    "value": round(rng.uniform(profile["low"], profile["high"]), 2),
+                    "unit": profile["unit"],
+                    "zone_id": zone["id"],
+                    "timestamp": start + k * step,
+                    "meta_info": meta_info
+                }
+
+def drop_indexes(db):
+    """Supprime les index secondaires de indicators (la cle primaire et la cle naturelle restent)"""
+    existing = index_names(db.connection(), "indicators")
+    for index in Indicator.__table__.indexes:
+        if not index.unique and index.name in existing:
+            index.drop(db.connection())
     db.commit()
-    return zones
 
-def ingest_air_quality_data(db, zones):
-    """Simuler l'ingestion de donnees OpenAQ (qualite de l'air)"""
-    print("Ingestion des donnees OpenAQ (qualite de l'air)...")
-    
-    base_date = datetime.utcnow() - timedelta(days=30)
-    
-    for zone in zones:
-        for day in range(30):
-            timestamp = base_date + timedelta(days=day)
-            pm25_value = random.uniform(15.0, 75.0)
-            
-            indicator = Indicator(
-                source="OpenAQ",
-                type="air_quality",
-                value=round(pm25_value, 2),
-                unit="ug/m3",
-                zone_id=zone.id,
-                timestamp=timestamp,
-                meta_info=f"PM2.5 measurement for {zone.name}"
-            )
-            db.add(indicator)
-    
+def create_indexes(db):
+    existing = index_names(db.connection(), "indicators")
+    for index in Indicator.__table__.indexes:
+        if index.name not in existing:
+            index.create(db.connection())
     db.commit()
-    print(f"OK: {30 * len(zones)} mesures de qualite d'air ajoutees")
 
-def ingest_co2_data(db, zones):
-    """Simuler l'ingestion de donnees CSV ADEME (emissions CO2)"""
-    print("Ingestion des donnees ADEME (emissions CO2)...")
+def load_rows(db, rows, batch_size=BATCH_SIZE, commit_every=COMMIT_EVERY, update_rollups=True):
+    """Upsert d'un flux de lignes par executemany, en grosses transactions"""
+    counts = {"inserted": 0, "updated": 0, "skipped": 0}
+    total = 0
+    uncommitted = 0
+    batch = []
+    start = time.perf_counter()
     
-    base_date = datetime.utcnow() - timedelta(days=180)
-    
-    for zone in zones:
-        for month in range(6):
-            timestamp = base_date + timedelta(days=month * 30)
-            co2_value = random.uniform(800.0, 2500.0)
-            
-            indicator = Indicator(
-                source="ADEME",
-                type="co2",
-                value=round(co2_value, 2),
-                unit="kg",
-                zone_id=zone.id,
-                timestamp=timestamp,
-                meta_info=f"Monthly CO2 emissions for {zone.name}"
-            )
-            db.add(indicator)
+    def flush():
+        nonlocal uncommitted
+        for name, count in upsert_rows(db, batch, update_rollups=update_rollups).items():
+            counts[name] += count
+        uncommitted += len(batch)
+        batch.clear()
     
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            total += len(batch)
+            flush()
+            if uncommitted >= commit_every:
+                db.commit()
+                uncommitted = 0
+                elapsed = time.perf_counter() - start
+                print(f"  ... {total} lignes ({total / elapsed:.0f} lignes/s)")
+    if batch:
+        total += len(batch)
+        flush()
     db.commit()
-    print(f"OK: {6 * len(zones)} mesures d'emissions CO2 ajoutees")
+    return counts
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--zones", type=int, default=len(DEFAULT_ZONES), help="nombre de zones")
+    parser.add_argument("--types", default=",".join(DEFAULT_TYPES),
+                        help=f"types separes par des virgules parmi {', '.join(TYPE_PROFILES)}")
+    parser.add_argument("--days", type=float, help="periode couverte (defaut : selon le type)")
+    parser.add_argument("--interval", type=float, help="pas d'echantillonnage en minutes (defaut : selon le type)")
+    parser.add_argument("--end", type=datetime.fromisoformat,
+                        help="fin de la periode (defaut : minuit UTC du jour, ou 2024-01-01 avec --seed)")
+    parser.add_argument("--seed", type=int, help="graine pour des donnees reproductibles")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--commit-every", type=int, default=COMMIT_EVERY)
+    parser.add_argument("--drop-indexes", action="store_true",
+                        help="supprimer les index de indicators pendant le chargement")
+    parser.add_argument("--defer-rollups", action="store_true",
+                        help="reconstruire les agregats une fois a la fin plutot qu'a chaque lot")
+    args = parser.parse_args(argv)
+    args.types = [type_.strip() for type_ in args.types.split(",") if type_.strip()]
+    unknown = [type_ for type_ in args.types if type_ not in TYPE_PROFILES]
+    if unknown:
+        parser.error(f"types inconnus : {', '.join(unknown)}")
+    if args.end is None:
+        # Sans graine : minuit UTC du jour, les executions du meme jour retrouvent les memes cles
+        args.end = SEEDED_END if args.seed is not None else datetime.utcnow().replace(
+            hour=0, minute=0, second=0, microsecond=0
+        )
+    return args
 
-def ingest_energy_data(db, zones):
-    """Simuler l'ingestion de donnees de consommation energetique"""
-    print("Ingestion des donnees de consommation energetique...")
+def run(db, args) -> dict:
+    """Genere et charge les donnees decrites par les arguments ; nombres de lignes inserees,
+    mises a jour et ignorees"""
+    print("Creation/Verification des zones...")
+    zones = create_zones(db, zone_specs(args.zones))
+    print(f"OK: {len(zones)} zones disponibles")
     
-    base_date = datetime.utcnow() - timedelta(days=180)
+    rng = random.Random(args.seed)
+    rows = generate_rows(zones, args.types, args.end, rng, args.days, args.interval)
     
-    for zone in zones:
-        for month in range(6):
-            timestamp = base_date + timedelta(days=month * 30)
-            energy_value = random.uniform(2000.0, 5000.0)
-            
-            indicator = Indicator(
-                source="Open-Meteo",
-                type="energy",
-                value=round(energy_value, 2),
-                unit="kWh",
-                zone_id=zone.id,
-                timestamp=timestamp,
-                meta_info=f"Monthly energy consumption for {zone.name}"
-            )
-            db.add(indicator)
+    if args.drop_indexes:
+        print("Suppression des index de indicators...")
+        drop_indexes(db)
+    try:
+        print(f"Chargement des mesures ({', '.join(args.types)})...")
+        start = time.perf_counter()
+        counts = load_rows(
+            db, rows, args.batch_size, args.commit_every, update_rollups=not args.defer_rollups
+        )
+        elapsed = time.perf_counter() - start
+        total = sum(counts.values())
+        print(
+            f"OK: {counts['inserted']} mesures ajoutees, {counts['updated']} mises a jour, "
+            f"{counts['skipped']} deja presentes en {elapsed:.1f}s ({total / max(elapsed, 1e-9):.0f} lignes/s)"
+        )
+    finally:
+        if args.drop_indexes:
+            print("Reconstruction des index...")
+            create_indexes(db)
     
-    db.commit()
-    print(f"OK: {6 * len(zones)} mesures de consommation energetique ajoutees")
+    if args.defer_rollups:
+        print("Reconstruction des agregats...")
+        rebuild_rollups(db)
+    return counts
 
-def main():
+def main(argv=None):
     """Fonction principale d'ingestion"""
+    args = parse_args(argv)
     print("Demarrage de l'ingestion de donnees EcoTrack...")
+    Base.metadata.create_all(bind=engine)
+    add_missing_columns(engine, Base.metadata)
+    # Clé naturelle comprise : sans elle, une nouvelle exécution dupliquerait les mesures
+    create_missing_indexes(engine, Base.metadata)
     
     db = SessionLocal()
     
     try:
-        print("Creation/Verification des zones...")
-        zones = create_zones(db)
-        print(f"OK: {len(zones)} zones disponibles")
-        
-        ingest_air_quality_data(db, zones)
-        ingest_co2_data(db, zones)
-        ingest_energy_data(db, zones)
-        
+        run(db, args)
         print("Ingestion terminee avec succes!")
         print(f"Total d'indicateurs: {db.query(Indicator).count()}")
-        
+    
     except Exception as e:
         print(f"Erreur lors de l'ingestion: {e}")
         db.rollback()
@@ -134,4 +258,4 @@ def main():
         db.close()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -2,71 +2,186 @@
 Script d'ingestion de donnees REELLES depuis Open-Meteo API
 Documentation: https://open-meteo.com/en/docs
 Source: Donnees meteorologiques en temps reel
+
+Les villes sont les zones de la base, localisees par leurs coordonnees (sinon
+par geocodage, coordonnees alors enregistrees sur la zone). Les appels sont asynchrones, sur un pool
+de connexions keep-alive partage, avec une concurrence bornee, des timeouts,
+des reessais (backoff exponentiel avec jitter) et plusieurs villes par requete.
+Re-executable : une mesure deja presente pour la meme ville et le meme releve
+Open-Meteo est mise a jour au lieu d'etre dupliquee.
 """
 
-import requests
-from app.database import SessionLocal
+import asyncio
+import random
+import time
+from datetime import datetime
+import httpx
+from sqlalchemy import bindparam, update
+from app.database import Base, SessionLocal, engine
+from app import models  # enregistre toutes les tables (rollups, versions)
 from app.models.zone import Zone
 from app.models.indicator import Indicator
-from datetime import datetime
+from app.utils.bulk import upsert_rows
+from app.utils.sql import add_missing_columns, create_missing_indexes
+from app.utils.versions import bump_zones
 
-def fetch_meteo_data():
-    """Recuperer les donnees meteo depuis Open-Meteo API"""
-    print("Recuperation des donnees Open-Meteo...")
-    
-    # Coordonnees de grandes villes francaises
-    cities = [
-        {"name": "Paris", "lat": 48.8566, "lon": 2.3522, "postal": "75001"},
-        {"name": "Lyon", "lat": 45.7640, "lon": 4.8357, "postal": "69001"},
-        {"name": "Marseille", "lat": 43.2965, "lon": 5.3698, "postal": "13001"},
-        {"name": "Toulouse", "lat": 43.6047, "lon": 1.4442, "postal": "31000"},
-        {"name": "Nice", "lat": 43.7102, "lon": 7.2620, "postal": "06000"},
+FORECAST_URL = "https://api.open-meteo.com/v1/forecast"
+GEOCODING_URL = "https://geocoding-api.open-meteo.com/v1/search"
+
+BATCH_SIZE = 50          # villes par requete (listes latitude/longitude de l'API)
+MAX_CONCURRENCY = 8      # requetes simultanees, et taille du pool de connexions
+REQUEST_TIMEOUT = 10.0   # secondes
+MAX_RETRIES = 3
+BACKOFF_BASE = 0.5       # secondes, double a chaque essai
+
+# Codes HTTP pour lesquels un nouvel essai a du sens
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+CURRENT_FIELDS = "temperature_2m,relative_humidity_2m,wind_speed_10m,precipitation"
+
+# Champ Open-Meteo -> (type, unite, description)
+METRICS = [
+    ("temperature_2m", "temperature", "°C", "Current temperature for {city}"),
+    ("relative_humidity_2m", "humidity", "%", "Relative humidity for {city}"),
+    ("wind_speed_10m", "wind_speed", "km/h", "Wind speed at 10m for {city}"),
+    ("precipitation", "precipitation", "mm", "Precipitation for {city}"),
+]
+
+# Grandes villes francaises : zones creees si la base n'en contient aucune ; coordonnees
+# utilisees pour les zones anciennes qui n'en ont pas (les autres sont geocodees par nom)
+DEFAULT_CITIES = [
+    {"name": "Paris", "lat": 48.8566, "lon": 2.3522, "postal": "75001"},
+    {"name": "Lyon", "lat": 45.7640, "lon": 4.8357, "postal": "69001"},
+    {"name": "Marseille", "lat": 43.2965, "lon": 5.3698, "postal": "13001"},
+    {"name": "Toulouse", "lat": 43.6047, "lon": 1.4442, "postal": "31000"},
+    {"name": "Nice", "lat": 43.7102, "lon": 7.2620, "postal": "06000"},
+]
+KNOWN_COORDINATES = {city["postal"]: (city["lat"], city["lon"]) for city in DEFAULT_CITIES}
+
+def load_zones(db):
+    """Zones a interroger (creees a partir des villes par defaut si la base est vide)"""
+    zones = db.query(Zone).order_by(Zone.id).all()
+    if not zones:
+        zones = [
+            Zone(name=city["name"], postal_code=city["postal"], latitude=city["lat"], longitude=city["lon"])
+            for city in DEFAULT_CITIES
+        ]
+        db.add_all(zones)
+        bump_zones(db)
+        db.commit()
+    return [
+        {"id": zone.id, "name": zone.name, "postal_code": zone.postal_code,
+         "latitude": zone.latitude, "longitude": zone.longitude}
+        for zone in zones
     ]
-    
-    results = []
-    
-    for city in cities:
-        url = "https://api.open-meteo.com/v1/forecast"
-        
-        params = {
-            "latitude": city["lat"],
-            "longitude": city["lon"],
-            "current": "temperature_2m,relative_humidity_2m,wind_speed_10m,precipitation",
-            "timezone": "Europe/Paris"
-        }
-        
+
+async def get_json(client, semaphore, url, params):
+    """GET avec concurrence bornee et reessais (backoff exponentiel, jitter complet)"""
+    for attempt in range(MAX_RETRIES + 1):
         try:
-            response = requests.get(url, params=params, timeout=10)
-            response.raise_for_status()
-            data = response.json()
-            
-            results.append({
-                "city": city["name"],
-                "postal_code": city["postal"],
-                "data": data
-            })
-            print(f"  - {city['name']}: OK")
-            
-        except requests.exceptions.RequestException as e:
-            print(f"  - {city['name']}: Erreur - {e}")
+            async with semaphore:
+                response = await client.get(url, params=params)
+            if response.status_code not in RETRY_STATUSES:
+                response.raise_for_status()
+                return response.json()
+            error = httpx.HTTPStatusError(
+                f"HTTP {response.status_code}", request=response.request, response=response
+            )
+        except httpx.TransportError as e:  # timeouts, connexions refusees...
+            error = e
+        if attempt == MAX_RETRIES:
+            raise error
+        await asyncio.sleep(random.uniform(0, BACKOFF_BASE * 2 ** attempt))
+
+async def geocode(client, semaphore, zone, geocoding_url):
+    """Coordonnees d'une zone : les siennes, la table connue, sinon geocodage Open-Meteo par nom"""
+    if zone.get("latitude") is not None and zone.get("longitude") is not None:
+        return zone["latitude"], zone["longitude"]
+    if zone["postal_code"] in KNOWN_COORDINATES:
+        return KNOWN_COORDINATES[zone["postal_code"]]
+    try:
+        data = await get_json(client, semaphore, geocoding_url, {
+            "name": zone["name"], "count": 1, "countryCode": "FR"
+        })
+    except httpx.HTTPError as e:
+        print(f"  - {zone['name']}: Erreur de geocodage - {e}")
+        return None
+    matches = data.get("results") or []
+    if not matches:
+        print(f"  - {zone['name']}: ville introuvable")
+        return None
+    return matches[0]["latitude"], matches[0]["longitude"]
+
+async def fetch_batch(client, semaphore, batch, forecast_url):
+    """Donnees actuelles de plusieurs villes en une requete"""
+    params = {
+        "latitude": ",".join(str(lat) for _, lat, _ in batch),
+        "longitude": ",".join(str(lon) for _, _, lon in batch),
+        "current": CURRENT_FIELDS,
+        "timezone": "Europe/Paris"
+    }
+    try:
+        data = await get_json(client, semaphore, forecast_url, params)
+    except httpx.HTTPError as e:
+        print(f"  - lot de {len(batch)} villes: Erreur - {e}")
+        return []
+    # Une seule ville : objet JSON ; plusieurs : liste dans l'ordre des coordonnees
+    items = data if isinstance(data, list) else [data]
+    return [
+        {"zone_id": zone["id"], "city": zone["name"], "postal_code": zone["postal_code"],
+         "latitude": lat, "longitude": lon, "data": item}
+        for (zone, lat, lon), item in zip(batch, items)
+    ]
+
+async def fetch_meteo_data(zones, forecast_url=FORECAST_URL, geocoding_url=GEOCODING_URL,
+                           batch_size=BATCH_SIZE, concurrency=MAX_CONCURRENCY):
+    """Recuperer les donnees meteo des zones depuis Open-Meteo API"""
+    print(f"Recuperation des donnees Open-Meteo pour {len(zones)} zones...")
+    
+    semaphore = asyncio.Semaphore(concurrency)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(limits=limits, timeout=REQUEST_TIMEOUT) as client:
+        coordinates = await asyncio.gather(*(
+            geocode(client, semaphore, zone, geocoding_url) for zone in zones
+        ))
+        located = [
+            (zone, coords[0], coords[1])
+            for zone, coords in zip(zones, coordinates) if coords is not None
+        ]
+        batches = [located[i:i + batch_size] for i in range(0, len(located), batch_size)]
+        responses = await asyncio.gather(*(
+            fetch_batch(client, semaphore, batch, forecast_url) for batch in batches
+        ))
     
+    results = [result for batch in responses for result in batch]
+    print(f"  - {len(results)}/{len(zones)} zones: OK")
     return results
 
+def save_coordinates(db, zones, results):
+    """Enregistre les coordonnees trouvees pour les zones qui n'en avaient pas"""
+    missing = {zone["id"] for zone in zones if zone.get("latitude") is None or zone.get("longitude") is None}
+    rows = [
+        {"zone_id": result["zone_id"], "lat": result["latitude"], "lon": result["longitude"]}
+        for result in results if result["zone_id"] in missing
+    ]
+    if rows:
+        table = Zone.__table__
+        db.execute(
+            update(table).where(table.c.id == bindparam("zone_id")).values(
+                latitude=bindparam("lat"), longitude=bindparam("lon")
+            ),
+            rows
+        )
+        bump_zones(db)
+        db.commit()
+    return len(rows)
+
 def ingest_meteo_to_db(db, results):
     """Inserer les donnees meteo dans la base"""
     print(f"\nTraitement de {len(results)} villes...")
     
-    count = 0
-    
+    rows = []
     for result in results:
-        # Creer ou recuperer la zone
-        zone = db.query(Zone).filter(Zone.postal_code == result["postal_code"]).first()
-        if not zone:
-            zone = Zone(name=result["city"], postal_code=result["postal_code"])
-            db.add(zone)
-            db.commit()
-            db.refresh(zone)
-        
         # Recuperer les donnees actuelles
         current = result["data"].get("current", {})
         current_time = current.get("time")
@@ -76,72 +191,30 @@ def ingest_meteo_to_db(db, results):
         
         try:
             timestamp = datetime.fromisoformat(current_time)
-        except:
+        except ValueError:
             timestamp = datetime.utcnow()
         
-        # Temperature
-        temp = current.get("temperature_2m")
-        if temp is not None:
-            indicator = Indicator(
-                source="Open-Meteo",
-                type="temperature",
-                value=round(float(temp), 2),
-                unit="°C",
-                zone_id=zone.id,
-                timestamp=timestamp,
-                meta_info=f"Current temperature for {result['city']}"
-            )
-            db.add(indicator)
-            count += 1
-        
-        # Humidite
-        humidity = current.get("relative_humidity_2m")
-        if humidity is not None:
-            indicator = Indicator(
-                source="Open-Meteo",
-                type="humidity",
-                value=round(float(humidity), 2),
-                unit="%",
-                zone_id=zone.id,
-                timestamp=timestamp,
-                meta_info=f"Relative humidity for {result['city']}"
-            )
-            db.add(indicator)
-            count += 1
-        
-        # Vitesse du vent
-        wind = current.get("wind_speed_10m")
-        if wind is not None:
-            indicator = Indicator(
-                source="Open-Meteo",
-                type="wind_speed",
-                value=round(float(wind), 2),
-                unit="km/h",
-                zone_id=zone.id,
-                timestamp=timestamp,
-                meta_info=f"Wind speed at 10m for {result['city']}"
-            )
-            db.add(indicator)
-            count += 1
-        
-        # Precipitation
-        precip = current.get("precipitation")
-        if precip is not None:
-            indicator = Indicator(
-                source="Open-Meteo",
-                type="precipitation",
-                value=round(float(precip), 2),
-                unit="mm",
-                zone_id=zone.id,
-                timestamp=timestamp,
-                meta_info=f"Precipitation for {result['city']}"
-            )
-            db.add(indicator)
-            count += 1
+        for field, type_, unit, description in METRICS:
+            value = current.get(field)
+            if value is not None:
+                rows.append({
+                    "source": "Open-Meteo",
+                    "type": type_,
+                    "value": round(float(value), 2),
+                    "unit": unit,
+                    "zone_id": result["zone_id"],
+                    "timestamp": timestamp,
+                    "meta_info": {"variable": field, "description": description.format(city=result["city"])}
+                })
     
+    # Upsert en masse, agregats mis a jour dans la meme transaction
+    counts = upsert_rows(db, rows)
     db.commit()
-    print(f"OK: {count} mesures meteorologiques ajoutees")
-    return count
+    print(
+        f"OK: {counts['inserted']} mesures meteorologiques ajoutees, "
+        f"{counts['updated']} mises a jour, {counts['skipped']} inchangees"
+    )
+    return counts
 
 def main():
     print("=" * 60)
@@ -150,26 +223,36 @@ def main():
     print("\nSource: Open-Meteo API (https://open-meteo.com)")
     print("Donnees: Temperature, Humidite, Vent, Precipitations")
     print()
+    Base.metadata.create_all(bind=engine)
+    add_missing_columns(engine, Base.metadata)
+    # Clé naturelle comprise : sans elle, une nouvelle exécution dupliquerait les mesures
+    create_missing_indexes(engine, Base.metadata)
     
     db = SessionLocal()
     
     try:
-        results = fetch_meteo_data()
+        zones = load_zones(db)
+        start = time.perf_counter()
+        results = asyncio.run(fetch_meteo_data(zones))
+        elapsed = time.perf_counter() - start
         
         if not results:
             print("\nAucune donnee recuperee.")
             return
         
-        print(f"\n{len(results)} villes recuperees depuis Open-Meteo")
+        print(f"\n{len(results)} villes recuperees depuis Open-Meteo en {elapsed:.1f}s")
         
-        total = ingest_meteo_to_db(db, results)
+        counts = ingest_meteo_to_db(db, results)
+        located = save_coordinates(db, zones, results)
+        if located:
+            print(f"Coordonnees enregistrees pour {located} zones")
         
         print()
         print("=" * 60)
-        print(f"SUCCES: {total} mesures meteorologiques ajoutees!")
+        print(f"SUCCES: {counts['inserted']} mesures meteorologiques ajoutees!")
         print(f"Total dans la BDD: {db.query(Indicator).count()} indicateurs")
         print("=" * 60)
-        
+    
     except Exception as e:
         print(f"\nERREUR: {e}")
         import traceback
@@ -179,4 +262,4 @@ def main():
         db.close()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
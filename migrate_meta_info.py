@@ -0,0 +1,44 @@
+"""
+Convertit les meta_info en texte libre en objets JSON ({"description": texte}), par lots
+d'identifiants, puis cree les index des cles de META_INDEXED_KEYS. L'API le fait aussi
+au demarrage si la migration n'a jamais ete appliquee a la base.
+
+    python migrate_meta_info.py
+    META_INDEXED_KEYS='["pollutant", "station"]' python migrate_meta_info.py --indexes-only
+"""
+
+import argparse
+from app.database import Base, SessionLocal, engine
+from app import models  # enregistre toutes les tables (migrations appliquees)
+from app.config import settings
+from app.utils.meta import ensure_meta_indexes, migrate_meta_info
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--batch-size", type=int, default=settings.META_MIGRATION_BATCH_SIZE,
+                        help="lignes examinees par transaction")
+    parser.add_argument("--indexes-only", action="store_true",
+                        help="seulement creer (ou supprimer) les index des cles meta")
+    args = parser.parse_args(argv)
+
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+
+    try:
+        if not args.indexes_only:
+            print("Conversion des meta_info en JSON...")
+            converted = migrate_meta_info(db, batch_size=args.batch_size)
+            print(f"  - {converted} lignes converties")
+        names = ensure_meta_indexes(engine)
+        print(f"  - index meta : {', '.join(names) or 'aucun'}")
+        print("Migration terminee avec succes!")
+    except Exception as e:
+        print(f"Erreur lors de la migration: {e}")
+        db.rollback()
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,29 @@
+"""
+Reconstruit les tables d'agregats (rollups) a partir des mesures brutes.
+A lancer si les rollups divergent de la table indicators
+(ecriture directe en base, import manuel, etc.)
+"""
+
+from app.database import Base, SessionLocal, engine
+from app.models import IndicatorRollupHourly, IndicatorRollupDaily, IndicatorRollupMonthly
+from app.utils.rollups import rebuild_rollups
+
+def main():
+    print("Reconstruction des rollups...")
+    Base.metadata.create_all(bind=engine)
+    
+    db = SessionLocal()
+    
+    try:
+        counts = rebuild_rollups(db)
+        for granularity, count in counts.items():
+            print(f"  - {granularity}: {count} buckets")
+        print("Reconstruction terminee avec succes!")
+    except Exception as e:
+        print(f"Erreur lors de la reconstruction: {e}")
+        db.rollback()
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    main()
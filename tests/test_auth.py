@@ -32,4 +32,83 @@ def test_login():
     assert response.status_code == 200
     data = response.json()
     assert "access_token" in data
-    assert data["token_type"] == "bearer"
\ No newline at end of file
+    assert data["token_type"] == "bearer"
+
+def test_principal_cache():
+    # Les requêtes authentifiées successives sont servies par le cache
+    from app.utils.auth import principal_cache, invalidate_principal
+    token = client.post(
+        "/auth/login",
+        data={"username": "admin@ecotrack.com", "password": "admin123"}
+    ).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    
+    invalidate_principal("admin@ecotrack.com")
+    client.get("/indicators/", params={"limit": 1}, headers=headers)
+    before = principal_cache.stats()
+    client.get("/indicators/", params={"limit": 1}, headers=headers)
+    after = client.get("/auth/cache-stats", headers=headers).json()
+    assert after["hits"] >= before["hits"] + 2
+    assert after["misses"] == before["misses"]
+
+def test_principal_cache_sees_role_change_from_other_process():
+    # Rôle modifié hors de l'API (update_admin.py) : la relève retire l'entrée du cache
+    from app.database import SessionLocal, ReadSessionLocal
+    from app.models.user import User
+    from app.utils import versions
+    from app.utils.auth import sync_principal_cache
+    import uuid
+    suffix = uuid.uuid4().hex[:8]
+    email = f"promoted{suffix}@example.com"
+    client.post("/auth/register", json={
+        "email": email, "username": f"promoted{suffix}", "password": "testpass123"
+    })
+    token = client.post("/auth/login", data={"username": email, "password": "testpass123"}).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    assert client.get("/auth/cache-stats", headers=headers).status_code == 403
+    
+    db = SessionLocal()
+    db.query(User).filter(User.email == email).update({"role": "admin"})
+    versions.bump_user(db, email)
+    db.commit()
+    db.close()
+    # Servi par le cache jusqu'à la relève, sans requête vers la base
+    assert client.get("/auth/cache-stats", headers=headers).status_code == 403
+    
+    with ReadSessionLocal() as read_db:
+        assert sync_principal_cache(read_db) >= 1
+    assert client.get("/auth/cache-stats", headers=headers).status_code == 200
+
+def test_login_rehashes_outdated_hash():
+    # Un hash créé avec un coût différent est remplacé à la connexion
+    from app.database import SessionLocal
+    from app.models.user import User
+    from app.utils.security import pwd_context
+    import random
+    random_num = random.randint(1000, 9999)
+    email = f"rehash{random_num}@example.com"
+    db = SessionLocal()
+    db.add(User(
+        email=email,
+        username=f"rehash{random_num}",
+        hashed_password=pwd_context.handler("bcrypt").using(rounds=4).hash("oldpass123")
+    ))
+    db.commit()
+    
+    response = client.post("/auth/login", data={"username": email, "password": "oldpass123"})
+    assert response.status_code == 200
+    
+    db.expire_all()
+    user = db.query(User).filter(User.email == email).first()
+    assert not pwd_context.needs_update(user.hashed_password)
+    db.close()
+
+def test_login_busy_returns_503(monkeypatch):
+    # File d'attente bcrypt pleine : échec rapide
+    from app.config import settings
+    monkeypatch.setattr(settings, "PASSWORD_HASH_MAX_PENDING", 0)
+    response = client.post(
+        "/auth/login",
+        data={"username": "admin@ecotrack.com", "password": "admin123"}
+    )
+    assert response.status_code == 503
@@ -0,0 +1,69 @@
+import gzip
+from fastapi.testclient import TestClient
+from app.main import app
+from app.utils.compression import negotiate
+
+client = TestClient(app)
+
+def get_admin_token():
+    # Helper pour obtenir un token admin
+    response = client.post(
+        "/auth/login",
+        data={
+            "username": "admin@ecotrack.com",
+            "password": "admin123"
+        }
+    )
+    return response.json()["access_token"]
+
+def fetch(path, params, headers, encoding):
+    # Octets tels qu'envoyés (sans décompression par le client)
+    with client.stream("GET", path, params=params, headers={**headers, "Accept-Encoding": encoding}) as response:
+        return response, b"".join(response.iter_raw())
+
+def test_negotiate():
+    encodings = ["zstd", "br", "gzip"]
+    assert negotiate("gzip, deflate, br", encodings) == "br"
+    assert negotiate("br;q=0, gzip;q=0.5", encodings) == "gzip"
+    assert negotiate("*", ["gzip"]) == "gzip"
+    assert negotiate("identity", encodings) is None
+    assert negotiate("", encodings) is None
+
+def test_compressed_responses():
+    headers = {"Authorization": f"Bearer {get_admin_token()}"}
+    for i in range(50):
+        client.post("/indicators/", headers=headers, json={
+            "source": "TestSource", "type": "compression_test", "value": float(i), "unit": "u",
+            "zone_id": 1, "timestamp": f"2024-05-01T{i % 24:02d}:{i // 24:02d}:00"
+        })
+
+    # Réponse complète : compressée, Content-Length de la version compressée
+    params = {"type": "compression_test", "limit": 1000}
+    plain, plain_body = fetch("/indicators/", params, headers, "identity")
+    response, body = fetch("/indicators/", params, headers, "gzip")
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert int(response.headers["content-length"]) == len(body) < len(plain_body)
+    assert gzip.decompress(body) == plain_body
+
+    # Export en flux : compressé morceau par morceau, sans Content-Length
+    params = {"type": "compression_test", "format": "csv"}
+    plain, plain_body = fetch("/indicators/export", params, headers, "identity")
+    response, body = fetch("/indicators/export", params, headers, "gzip")
+    assert response.headers["content-encoding"] == "gzip"
+    assert "content-length" not in response.headers
+    assert gzip.decompress(body) == plain_body
+
+    # Sous le seuil : réponse telle quelle
+    response, body = fetch("/", {}, {}, "gzip")
+    assert "content-encoding" not in response.headers
+    assert body == b'{"message":"Bienvenue sur EcoTrack API"}'
+
+def test_weak_etag_revalidation():
+    headers = {"Authorization": f"Bearer {get_admin_token()}", "Accept-Encoding": "gzip"}
+    response = client.get("/stats/averages", headers=headers)
+    assert response.headers["content-encoding"] == "gzip"
+    etag = response.headers["etag"]
+    assert etag.startswith('W/"')
+    response = client.get("/stats/averages", headers={**headers, "If-None-Match": etag})
+    assert response.status_code == 304
@@ -0,0 +1,87 @@
+import threading
+import uuid
+from datetime import datetime, timedelta
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+from app.main import app
+from app.config import settings
+from app.database import engine, read_engine, SessionLocal, ReadSessionLocal
+from app.utils.bulk import upsert_rows
+
+client = TestClient(app)
+
+def get_admin_token():
+    # Helper pour obtenir un token admin
+    response = client.post(
+        "/auth/login",
+        data={
+            "username": "admin@ecotrack.com",
+            "password": "admin123"
+        }
+    )
+    return response.json()["access_token"]
+
+def test_sqlite_profile_applied():
+    # Les pragmas du profil sont appliqués à chaque connexion
+    with engine.connect() as conn:
+        assert conn.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+        assert conn.execute(text("PRAGMA busy_timeout")).scalar() == settings.SQLITE_BUSY_TIMEOUT_MS
+        assert conn.execute(text("PRAGMA query_only")).scalar() == 0
+    with read_engine.connect() as conn:
+        assert conn.execute(text("PRAGMA query_only")).scalar() == 1
+
+def test_read_session_is_read_only():
+    db = ReadSessionLocal()
+    with pytest.raises(OperationalError):
+        db.execute(text("DELETE FROM indicators WHERE id = -1"))
+    db.close()
+
+def test_ingest_while_reading():
+    # Une ingestion continue ne bloque ni ne fait échouer les lectures
+    headers = {"Authorization": f"Bearer {get_admin_token()}"}
+    type_ = f"concurrency_test_{uuid.uuid4().hex[:8]}"  # compte propre à cette exécution
+    errors = []
+    done = threading.Event()
+
+    def ingest():
+        base = datetime(2023, 6, 1)
+        try:
+            for batch in range(20):
+                db = SessionLocal()
+                rows = [
+                    {
+                        "source": "Concurrency",
+                        "type": type_,
+                        "value": float(i),
+                        "unit": "u",
+                        "zone_id": 1,
+                        "timestamp": base + timedelta(minutes=batch * 500 + i),
+                        "meta_info": None
+                    }
+                    for i in range(500)
+                ]
+                upsert_rows(db, rows)
+                db.commit()
+                db.close()
+        except Exception as e:
+            errors.append(e)
+        finally:
+            done.set()
+
+    writer = threading.Thread(target=ingest)
+    writer.start()
+    reads = 0
+    while not done.is_set() or reads < 5:
+        for url, params in [("/indicators/", {"limit": 20}), ("/stats/averages", {})]:
+            response = client.get(url, params=params, headers=headers)
+            assert response.status_code == 200
+        reads += 1
+    writer.join()
+
+    assert errors == []
+    data = client.get(
+        "/stats/averages", params={"type": type_}, headers=headers
+    ).json()["data"]
+    assert data[0]["count"] == 10000
@@ -0,0 +1,36 @@
+from datetime import datetime
+from sqlalchemy import create_engine, insert, text
+from sqlalchemy.orm import sessionmaker
+import dedupe_indicators
+from app.database import Base
+from app import models  # enregistre toutes les tables (rollups, versions)
+from app.models.indicator import Indicator, NATURAL_KEY_INDEX
+from app.utils import sql
+
+def index_names(engine):
+    with engine.connect() as connection:
+        return sql.index_names(connection, "indicators")
+
+def test_deduplicate_keeps_latest_and_creates_index(tmp_path):
+    # Base à part : la base partagée garde son index unique, même si le test échoue
+    engine = create_engine(f"sqlite:///{tmp_path / 'dedupe.db'}")
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    # Base antérieure à la clé naturelle : doublons possibles
+    db.execute(text(f"DROP INDEX IF EXISTS {NATURAL_KEY_INDEX}"))
+    row = {"source": "Dedupe", "type": "dedupe_test", "unit": "u", "zone_id": 1,
+           "timestamp": datetime(2024, 9, 1)}
+    db.execute(insert(Indicator.__table__), [{**row, "value": float(i)} for i in range(3)])
+    db.execute(insert(Indicator.__table__), {**row, "value": 5.0, "timestamp": datetime(2024, 9, 2)})
+    db.commit()
+    assert NATURAL_KEY_INDEX not in index_names(engine)
+    assert dedupe_indicators.count_duplicates(db) == 2
+    
+    assert dedupe_indicators.deduplicate(db) == 2
+    values = [value for (value,) in db.query(Indicator.value).filter(Indicator.type == "dedupe_test")
+              .order_by(Indicator.timestamp)]
+    assert values == [2.0, 5.0]
+    assert dedupe_indicators.count_duplicates(db) == 0
+    db.close()
+    assert NATURAL_KEY_INDEX in index_names(engine)
+    engine.dispose()
@@ -0,0 +1,89 @@
+import random
+from fastapi.testclient import TestClient
+from app.main import app
+from app.utils.geo import SpatialIndex, haversine_km
+
+client = TestClient(app)
+
+def get_admin_token():
+    # Helper pour obtenir un token admin
+    response = client.post(
+        "/auth/login",
+        data={
+            "username": "admin@ecotrack.com",
+            "password": "admin123"
+        }
+    )
+    return response.json()["access_token"]
+
+def test_spatial_index_matches_brute_force():
+    rng = random.Random(5)
+    points = [(i, rng.uniform(41.3, 51.1), rng.uniform(-5.1, 9.6)) for i in range(5000)]
+    index = SpatialIndex(points)
+
+    def distances(lat, lon):
+        return sorted(((haversine_km(lat, lon, p_lat, p_lon), i) for i, p_lat, p_lon in points))
+
+    for _ in range(20):
+        lat, lon = rng.uniform(40, 52), rng.uniform(-7, 11)
+        exact = distances(lat, lon)
+        assert [i for i, _ in index.nearest(lat, lon, 7)] == [i for _, i in exact[:7]]
+        assert [i for i, _ in index.within_radius(lat, lon, 25)] == [i for d, i in exact if d <= 25]
+        box = (lat - 0.5, lon - 0.5, lat + 0.5, lon + 0.5)
+        assert index.within_bbox(*box) == sorted(
+            i for i, p_lat, p_lon in points
+            if box[0] <= p_lat <= box[2] and box[1] <= p_lon <= box[3]
+        )
+    assert index.nearest(0.0, 0.0, 3, max_km=100) == []
+
+def free_area():
+    # Les zones créées restent en base : chaque exécution prend une région encore vide
+    for lat in range(-60, -30, 3):
+        for lon in range(150, 180, 3):
+            if not client.get("/zones/within", params={"lat": lat, "lon": lon, "radius_km": 300}).json():
+                return lat, lon
+    raise AssertionError("no free area left for the geo test")
+
+def test_geo_endpoints_and_filters():
+    headers = {"Authorization": f"Bearer {get_admin_token()}"}
+    # Zones isolées, loin des autres zones de la base de test
+    lat0, lon0 = free_area()
+    offsets = [(0.00, 0.00), (-0.05, 0.05), (-0.50, 0.50), (-2.00, -2.00)]
+    coordinates = [(lat0 + d_lat, lon0 + d_lon) for d_lat, d_lon in offsets]
+    zone_ids = [
+        client.post("/zones/", headers=headers, json={
+            "name": f"Geo {i}", "latitude": lat, "longitude": lon
+        }).json()["id"]
+        for i, (lat, lon) in enumerate(coordinates)
+    ]
+
+    nearest = client.get("/zones/nearest", params={"lat": lat0, "lon": lon0, "k": 3}).json()
+    assert [zone["id"] for zone in nearest] == zone_ids[:3]
+    assert nearest[0]["distance_km"] == 0.0
+    assert nearest[1]["latitude"] == coordinates[1][0]
+
+    within = client.get("/zones/within", params={"lat": lat0, "lon": lon0, "radius_km": 80}).json()
+    assert [zone["id"] for zone in within] == zone_ids[:3]
+    bbox = f"{lat0 - 0.2},{lon0 - 0.1},{lat0 + 0.1},{lon0 + 0.1}"
+    within = client.get("/zones/within", params={"bbox": bbox}).json()
+    assert [zone["id"] for zone in within] == zone_ids[:2]
+    assert client.get("/zones/within", params={"lat": lat0, "lon": lon0}).status_code == 422
+    assert client.get("/zones/within", params={"bbox": "1,2,3"}).status_code == 422
+
+    # Filtre géographique sur les indicateurs et les moyennes
+    for zone_id in zone_ids:
+        client.post("/indicators/", headers=headers, json={
+            "source": "TestSource", "type": "geo_test", "value": float(zone_id), "unit": "u",
+            "zone_id": zone_id, "timestamp": "2024-07-01T00:00:00"
+        })
+    params = {"type": "geo_test", "lat": lat0, "lon": lon0, "radius_km": 10}
+    indicators = client.get("/indicators/", params=params, headers=headers).json()
+    assert sorted(indicator["zone_id"] for indicator in indicators) == zone_ids[:2]
+    averages = client.get("/stats/averages", params=params, headers=headers).json()["data"]
+    assert [row["zone_id"] for row in averages] == zone_ids[:2]
+
+    # Une nouvelle zone dans le cercle invalide la réponse en cache
+    etag = client.get("/stats/averages", params=params, headers=headers).headers["etag"]
+    client.post("/zones/", headers=headers, json={"name": "Geo 5", "latitude": lat0 - 0.01, "longitude": lon0 + 0.01})
+    response = client.get("/stats/averages", params=params, headers={**headers, "If-None-Match": etag})
+    assert response.status_code == 200
@@ -1,5 +1,14 @@
+import json
+import uuid
+from datetime import datetime
+import pytest
 from fastapi.testclient import TestClient
+from sqlalchemy import insert
+from starlette.websockets import WebSocketDisconnect
 from app.main import app
+from app.database import SessionLocal
+from app.models.indicator import Indicator
+from app.utils import live
 
 client = TestClient(app)
 
@@ -45,4 +54,204 @@ def test_create_indicator():
     )
     assert response.status_code == 201
     data = response.json()
-    assert data["value"] == 100.0
\ No newline at end of file
+    assert data["value"] == 100.0
+
+def test_cursor_pagination():
+    # Parcours complet par curseur : pas de doublon, ordre (timestamp, id)
+    token = get_admin_token()
+    headers = {"Authorization": f"Bearer {token}"}
+    params = {"limit": 40, "type": "air_quality"}
+    seen = []
+    cursor = None
+    while True:
+        if cursor:
+            params["cursor"] = cursor
+        response = client.get("/indicators/", params=params, headers=headers)
+        assert response.status_code == 200
+        page = response.json()
+        assert len(page) <= 40
+        seen.extend(page)
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+    
+    ids = [i["id"] for i in seen]
+    assert len(ids) == len(set(ids))
+    assert all(i["type"] == "air_quality" for i in seen)
+    keys = [(i["timestamp"], i["id"]) for i in seen]
+    assert keys == sorted(keys)
+    
+    # limit=0 : aucune ligne, comme avant la pagination par curseur
+    response = client.get("/indicators/", params={"limit": 0, "type": "air_quality"}, headers=headers)
+    assert response.json() == []
+    assert "X-Next-Cursor" not in response.headers
+
+def test_invalid_cursor():
+    token = get_admin_token()
+    response = client.get(
+        "/indicators/",
+        params={"cursor": "not-a-cursor"},
+        headers={"Authorization": f"Bearer {token}"}
+    )
+    assert response.status_code == 400
+
+def test_bulk_json_array():
+    # Insertion en masse : les lignes invalides n'empêchent pas les autres
+    token = get_admin_token()
+    type_ = f"bulk_test_{uuid.uuid4().hex[:8]}"  # clés naturelles propres à cette exécution
+    rows = [
+        {"source": "Bulk", "type": type_, "value": float(i), "unit": "u", "zone_id": 1,
+         "timestamp": f"2024-02-01T{i:02d}:00:00"}
+        for i in range(10)
+    ]
+    rows.insert(3, {"source": "Bulk", "type": type_, "unit": "u", "zone_id": 1})
+    rows.append({"source": "Bulk", "type": type_, "value": 1.0, "unit": "u", "zone_id": 999999})
+    response = client.post(
+        "/indicators/bulk",
+        headers={"Authorization": f"Bearer {token}"},
+        json=rows
+    )
+    assert response.status_code == 200
+    data = response.json()
+    assert data["inserted"] == 10
+    assert data["failed"] == 2
+    assert [e["index"] for e in data["errors"]] == [3, 11]
+
+def test_bulk_ndjson_stream():
+    token = get_admin_token()
+    lines = [
+        '{"source": "Bulk", "type": "bulk_ndjson", "value": 1.5, "unit": "u", "zone_id": 1}',
+        'not json',
+        '{"source": "Bulk", "type": "bulk_ndjson", "value": 2.5, "unit": "u", "zone_id": 2}',
+    ]
+    response = client.post(
+        "/indicators/bulk",
+        headers={
+            "Authorization": f"Bearer {token}",
+            "Content-Type": "application/x-ndjson"
+        },
+        content="\n".join(lines) + "\n"
+    )
+    assert response.status_code == 200
+    data = response.json()
+    assert data["inserted"] == 2
+    assert data["errors"] == [{"index": 1, "detail": "Invalid JSON"}]
+
+def test_export_formats():
+    # Export en flux : même nombre de lignes en NDJSON et en CSV
+    token = get_admin_token()
+    headers = {"Authorization": f"Bearer {token}"}
+    params = {"type": "air_quality"}
+    
+    response = client.get("/indicators/export", params={**params, "format": "ndjson"}, headers=headers)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert rows and all(r["type"] == "air_quality" for r in rows)
+    
+    response = client.get("/indicators/export", params={**params, "format": "csv"}, headers=headers)
+    assert response.status_code == 200
+    lines = response.text.splitlines()
+    assert lines[0] == "id,source,type,value,unit,timestamp,zone_id,meta_info"
+    assert len(lines) == len(rows) + 1
+
+def test_export_requires_auth():
+    response = client.get("/indicators/export")
+    assert response.status_code == 401
+
+def test_zones_etag_invalidated_on_create():
+    token = get_admin_token()
+    etag = client.get("/zones/").headers["etag"]
+    assert client.get("/zones/", headers={"If-None-Match": etag}).status_code == 304
+    
+    client.post("/zones/", headers={"Authorization": f"Bearer {token}"}, json={"name": "Zone ETag"})
+    response = client.get("/zones/", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+
+def test_fast_serialization_matches_orm_path(monkeypatch):
+    from app.config import settings
+    headers = {"Authorization": f"Bearer {get_admin_token()}"}
+    params = {"limit": 50}
+    
+    fast = client.get("/indicators/", params=params, headers=headers)
+    monkeypatch.setattr(settings, "FAST_SERIALIZATION_ROUTES", [])
+    slow = client.get("/indicators/", params=params, headers=headers)
+    
+    assert fast.json() == slow.json()
+    assert list(fast.json()[0]) == list(slow.json()[0])
+    assert fast.headers.get("X-Next-Cursor") == slow.headers.get("X-Next-Cursor")
+    
+    slow_export = client.get("/indicators/export", params={"zone_id": 1}, headers=headers)
+    monkeypatch.setattr(settings, "FAST_SERIALIZATION_ROUTES", ["/indicators/export"])
+    fast_export = client.get("/indicators/export", params={"zone_id": 1}, headers=headers)
+    assert [json.loads(line) for line in fast_export.text.splitlines()] == \
+        [json.loads(line) for line in slow_export.text.splitlines()]
+
+def test_stream_websocket_pushes_new_indicators():
+    # Flux filtré : écritures de l'API (création, bulk) et d'un autre processus (relève)
+    token = get_admin_token()
+    headers = {"Authorization": f"Bearer {token}"}
+    type_ = f"stream_test_{uuid.uuid4().hex[:8]}"  # clés naturelles propres à cette exécution
+    with client.websocket_connect(f"/indicators/stream?type={type_}&token={token}") as ws:
+        assert ws.receive_json()["event"] == "ready"
+        
+        row = {"source": "Live", "type": type_, "value": 1.0, "unit": "u", "zone_id": 1}
+        client.post("/indicators/", headers=headers, json={**row, "type": "other_type"})
+        created = client.post("/indicators/", headers=headers, json=row).json()
+        message = ws.receive_json()
+        assert message["event"] == "indicator"
+        assert message["data"]["id"] == created["id"]
+        assert message["data"]["value"] == 1.0
+        
+        client.post("/indicators/bulk", headers=headers, json=[
+            {**row, "value": value, "timestamp": f"2024-07-01T0{i}:00:00"} for i, value in enumerate([2.0, 3.0])
+        ])
+        assert [ws.receive_json()["data"]["value"] for _ in range(2)] == [2.0, 3.0]
+        
+        # Insertion sans passer par l'API : reçue à la relève périodique
+        db = SessionLocal()
+        db.execute(insert(Indicator.__table__), {**row, "value": 4.0, "timestamp": datetime.utcnow()})
+        db.commit()
+        db.close()
+        assert ws.receive_json()["data"]["value"] == 4.0
+
+def test_stream_requires_auth():
+    assert client.get("/indicators/stream").status_code == 401
+    with pytest.raises(WebSocketDisconnect) as exc:
+        with client.websocket_connect("/indicators/stream?token=invalid"):
+            pass
+    assert exc.value.code == 1008
+
+def test_stream_drops_oldest_for_slow_subscribers():
+    subscription = live.Subscription(maxsize=2)
+    for i in range(1, 4):
+        subscription.put(live.Message({"id": i, "zone_id": 1, "type": "t"}))
+    assert subscription.take_dropped() == 1
+    assert [subscription.queue.get_nowait().id for _ in range(2)] == [2, 3]
+
+def test_bulk_upsert_on_natural_key():
+    # Même (source, type, zone, date) : mise à jour ou ignorée, jamais dupliquée
+    headers = {"Authorization": f"Bearer {get_admin_token()}"}
+    type_ = f"upsert_test_{uuid.uuid4().hex[:8]}"  # clés propres à cette exécution
+    rows = [
+        {"source": "Upsert", "type": type_, "value": float(i), "unit": "u", "zone_id": 1,
+         "timestamp": f"2024-08-01T{i:02d}:00:00"}
+        for i in range(4)
+    ]
+    data = client.post("/indicators/bulk", headers=headers, json=rows).json()
+    assert (data["inserted"], data["updated"], data["skipped"]) == (4, 0, 0)
+    
+    rows[0]["value"] = 10.0
+    data = client.post("/indicators/bulk", headers=headers, json=rows).json()
+    assert (data["inserted"], data["updated"], data["skipped"]) == (0, 1, 3)
+    rows[1]["value"] = 20.0
+    data = client.post("/indicators/bulk", params={"on_conflict": "skip"}, headers=headers, json=rows).json()
+    assert (data["inserted"], data["updated"], data["skipped"]) == (0, 0, 4)
+    
+    # Agrégats recalculés pour la mesure mise à jour : (10 + 1 + 2 + 3) / 4
+    averages = client.get("/stats/averages", params={"type": type_}, headers=headers).json()
+    assert [(a["average"], a["count"]) for a in averages["data"]] == [(4.0, 4)]
+    
+    response = client.post("/indicators/", headers=headers, json=rows[2])
+    assert response.status_code == 409
@@ -0,0 +1,58 @@
+import random
+import uuid
+from datetime import datetime, timedelta
+import ingest_data
+from app.database import Base, SessionLocal, engine
+from app.models.indicator import Indicator
+from app.utils.sql import add_missing_columns, create_missing_indexes, index_names
+
+# Comme le script : tables, colonnes et index doivent exister sans démarrer l'API
+Base.metadata.create_all(bind=engine)
+add_missing_columns(engine, Base.metadata)
+create_missing_indexes(engine, Base.metadata)
+
+def test_generator_is_reproducible():
+    zones = [{"id": 1, "name": "A"}, {"id": 2, "name": "B"}]
+    end = datetime(2024, 1, 1)
+    first = list(ingest_data.generate_rows(zones, ["temperature"], end, random.Random(7), days=1))
+    second = list(ingest_data.generate_rows(zones, ["temperature"], end, random.Random(7), days=1))
+    assert first == second
+    assert len(first) == 2 * 24
+    assert first[0]["timestamp"] == datetime(2023, 12, 31)
+    assert first[1]["timestamp"] == datetime(2023, 12, 31, 1)
+
+def test_bulk_load_with_dropped_indexes():
+    # Journée propre à cette exécution : les clés naturelles n'existent pas encore en base
+    end = datetime(2031, 1, 1) + timedelta(days=uuid.uuid4().int % 100_000)
+    args = ingest_data.parse_args([
+        "--zones", "7", "--types", "humidity", "--days", "1", "--interval", "30",
+        "--seed", "3", "--batch-size", "50", "--commit-every", "100",
+        "--end", end.isoformat(), "--drop-indexes", "--defer-rollups"
+    ])
+    db = SessionLocal()
+    before = db.query(Indicator).filter(Indicator.type == "humidity").count()
+    assert ingest_data.run(db, args)["inserted"] == 7 * 48
+    assert db.query(Indicator).filter(Indicator.type == "humidity").count() == before + 7 * 48
+    
+    # Seconde exécution avec la même graine : rien n'est dupliqué
+    assert ingest_data.run(db, args) == {"inserted": 0, "updated": 0, "skipped": 7 * 48}
+    assert db.query(Indicator).filter(Indicator.type == "humidity").count() == before + 7 * 48
+    db.close()
+    
+    # Index reconstruits après le chargement
+    with engine.connect() as connection:
+        names = index_names(connection, "indicators")
+    assert {index.name for index in Indicator.__table__.indexes} <= names
+
+def test_default_run_is_idempotent():
+    # Sans --end ni graine : une seconde exécution met à jour les mêmes clés, sans nouvelle ligne
+    args = ingest_data.parse_args(["--zones", "2", "--types", "temperature", "--days", "1", "--interval", "60"])
+    assert args.end == datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    db = SessionLocal()
+    counts = ingest_data.run(db, args)
+    assert sum(counts.values()) == 2 * 24
+    before = db.query(Indicator).filter(Indicator.type == "temperature").count()
+    counts = ingest_data.run(db, args)
+    assert counts["inserted"] == 0
+    assert db.query(Indicator).filter(Indicator.type == "temperature").count() == before
+    db.close()
@@ -0,0 +1,135 @@
+import asyncio
+import json
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+import pytest
+import ingest_meteo
+from app.database import Base, SessionLocal, engine
+from app.models.indicator import Indicator
+
+# Comme le script : les tables doivent exister sans démarrer l'API
+Base.metadata.create_all(bind=engine)
+
+class StubOpenMeteo(BaseHTTPRequestHandler):
+    """Faux Open-Meteo local : forecast multi-villes et geocodage"""
+    protocol_version = "HTTP/1.1"  # keep-alive
+    latency = 0.05
+    fail_first = True
+    observed_at = "2024-06-01T12:00"
+    requests = []
+    in_flight = 0
+    peak = 0  # maximum de requêtes forecast servies en même temps
+    lock = threading.Lock()
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = parse_qs(url.query)
+        with self.lock:
+            StubOpenMeteo.requests.append(url.path)
+            fail = url.path == "/v1/forecast" and StubOpenMeteo.fail_first
+            if fail:
+                StubOpenMeteo.fail_first = False
+        if fail:
+            return self._send(503, {"error": True, "reason": "overloaded"})
+
+        if url.path == "/v1/search":
+            return self._send(200, {"results": [{"latitude": 45.0, "longitude": 5.0}]})
+
+        with self.lock:
+            StubOpenMeteo.in_flight += 1
+            StubOpenMeteo.peak = max(StubOpenMeteo.peak, StubOpenMeteo.in_flight)
+        time.sleep(self.latency)
+        with self.lock:
+            StubOpenMeteo.in_flight -= 1
+        latitudes = params["latitude"][0].split(",")
+        items = [
+            {
+                "latitude": float(lat),
+                "current": {
+                    "time": StubOpenMeteo.observed_at,
+                    "temperature_2m": 20.0 + i % 10,
+                    "relative_humidity_2m": 50,
+                    "wind_speed_10m": 10.5,
+                    "precipitation": 0.0
+                }
+            }
+            for i, lat in enumerate(latitudes)
+        ]
+        self._send(200, items if len(items) > 1 else items[0])
+
+@pytest.fixture
+def stub_server():
+    StubOpenMeteo.requests = []
+    StubOpenMeteo.in_flight = 0
+    StubOpenMeteo.peak = 0
+    StubOpenMeteo.fail_first = True
+    # Relevé daté propre à cette exécution : les clés naturelles n'existent pas encore en base
+    StubOpenMeteo.observed_at = (
+        datetime(2030, 1, 1) + timedelta(minutes=uuid.uuid4().int % 1_000_000)
+    ).strftime("%Y-%m-%dT%H:%M")
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubOpenMeteo)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    yield base_url
+    server.shutdown()
+    server.server_close()
+
+def test_fetch_1000_zones_concurrently(stub_server, monkeypatch):
+    zones = [{"id": i, "name": f"Ville {i}", "postal_code": f"Z{i}"} for i in range(1000)]
+    monkeypatch.setattr(ingest_meteo, "KNOWN_COORDINATES", {
+        zone["postal_code"]: (40 + i / 1000, 2.0) for i, zone in enumerate(zones)
+    })
+    monkeypatch.setattr(ingest_meteo, "BACKOFF_BASE", 0.01)
+
+    results = asyncio.run(ingest_meteo.fetch_meteo_data(
+        zones, forecast_url=f"{stub_server}/v1/forecast", geocoding_url=f"{stub_server}/v1/search"
+    ))
+
+    # Toutes les zones, dans l'ordre, malgré un 503 réessayé
+    assert [result["zone_id"] for result in results] == list(range(1000))
+    batches = -(-1000 // ingest_meteo.BATCH_SIZE)
+    assert StubOpenMeteo.requests.count("/v1/forecast") == batches + 1
+    # Requêtes en parallèle, jamais plus que la limite (vu du serveur, sans chronomètre)
+    assert 1 < StubOpenMeteo.peak <= ingest_meteo.MAX_CONCURRENCY
+
+def test_ingest_zones_from_database(stub_server, monkeypatch):
+    monkeypatch.setattr(ingest_meteo, "BACKOFF_BASE", 0.01)
+    db = SessionLocal()
+    zones = ingest_meteo.load_zones(db)
+    results = asyncio.run(ingest_meteo.fetch_meteo_data(
+        zones, forecast_url=f"{stub_server}/v1/forecast", geocoding_url=f"{stub_server}/v1/search"
+    ))
+    assert len(results) == len(zones)
+
+    before = db.query(Indicator).filter(Indicator.source == "Open-Meteo").count()
+    counts = ingest_meteo.ingest_meteo_to_db(db, results)
+    assert counts["inserted"] == 4 * len(zones)
+    assert db.query(Indicator).filter(Indicator.source == "Open-Meteo").count() == before + 4 * len(zones)
+    
+    # Même relevé ingéré de nouveau : mis à jour s'il a changé, sans doublon
+    results[0]["data"]["current"]["temperature_2m"] += 1
+    counts = ingest_meteo.ingest_meteo_to_db(db, results)
+    assert counts == {"inserted": 0, "updated": 1, "skipped": 4 * len(zones) - 1}
+    assert db.query(Indicator).filter(Indicator.source == "Open-Meteo").count() == before + 4 * len(zones)
+    
+    # Coordonnées trouvées enregistrées sur les zones : plus de géocodage ensuite
+    ingest_meteo.save_coordinates(db, zones, results)
+    zones = ingest_meteo.load_zones(db)
+    assert all(zone["latitude"] is not None and zone["longitude"] is not None for zone in zones)
+    db.close()
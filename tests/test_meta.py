@@ -0,0 +1,116 @@
+import uuid
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+from app.main import app
+from app.config import settings
+from app.database import SessionLocal, engine
+from app.utils.meta import MIGRATION_NAME, ensure_meta_indexes, meta_value, migrate_meta_info
+from app.models.schema_migration import SchemaMigration
+
+client = TestClient(app)
+
+def get_admin_token():
+    # Helper pour obtenir un token admin
+    response = client.post(
+        "/auth/login",
+        data={
+            "username": "admin@ecotrack.com",
+            "password": "admin123"
+        }
+    )
+    return response.json()["access_token"]
+
+# Types propres à chaque exécution : clés naturelles encore libres
+TYPE = f"meta_test_{uuid.uuid4().hex[:8]}"
+LEGACY_TYPE = f"meta_legacy_{uuid.uuid4().hex[:8]}"
+
+def test_meta_filters():
+    headers = {"Authorization": f"Bearer {get_admin_token()}"}
+    metas = [
+        {"pollutant": "PM2.5", "station": "A"},
+        {"pollutant": "PM2.5", "station": "B"},
+        {"pollutant": "NO2", "station": "A", "sensor": 3},
+        "Ancien texte libre",
+    ]
+    for i, meta_info in enumerate(metas):
+        response = client.post("/indicators/", headers=headers, json={
+            "source": "TestSource", "type": TYPE, "value": float(10 * (i + 1)), "unit": "u",
+            "zone_id": 1, "timestamp": f"2024-03-0{i + 1}T00:00:00", "meta_info": meta_info
+        })
+        assert response.status_code == 201
+    assert response.json()["meta_info"] == {"description": "Ancien texte libre"}
+
+    def values(params):
+        indicators = client.get("/indicators/", params={"type": TYPE, **params}, headers=headers).json()
+        return [indicator["value"] for indicator in indicators]
+
+    assert values({"meta.pollutant": "PM2.5"}) == [10.0, 20.0]
+    assert values({"meta.pollutant": "PM2.5", "meta.station": "B"}) == [20.0]
+    assert values({"meta.sensor": "3"}) == [30.0]
+    assert values({"meta.description": "Ancien texte libre"}) == [40.0]
+    assert client.get("/indicators/", params={"meta.bad-key": "x"}, headers=headers).status_code == 422
+
+    # Statistiques : mesures brutes filtrées, clé du cache distincte
+    params = {"type": TYPE, "meta.pollutant": "PM2.5"}
+    averages = client.get("/stats/averages", params=params, headers=headers).json()["data"]
+    assert [(row["average"], row["count"]) for row in averages] == [(15.0, 2)]
+    trend = client.get("/stats/trend", params={**params, "period": "daily"}, headers=headers).json()["data"]
+    assert [row["count"] for row in trend] == [1, 1]
+    query = client.post("/stats/query", headers=headers, json={"series": [
+        {"type": TYPE, "aggregate": "count"},
+        {"type": TYPE, "aggregate": "count", "meta": {"station": "A"}},
+    ]}).json()["series"]
+    assert [series["data"][0]["value"] for series in query] == [4, 2]
+
+def test_meta_index_is_used():
+    with SessionLocal() as db:
+        names = set(db.execute(text(
+            "SELECT name FROM sqlite_master WHERE name LIKE 'ix_indicators_meta_%'"
+        )).scalars())
+        assert "ix_indicators_meta_pollutant" in names
+        sql = str(
+            (meta_value("pollutant") == "NO2").compile(compile_kwargs={"literal_binds": True})
+        )
+        plan = db.execute(text(f"EXPLAIN QUERY PLAN SELECT id FROM indicators WHERE {sql}")).all()
+        assert "ix_indicators_meta_pollutant" in plan[0][-1]
+
+def test_migrate_legacy_text(monkeypatch):
+    # Base d'avant le passage en JSON : pas d'index meta, qui refusent le texte libre
+    monkeypatch.setattr(settings, "META_INDEXED_KEYS", [])
+    ensure_meta_indexes(engine)
+    with SessionLocal() as db:
+        db.execute(text(
+            "INSERT INTO indicators (source, type, value, unit, timestamp, zone_id, meta_info) "
+            "VALUES ('TestSource', :type, 1.0, 'u', '2024-04-01 00:00:00.000000', 1, 'PM2.5 pour Paris'),"
+            " ('TestSource', :type, 2.0, 'u', '2024-04-02 00:00:00.000000', 1, '42'),"
+            " ('TestSource', :type, 3.0, 'u', '2024-04-03 00:00:00.000000', 1, '{\"station\": \"C\"}')"
+        ), {"type": LEGACY_TYPE})
+        db.commit()
+        assert migrate_meta_info(db, batch_size=7) >= 2
+        stored = db.execute(text(
+            "SELECT meta_info FROM indicators WHERE type = :type ORDER BY value"
+        ), {"type": LEGACY_TYPE}).scalars().all()
+        assert stored == ['{"description":"PM2.5 pour Paris"}', '{"description":"42"}', '{"station": "C"}']
+        assert db.get(SchemaMigration, MIGRATION_NAME) is not None
+    monkeypatch.undo()
+    assert "ix_indicators_meta_pollutant" in ensure_meta_indexes(engine)
+
+def test_meta_only_update_invalidates_stats():
+    # Seul meta_info change : les réponses filtrées en cache ne doivent pas survivre
+    headers = {"Authorization": f"Bearer {get_admin_token()}"}
+    type_ = f"meta_update_{uuid.uuid4().hex[:8]}"
+    created = client.post("/indicators/", headers=headers, json={
+        "source": "TestSource", "type": type_, "value": 5.0, "unit": "u", "zone_id": 1,
+        "timestamp": "2024-03-01T00:00:00", "meta_info": {"pollutant": "O3"}
+    }).json()
+    params = {"type": type_, "meta.pollutant": "O3"}
+    first = client.get("/stats/averages", params=params, headers=headers)
+    assert [row["count"] for row in first.json()["data"]] == [1]
+    
+    response = client.put(f"/indicators/{created['id']}", headers=headers, json={"meta_info": {"pollutant": "NO2"}})
+    assert response.status_code == 200
+    response = client.get(
+        "/stats/averages", params=params, headers={**headers, "If-None-Match": first.headers["etag"]}
+    )
+    assert response.status_code == 200
+    assert response.json()["data"] == []
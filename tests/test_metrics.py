@@ -0,0 +1,59 @@
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+from app.main import app
+from app.config import settings
+from app.database import engine
+
+client = TestClient(app)
+
+def get_admin_token():
+    # Helper pour obtenir un token admin
+    response = client.post(
+        "/auth/login",
+        data={
+            "username": "admin@ecotrack.com",
+            "password": "admin123"
+        }
+    )
+    return response.json()["access_token"]
+
+def test_metrics_per_route():
+    headers = {"Authorization": f"Bearer {get_admin_token()}"}
+    client.get("/indicators/", params={"limit": 5}, headers=headers)
+    client.get("/indicators/999999999", headers=headers)
+    
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    body = response.text
+    assert 'http_requests_total{method="GET",route="/indicators/",status="200"}' in body
+    # Gabarit de route, pas l'URL réelle
+    assert 'http_requests_total{method="GET",route="/indicators/{indicator_id}",status="404"}' in body
+    assert 'http_request_duration_seconds_bucket{method="GET",route="/indicators/",le="+Inf"}' in body
+    assert 'http_request_db_queries_count{method="GET",route="/indicators/"}' in body
+    assert "http_requests_in_flight" in body
+    assert 'db_queries_total{engine="read"}' in body
+
+def test_server_timing_and_query_threshold(monkeypatch, caplog):
+    headers = {"Authorization": f"Bearer {get_admin_token()}"}
+    monkeypatch.setattr(settings, "METRICS_SERVER_TIMING", True)
+    monkeypatch.setattr(settings, "SQL_QUERY_WARN_THRESHOLD", 0)
+    
+    response = client.get("/zones/", headers=headers)
+    timing = response.headers["server-timing"]
+    assert timing.startswith("app;dur=")
+    assert "db;dur=" in timing and "queries" in timing
+    assert "N+1" in caplog.text
+    assert 'http_request_db_queries_threshold_exceeded_total{method="GET",route="/zones/"}' in client.get("/metrics").text
+
+def test_failed_query_clears_start_time():
+    # Une requête en erreur ne laisse pas de début de chronométrage sur la connexion
+    with engine.connect() as conn:
+        with pytest.raises(OperationalError):
+            conn.execute(text("SELECT * FROM missing_table"))
+        assert "query_start_time" not in conn.info
+        conn.rollback()
+        assert conn.execute(text("SELECT 1")).scalar() == 1
+        assert "query_start_time" not in conn.info
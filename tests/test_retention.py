@@ -0,0 +1,118 @@
+import uuid
+from datetime import datetime, timedelta
+from fastapi.testclient import TestClient
+from sqlalchemy import func
+from app.main import app
+from app.config import settings
+from app.database import SessionLocal
+from app.models.indicator import Indicator
+from app.models.rollup import IndicatorRollupHourly
+from app.utils import retention
+from app.utils.rollups import rebuild_rollups
+
+client = TestClient(app)
+
+def get_admin_token():
+    # Helper pour obtenir un token admin
+    response = client.post(
+        "/auth/login",
+        data={
+            "username": "admin@ecotrack.com",
+            "password": "admin123"
+        }
+    )
+    return response.json()["access_token"]
+
+# Type propre à chaque exécution : l'horizon de compaction reste enregistré en base
+TYPE = f"retention_test_{uuid.uuid4().hex[:8]}"
+OTHER_TYPE = f"retention_other_{uuid.uuid4().hex[:8]}"  # sans politique : jamais compacté
+START = datetime(2020, 1, 1)
+
+def make_rows(days, type_=TYPE):
+    return [
+        {"source": "TestSource", "type": type_, "value": float((hour * 7 + zone_id) % 50) / 10,
+         "unit": "u", "zone_id": zone_id, "timestamp": (START + timedelta(hours=hour)).isoformat()}
+        for hour in range(days * 24)
+        for zone_id in (1, 2)
+    ]
+
+QUERIES = [
+    ("/stats/averages", {}),
+    ("/stats/averages", {"date_from": "2020-01-05T00:00:00", "date_to": "2020-02-10T00:00:00"}),
+    ("/stats/trend", {"period": "monthly"}),
+    ("/stats/trend", {"period": "daily", "zone_id": 1}),
+    ("/stats/trend", {"period": "weekly", "date_to": "2020-02-03T00:00:00"}),
+    ("/stats/trend", {"period": "hourly", "date_from": "2020-01-20T00:00:00"}),
+    ("/stats/distribution", {"bins": 5}),
+    ("/stats/distribution", {"date_from": "2020-01-01T00:00:00", "date_to": "2020-02-01T00:00:00"}),
+]
+
+def test_compaction_keeps_stats(monkeypatch):
+    headers = {"Authorization": f"Bearer {get_admin_token()}"}
+    rows = make_rows(60)
+    other_rows = make_rows(60, OTHER_TYPE)
+    for i in range(0, len(rows), 1000):
+        client.post("/indicators/bulk", headers=headers, json=rows[i:i + 1000])
+        client.post("/indicators/bulk", headers=headers, json=other_rows[i:i + 1000])
+
+    def snapshot():
+        return [
+            client.get(path, params={"type": TYPE, **params}, headers=headers).json()
+            for path, params in QUERIES
+        ]
+
+    before = snapshot()
+    monkeypatch.setattr(settings, "RETENTION_POLICIES", {TYPE: {"raw_days": 30, "hourly_days": 45}})
+    with SessionLocal() as db:
+        report = retention.compact(db, now=datetime(2020, 3, 1, 12, 0), batch_size=500)
+        raw_horizon = datetime(2020, 1, 31)
+        assert retention.horizons(db, TYPE) == {"raw": raw_horizon, "hourly": datetime(2020, 1, 16)}
+        assert report["types"][TYPE] == {"raw": 30 * 24 * 2, "hourly": 15 * 24 * 2}
+        remaining = db.query(func.min(Indicator.timestamp)).filter(Indicator.type == TYPE).scalar()
+        assert remaining == raw_horizon
+        assert db.query(func.min(IndicatorRollupHourly.bucket)).filter(
+            IndicatorRollupHourly.type == TYPE
+        ).scalar() == datetime(2020, 1, 16)
+
+    # Statistiques identiques de part et d'autre de l'horizon
+    assert snapshot() == before
+
+    # Série : une moyenne par heure (puis par jour) avant l'horizon, les mesures ensuite
+    body = client.get(
+        "/stats/series", params={"type": TYPE, "points": 10000}, headers=headers
+    ).json()
+    assert body["total"] == 15 + 15 * 24 + 30 * 24 * 2
+    assert body["data"][0]["timestamp"] == "2020-01-01T00:00:00"
+
+    # Mesures compactées : ignorées par /bulk, refusées une à une
+    result = client.post("/indicators/bulk", headers=headers, json=rows[:100]).json()
+    assert (result["inserted"], result["skipped"]) == (0, 100)
+    response = client.post("/indicators/", headers=headers, json={**rows[0], "value": 99.0})
+    assert response.status_code == 409
+    assert snapshot() == before
+
+    # Une reconstruction des rollups garde l'historique compacté
+    with SessionLocal() as db:
+        rebuild_rollups(db)
+    assert snapshot() == before
+    
+    # Filtre meta : mesures brutes seulement, une plage qui commence avant l'horizon est refusée
+    params = {"type": TYPE, "meta.station": "A"}
+    response = client.get("/stats/averages", params=params, headers=headers)
+    assert response.status_code == 409
+    assert "2020-01-31T00:00:00" in response.json()["detail"]
+    response = client.get(
+        "/stats/averages", params={**params, "date_from": "2020-01-31T00:00:00"}, headers=headers
+    )
+    assert response.status_code == 200
+    
+    # Sans type : chaque type découpé à ses propres horizons, le type non compacté reste exact
+    window = {"date_from": "2020-01-05T06:00:00", "date_to": "2020-02-10T00:00:00"}
+    averages = client.get("/stats/averages", params=window, headers=headers).json()["data"]
+    distribution = client.get("/stats/distribution", params=window, headers=headers).json()["data"]
+    for type_ in (TYPE, OTHER_TYPE):
+        typed = client.get("/stats/averages", params={**window, "type": type_}, headers=headers).json()["data"]
+        assert [row for row in averages if row["type"] == type_] == typed
+        typed = client.get("/stats/distribution", params={**window, "type": type_}, headers=headers).json()["data"]
+        assert [row for row in distribution if row["type"] == type_] == typed
+    assert sum(row["count"] for row in averages if row["type"] == OTHER_TYPE) == (35 * 24 + 18 + 1) * 2
@@ -0,0 +1,349 @@
+import uuid
+from fastapi.testclient import TestClient
+from app.main import app
+
+client = TestClient(app)
+
+def get_admin_token():
+    # Helper pour obtenir un token admin
+    response = client.post(
+        "/auth/login",
+        data={
+            "username": "admin@ecotrack.com",
+            "password": "admin123"
+        }
+    )
+    return response.json()["access_token"]
+
+def auth_headers():
+    return {"Authorization": f"Bearer {get_admin_token()}"}
+
+def test_trend_periods_share_total_count():
+    # Chaque période doit regrouper exactement les mêmes mesures
+    headers = auth_headers()
+    totals = set()
+    for period in ["hourly", "daily", "weekly", "monthly"]:
+        response = client.get(
+            "/stats/trend",
+            params={"type": "air_quality", "period": period},
+            headers=headers
+        )
+        assert response.status_code == 200
+        data = response.json()["data"]
+        assert [d["period"] for d in data] == sorted(d["period"] for d in data)
+        totals.add(sum(d["count"] for d in data))
+    assert len(totals) == 1
+
+def test_trend_date_filters():
+    # Les filtres de date restreignent les périodes renvoyées
+    headers = auth_headers()
+    response = client.get(
+        "/stats/trend",
+        params={
+            "type": "air_quality",
+            "period": "daily",
+            "date_from": "2000-01-01T00:00:00",
+            "date_to": "2000-01-02T00:00:00"
+        },
+        headers=headers
+    )
+    assert response.status_code == 200
+    assert response.json()["data"] == []
+
+def test_trend_invalid_period():
+    response = client.get(
+        "/stats/trend",
+        params={"type": "air_quality", "period": "yearly"},
+        headers=auth_headers()
+    )
+    assert response.status_code == 422
+
+def test_rollups_match_raw_averages():
+    # Les moyennes issues des rollups doivent égaler le calcul sur les données brutes
+    headers = auth_headers()
+    rollup = client.get("/stats/averages", headers=headers).json()["data"]
+    raw = client.get(
+        "/stats/averages",
+        params={"date_from": "2000-01-01T00:00:01"},
+        headers=headers
+    ).json()["data"]
+    assert rollup == raw
+
+def test_rollups_follow_indicator_writes():
+    # Création, mise à jour et suppression maintiennent les rollups
+    headers = auth_headers()
+    params = {
+        "type": "rollup_test",
+        "period": "hourly",
+        "date_from": "2024-01-01T10:00:00",
+        "date_to": "2024-01-01T11:00:00"
+    }
+    response = client.post(
+        "/indicators/",
+        headers=headers,
+        json={
+            "source": "TestSource",
+            "type": "rollup_test",
+            "value": 10.0,
+            "unit": "test_unit",
+            "zone_id": 1,
+            "timestamp": "2024-01-01T10:15:00"
+        }
+    )
+    indicator_id = response.json()["id"]
+    data = client.get("/stats/trend", params=params, headers=headers).json()["data"]
+    assert data == [{"period": "2024-01-01 10:00", "average": 10.0, "count": 1}]
+    
+    client.put(f"/indicators/{indicator_id}", headers=headers, json={"value": 30.0})
+    data = client.get("/stats/trend", params=params, headers=headers).json()["data"]
+    assert data == [{"period": "2024-01-01 10:00", "average": 30.0, "count": 1}]
+    
+    client.delete(f"/indicators/{indicator_id}", headers=headers)
+    data = client.get("/stats/trend", params=params, headers=headers).json()["data"]
+    assert data == []
+
+def test_etag_revalidation_and_invalidation():
+    headers = auth_headers()
+    params = {"type": "etag_test", "zone_id": 1}
+    first = client.get("/stats/averages", params=params, headers=headers)
+    etag = first.headers["etag"]
+    
+    # Même version de données : 304 sans corps
+    response = client.get("/stats/averages", params=params, headers={**headers, "If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+    
+    # Une écriture sur une autre série ne change pas l'ETag
+    client.post("/indicators/", headers=headers, json={
+        "source": "TestSource", "type": "etag_other", "value": 1.0, "unit": "u", "zone_id": 1
+    })
+    assert client.get("/stats/averages", params=params, headers=headers).headers["etag"] == etag
+    
+    # Une écriture sur la série invalide la réponse
+    client.post("/indicators/", headers=headers, json={
+        "source": "TestSource", "type": "etag_test", "value": 4.0, "unit": "u", "zone_id": 1
+    })
+    response = client.get("/stats/averages", params=params, headers={**headers, "If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+    previous = sum(item["count"] for item in first.json()["data"])
+    assert sum(item["count"] for item in response.json()["data"]) == previous + 1
+
+def test_cache_skips_result_computed_across_a_write():
+    import asyncio
+    from starlette.requests import Request
+    from app.database import SessionLocal, read_session
+    from app.utils import versions
+    from app.utils.http_cache import _cache_key, cached_json, response_cache
+    
+    type_ = f"cache_race_{uuid.uuid4().hex[:8]}"
+    
+    def compute(db):
+        # Écriture validée par un autre processus pendant le calcul
+        with SessionLocal() as writer:
+            versions.bump_series(writer, {(1, type_)})
+            writer.commit()
+        return {"type": type_}
+    
+    async def run():
+        async with read_session() as db:
+            return await cached_json(Request({"type": "http", "headers": []}), db, f"type:{type_}", compute)
+    
+    assert asyncio.run(run()).status_code == 200
+    assert response_cache.get(_cache_key(compute, ())) is None
+
+def test_timeseries_store_matches_sql(monkeypatch):
+    from datetime import datetime
+    from app.database import ReadSessionLocal
+    from app.routers import stats
+    from app.utils import timeseries
+    
+    headers = auth_headers()
+    type_ = f"store_test_{uuid.uuid4().hex[:8]}"  # série vide à chaque exécution
+    for day, value in [(1, 2.0), (3, 4.0), (9, 9.0)]:
+        client.post("/indicators/", headers=headers, json={
+            "source": "TestSource", "type": type_, "value": value, "unit": "u",
+            "zone_id": 1, "timestamp": f"2024-02-{day:02d}T10:30:00"
+        })
+    
+    def compute_all():
+        with ReadSessionLocal() as db:
+            results = [stats._compute_averages(db, type_, None, None, None)]
+            for period in ["hourly", "daily", "weekly", "monthly"]:
+                results.append(stats._compute_trend(db, type_, 1, period, None, datetime(2024, 2, 9, 10, 30)))
+            return results
+    
+    expected = compute_all()
+    store = timeseries.SeriesStore(max_series=1, max_points=1000)
+    monkeypatch.setattr(timeseries, "series_store", store)
+    assert compute_all() == expected
+    
+    # Les écritures de l'API complètent la série en mémoire sans rechargement
+    client.post("/indicators/", headers=headers, json={
+        "source": "TestSource", "type": type_, "value": 6.0, "unit": "u",
+        "zone_id": 1, "timestamp": "2024-02-02T08:00:00"
+    })
+    with ReadSessionLocal() as db:
+        trend = stats._compute_trend(db, type_, 1, "weekly", None, None)
+    assert trend["data"][0] == {"period": "2024-01-29", "average": 4.0, "count": 3}
+    assert store.stats()["misses"] == 1
+    
+    # Une seule série autorisée : une requête sur plusieurs séries repasse par SQL
+    monkeypatch.setattr(timeseries, "series_store", None)
+    with ReadSessionLocal() as db:
+        expected = stats._compute_averages(db, None, None, None, None)
+    monkeypatch.setattr(timeseries, "series_store", store)
+    with ReadSessionLocal() as db:
+        assert stats._compute_averages(db, None, None, None, None) == expected
+
+def test_distribution_from_sketches():
+    headers = auth_headers()
+    type_ = f"distribution_test_{uuid.uuid4().hex[:8]}"  # série vide à chaque exécution
+    rows = [
+        {"source": "TestSource", "type": type_, "value": float(i), "unit": "u",
+         "zone_id": 1 + i % 2, "timestamp": f"2024-03-{1 + i % 28:02d}T{i % 24:02d}:00:00"}
+        for i in range(1, 101)
+    ]
+    client.post("/indicators/bulk", headers=headers, json=rows)
+    
+    # Plage alignée sur les mois (sketches) et plage quelconque (données brutes)
+    results = []
+    for params in [{}, {"date_from": "2024-03-01T00:00:00", "date_to": "2024-04-01T00:00:00"},
+                   {"date_from": "2024-02-15T06:00:00", "date_to": "2024-04-02T06:00:00"}]:
+        response = client.get(
+            "/stats/distribution",
+            params={"type": type_, "percentiles": "50,95,99", "bins": 4, **params},
+            headers=headers
+        )
+        assert response.status_code == 200
+        results.append(response.json()["data"])
+    
+    assert results[0] == results[1] == results[2]
+    data = results[0][0]
+    assert data["count"] == 100
+    assert (data["min"], data["max"], data["average"]) == (1.0, 100.0, 50.5)
+    assert data["stddev"] == 28.87
+    for name, exact in [("p50", 50), ("p95", 95), ("p99", 99)]:
+        assert abs(data["percentiles"][name] - exact) <= exact * 0.02
+    assert [b["count"] for b in data["histogram"]] == [25, 25, 25, 25]
+    
+    response = client.get("/stats/distribution", params={"percentiles": "abc"}, headers=headers)
+    assert response.status_code == 422
+
+def test_series_downsampling():
+    headers = auth_headers()
+    type_ = f"series_test_{uuid.uuid4().hex[:8]}"  # série vide à chaque exécution
+    rows = [
+        {"source": "TestSource", "type": type_, "value": 500.0 if i == 321 else float(i % 10),
+         "unit": "u", "zone_id": 1,
+         "timestamp": f"2024-05-{1 + i // 96:02d}T{(i % 96) // 4:02d}:{(i % 4) * 15:02d}:00"}
+        for i in range(1000)
+    ]
+    client.post("/indicators/bulk", headers=headers, json=rows)
+    
+    for method in ["lttb", "minmax"]:
+        body = client.get(
+            "/stats/series",
+            params={"type": type_, "zone_id": 1, "points": 50, "method": method},
+            headers=headers
+        ).json()
+        assert body["total"] == 1000
+        data = body["data"]
+        assert len(data) <= 50
+        # Le pic est conservé et l'ordre chronologique respecté
+        assert 500.0 in [point["value"] for point in data]
+        assert [point["timestamp"] for point in data] == sorted(point["timestamp"] for point in data)
+    
+    # LTTB : exactement `points` points, extrémités conservées
+    data = client.get(
+        "/stats/series", params={"type": type_, "points": 50}, headers=headers
+    ).json()["data"]
+    assert len(data) == 50
+    assert data[0]["timestamp"] == "2024-05-01T00:00:00"
+    assert data[-1]["timestamp"] == "2024-05-11T09:45:00"
+    
+    # Série plus courte que la limite : renvoyée telle quelle
+    body = client.get(
+        "/stats/series", params={"type": type_, "points": 5000}, headers=headers
+    ).json()
+    assert len(body["data"]) == 1000
+
+def test_batched_query_matches_single_endpoints(monkeypatch):
+    import re
+    from app.config import settings
+    
+    headers = auth_headers()
+    rows = [
+        {"source": "TestSource", "type": f"query_test_{i % 2}", "value": float(i % 17), "unit": "u",
+         "zone_id": 1 + i % 3, "timestamp": f"2024-06-{1 + i % 28:02d}T{i % 24:02d}:30:00"}
+        for i in range(168)
+    ]
+    client.post("/indicators/bulk", headers=headers, json=rows)
+    
+    # Série de tableau de bord : tendances et moyennes par zone, plusieurs types et zones
+    window = {"date_from": "2024-06-03T00:00:00", "date_to": "2024-06-20T12:00:00"}
+    specs = []
+    expected = []
+    for type_ in ["query_test_0", "query_test_1"]:
+        for zone_id in [1, 2, 3]:
+            specs.append({"id": f"{type_}/{zone_id}", "type": type_, "zone_ids": [zone_id],
+                          "period": "daily", **window})
+            trend = client.get("/stats/trend", params={
+                "type": type_, "zone_id": zone_id, "period": "daily", **window
+            }, headers=headers).json()["data"]
+            expected.append([{"period": p["period"], "value": p["average"], "count": p["count"]} for p in trend])
+        specs.append({"type": type_, "by_zone": True})
+        averages = client.get("/stats/averages", params={"type": type_}, headers=headers).json()["data"]
+        expected.append([{"zone_id": a["zone_id"], "value": a["average"], "count": a["count"]} for a in averages])
+    specs.append({"type": "query_test_0", "zone_ids": [1, 2], "aggregate": "max", "period": "monthly"})
+    expected.append([{"period": "2024-06", "value": 16.0,
+                      "count": sum(1 for i in range(0, 168, 2) if i % 3 != 2)}])
+    
+    monkeypatch.setattr(settings, "METRICS_SERVER_TIMING", True)
+    response = client.post("/stats/query", json={"series": specs}, headers=headers)
+    assert response.status_code == 200
+    series = response.json()["series"]
+    assert [s["data"] for s in series] == expected
+    assert series[0]["id"] == "query_test_0/1"
+    
+    # Trois couples (plage, période) : quelques requêtes SQL pour 9 séries, authentification comprise
+    queries = int(re.search(r'desc="(\d+) queries"', response.headers["server-timing"]).group(1))
+    assert queries <= 12
+    
+    response = client.post("/stats/query", json={"series": []}, headers=headers)
+    assert response.status_code == 422
+
+def test_batched_query_keeps_each_type_horizon(monkeypatch):
+    import uuid
+    from datetime import datetime
+    from app.config import settings
+    from app.database import SessionLocal
+    from app.utils import retention
+    
+    # Type compacté (xa) et type sans rétention (xb) dans la même requête groupée
+    headers = auth_headers()
+    suffix = uuid.uuid4().hex[:8]
+    compacted, kept = f"horizon_xa_{suffix}", f"horizon_xb_{suffix}"
+    rows = [
+        {"source": "TestSource", "type": type_, "value": float(hour % 7), "unit": "u",
+         "zone_id": 1, "timestamp": f"2019-03-{1 + hour // 24:02d}T{hour % 24:02d}:30:00"}
+        for type_ in (compacted, kept)
+        for hour in range(72)
+    ]
+    client.post("/indicators/bulk", headers=headers, json=rows)
+    monkeypatch.setattr(settings, "RETENTION_POLICIES", {compacted: {"raw_days": 30, "hourly_days": 31}})
+    with SessionLocal() as db:
+        retention.compact(db, now=datetime(2019, 4, 15), batch_size=500)
+        assert retention.horizons(db, kept) == {}
+    
+    def query(*series):
+        response = client.post("/stats/query", json={"series": list(series)}, headers=headers)
+        return [s["data"] for s in response.json()["series"]]
+    
+    hourly = {"type": kept, "period": "hourly",
+              "date_from": "2019-03-02T00:00:00", "date_to": "2019-03-03T00:00:00"}
+    short = {"type": kept, "aggregate": "count",
+             "date_from": "2019-03-02T10:30:00", "date_to": "2019-03-02T12:00:00"}
+    alone = query(hourly, short)
+    assert len(alone[0]) == 24 and alone[1] == [{"value": 2, "count": 2}]
+    assert query(hourly, short, {**hourly, "type": compacted}, {**short, "type": compacted})[:2] == alone
@@ -1,5 +1,6 @@
 from app.database import SessionLocal
 from app.models.user import User
+from app.utils import versions
 
 # Créer une session
 db = SessionLocal()
@@ -9,6 +10,8 @@ admin_user = db.query(User).filter(User.email == "admin@ecotrack.com").first()
 
 if admin_user:
     admin_user.role = "admin"
+    # Même transaction : les processus de l'API retirent l'utilisateur de leur cache à la relève suivante
+    versions.bump_user(db, admin_user.email)
     db.commit()
     print(f"User {admin_user.username} is now an admin!")
 else: